@@ -0,0 +1,184 @@
+"""
+Retrieval quality and latency of the chatbot's embedding backends.
+
+    python -m AI.benchmark_embeddings [--transactions 500] [--backends local gemini]
+
+A synthetic ledger is written in the text format the chatbot indexes (see
+chatbot_service._build_document) and embedded by each backend. Questions
+with a known set of relevant transactions (a category, a merchant, an
+income source, a month) are then searched by cosine similarity, as the
+chatbot's FAISS index does, and scored:
+
+    precision    share of the top k results that are relevant, where k is
+                 RETRIEVAL_K or the number of relevant transactions if smaller
+    mrr          mean reciprocal rank of the first relevant result
+    index_ms     time to embed the whole ledger
+    query_ms     median time to embed one question and search
+
+The gemini backend needs GEMINI_API_KEY (and network access) and is
+skipped without it. Its vectors go straight to the API, not through the
+embedding cache, so every run measures real calls.
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+import numpy as np
+from AI.local_embeddings import HashingEmbedder
+
+RETRIEVAL_K = 20
+GEMINI_MODEL = "models/embedding-001"
+
+MERCHANTS = {
+    "Groceries": ["BigBasket", "DMart", "Reliance Fresh", "Blinkit"],
+    "Entertainment & Dining": ["Swiggy", "Zomato", "PVR Cinemas", "Starbucks"],
+    "Transportation": ["Uber", "Ola", "Indian Oil", "Metro Card"],
+    "Utilities": ["Airtel", "Jio Recharge", "Electricity Bill", "Water Bill"],
+    "Shopping & Personal Care": ["Amazon", "Myntra", "Nykaa", "Flipkart"],
+    "Healthcare": ["Apollo Pharmacy", "Practo", "1mg"],
+}
+INCOME_SOURCES = ["Salary", "Freelancing", "Pocket Money", "Dividends"]
+
+
+def synthetic_ledger(size, seed=7):
+    """``size`` transactions as ``(text, facts)``, ``facts`` holding what questions can ask about."""
+    rng = random.Random(seed)
+    start = date(2025, 1, 1)
+    rows = []
+    for _ in range(size):
+        day = start + timedelta(days=rng.randrange(270))
+        if rng.random() < 0.15:
+            source = rng.choice(INCOME_SOURCES)
+            amount = round(rng.uniform(1000, 50000), 2)
+            text = (f"Income Source: {source} Amount: ₹{amount} Date: {day.isoformat()} "
+                    f"Status: Received Type: income")
+            rows.append((text, {"type": "income", "source": source, "month": day.month}))
+        else:
+            category = rng.choice(list(MERCHANTS))
+            merchant = rng.choice(MERCHANTS[category])
+            amount = round(rng.uniform(50, 5000), 2)
+            text = (f"Expense: {merchant} Amount: ₹{amount} Category: {category} Date: {day.isoformat()} "
+                    f"Status: Completed Type: expense")
+            rows.append((text, {"type": "expense", "category": category, "merchant": merchant, "month": day.month}))
+    return rows
+
+
+def questions():
+    """
+    ``(question, predicate over facts)`` pairs. Most share words with the
+    transactions they ask about; the last few are paraphrases, which only
+    an embedding of meaning can match.
+    """
+    cases = [
+        ("How much did I spend on groceries?", lambda f: f.get("category") == "Groceries"),
+        ("What are my transportation expenses?", lambda f: f.get("category") == "Transportation"),
+        ("Show my healthcare spending", lambda f: f.get("category") == "Healthcare"),
+        ("How much did I pay Swiggy?", lambda f: f.get("merchant") == "Swiggy"),
+        ("What did I order from Amazon?", lambda f: f.get("merchant") == "Amazon"),
+        ("How much did I spend at Starbucks?", lambda f: f.get("merchant") == "Starbucks"),
+        ("How much salary did I receive?", lambda f: f.get("source") == "Salary"),
+        ("What income do I have?", lambda f: f["type"] == "income"),
+        ("How much freelancing income did I get?", lambda f: f.get("source") == "Freelancing"),
+        ("What did I spend in March?", lambda f: f["type"] == "expense" and f["month"] == 3),
+        ("Show my expenses from July 2025", lambda f: f["type"] == "expense" and f["month"] == 7),
+        # Paraphrases that share no words with the matching transactions
+        ("How much did I spend eating out?", lambda f: f.get("category") == "Entertainment & Dining"),
+        ("What did cabs cost me?", lambda f: f.get("merchant") in ("Uber", "Ola")),
+        ("How much did I spend on medicines?", lambda f: f.get("category") == "Healthcare"),
+    ]
+    return cases
+
+
+class LocalBackend:
+    name = "local"
+
+    def __init__(self):
+        self.embedder = HashingEmbedder()
+
+    def embed_documents(self, texts):
+        return self.embedder.embed(texts)
+
+    def embed_query(self, text):
+        return self.embedder.embed([text])[0]
+
+
+class GeminiBackend:
+    name = "gemini"
+
+    def __init__(self):
+        from AI.llm_gateway import embed_texts
+        self._embed = embed_texts
+
+    def embed_documents(self, texts):
+        return np.asarray(self._embed(texts, model=GEMINI_MODEL, call_site="benchmark.index",
+                                      task_type="RETRIEVAL_DOCUMENT"), dtype=np.float32)
+
+    def embed_query(self, text):
+        return np.asarray(self._embed([text], model=GEMINI_MODEL, call_site="benchmark.query",
+                                      task_type="RETRIEVAL_QUERY")[0], dtype=np.float32)
+
+
+def _normalise(matrix):
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+
+def evaluate(backend, ledger, cases, k=RETRIEVAL_K):
+    texts = [text for text, _ in ledger]
+    start = time.perf_counter()
+    documents = _normalise(backend.embed_documents(texts))
+    index_ms = (time.perf_counter() - start) * 1000
+
+    precisions, reciprocal_ranks, query_ms = [], [], []
+    for question, relevant in cases:
+        wanted = {i for i, (_, facts) in enumerate(ledger) if relevant(facts)}
+        start = time.perf_counter()
+        scores = documents @ _normalise(backend.embed_query(question))
+        ranked = np.argsort(-scores, kind="stable")[:max(k, 100)]
+        query_ms.append((time.perf_counter() - start) * 1000)
+        if not wanted:
+            continue
+        top = ranked[:min(k, len(wanted))]
+        precisions.append(sum(int(i) in wanted for i in top) / len(top))
+        first = next((rank for rank, i in enumerate(ranked, 1) if int(i) in wanted), None)
+        reciprocal_ranks.append(1 / first if first else 0.0)
+    return {
+        "precision": round(statistics.mean(precisions), 3),
+        "mrr": round(statistics.mean(reciprocal_ranks), 3),
+        "index_ms": round(index_ms, 1),
+        "query_ms": round(statistics.median(query_ms), 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--transactions", type=int, default=500, help="Size of the synthetic ledger.")
+    parser.add_argument("--backends", nargs="+", default=["local", "gemini"], choices=["local", "gemini"])
+    args = parser.parse_args(argv)
+
+    ledger = synthetic_ledger(args.transactions)
+    cases = questions()
+    print(f"{args.transactions} transactions, {len(cases)} questions, k={RETRIEVAL_K}")
+    print(f"{'backend':<10}{'precision':>11}{'mrr':>8}{'index ms':>11}{'query ms':>11}")
+    for name in args.backends:
+        if name == "gemini":
+            from AI.llm_gateway import api_key
+            if not api_key():
+                print(f"{name:<10}skipped: GEMINI_API_KEY is not set")
+                continue
+            backend = GeminiBackend()
+        else:
+            backend = LocalBackend()
+        try:
+            result = evaluate(backend, ledger, cases)
+        except Exception as e:
+            print(f"{name:<10}failed: {e}")
+            continue
+        print(f"{name:<10}{result['precision']:>11}{result['mrr']:>8}{result['index_ms']:>11}{result['query_ms']:>11}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""
+Accuracy and throughput of the offline UPI parser on the sample corpus.
+
+    python -m AI.categorization.benchmark_upi_parser [--repeat 2000]
+
+Every sample in samples/upi_ocr_samples.json is checked against its
+expected fields, then the whole corpus is parsed ``--repeat`` times to
+measure throughput. Exits non-zero if any sample is parsed wrongly.
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from AI.categorization.upi_parser import REQUIRED_FIELDS, is_complete, parse_upi_text
+
+CORPUS_PATH = Path(__file__).resolve().parent / "samples" / "upi_ocr_samples.json"
+
+
+def load_corpus(path=CORPUS_PATH):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def check_corpus(samples):
+    """Return ``(sample index, message)`` for every field parsed differently from the expectation."""
+    mismatches = []
+    for index, sample in enumerate(samples):
+        fields = parse_upi_text(sample["text"])
+        if fields["app"] != sample["app"]:
+            mismatches.append((index, f"app {fields['app']!r}, expected {sample['app']!r}"))
+        for name in REQUIRED_FIELDS:
+            if fields[name] != sample["expected"][name]:
+                mismatches.append((index, f"{name} {fields[name]!r}, expected {sample['expected'][name]!r}"))
+    return mismatches
+
+
+def measure_throughput(samples, repeat):
+    texts = [sample["text"] for sample in samples]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            parse_upi_text(text)
+    elapsed = time.perf_counter() - start
+    parsed = repeat * len(texts)
+    return {"texts": parsed, "seconds": round(elapsed, 3),
+            "texts_per_second": round(parsed / elapsed), "us_per_text": round(elapsed / parsed * 1e6, 1)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=2000, help="Passes over the corpus for the throughput run.")
+    parser.add_argument("--corpus", default=str(CORPUS_PATH), help="Corpus JSON file.")
+    args = parser.parse_args(argv)
+
+    samples = load_corpus(args.corpus)
+    mismatches = check_corpus(samples)
+    complete = sum(is_complete(parse_upi_text(sample["text"])) for sample in samples)
+    wrong = {index for index, _ in mismatches}
+    print(f"Corpus: {len(samples)} samples, {len(samples) - len(wrong)} fully correct, "
+          f"{complete} complete enough to skip the LLM")
+    for index, message in mismatches:
+        print(f"  MISMATCH sample {index} ({samples[index]['app']}): {message}")
+
+    stats = measure_throughput(samples, args.repeat)
+    print(f"Throughput: {stats['texts']} texts in {stats['seconds']}s = "
+          f"{stats['texts_per_second']} texts/s ({stats['us_per_text']} us/text)")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
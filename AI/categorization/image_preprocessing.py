@@ -0,0 +1,87 @@
+import io
+import os
+from PIL import Image, ImageOps
+
+# Longest side and JPEG quality of the image sent to Gemini. Receipt text
+# stays legible at this size, and screenshots shrink to a fraction of their bytes.
+MAX_SIDE = int(os.getenv("RECEIPT_MAX_SIDE", "1600"))
+JPEG_QUALITY = int(os.getenv("RECEIPT_JPEG_QUALITY", "80"))
+
+# Near-duplicate detection: a 64-bit difference hash finds candidates, then a
+# grid of block averages confirms that no region of the image really differs.
+# The grid is what tells two receipts from the same app apart, since their
+# layouts (and so their hashes) are almost identical and only the text changes.
+HASH_DISTANCE = int(os.getenv("RECEIPT_HASH_DISTANCE", "6"))
+GRID_SIZE = (24, 48)
+GRID_TOLERANCE = int(os.getenv("RECEIPT_GRID_TOLERANCE", "4"))
+# Top rows of a phone screenshot are the status bar (clock, battery), which
+# differs between two screenshots of the same payment
+STATUS_BAR_ROWS = 2
+
+
+class InvalidImage(Exception):
+    """The uploaded bytes are not an image PIL can read."""
+
+
+def _difference_hash(gray):
+    small = gray.resize((9, 8), Image.LANCZOS)
+    pixels = list(small.getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            left, right = pixels[row * 9 + col], pixels[row * 9 + col + 1]
+            bits = (bits << 1) | (left > right)
+    return f"{bits:016x}"
+
+
+def prepare_receipt_image(data):
+    """
+    Decode uploaded image bytes in memory and return a dict with:
+
+    - ``blob``: ``{"mime_type": "image/jpeg", "data": ...}``, the image
+      rotated upright, downscaled to MAX_SIDE and recompressed, ready to
+      pass to Gemini in place of a PIL image
+    - ``hash`` and ``grid``: the near-duplicate fingerprint (see is_near_duplicate)
+    - ``original_bytes`` / ``upload_bytes`` and ``size``, for reporting
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img = ImageOps.exif_transpose(img)
+            img = img.convert("RGB")
+    except Exception as e:
+        raise InvalidImage(f"Unreadable image: {e}")
+
+    # Bilinear (antialiased when shrinking) keeps text sharp enough and is about twice as fast as Lanczos
+    img.thumbnail((MAX_SIDE, MAX_SIDE), Image.BILINEAR)
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+
+    gray = img.convert("L")
+    return {
+        "blob": {"mime_type": "image/jpeg", "data": out.getvalue()},
+        "hash": _difference_hash(gray),
+        "grid": gray.resize(GRID_SIZE, Image.BOX).tobytes(),
+        "original_bytes": len(data),
+        "upload_bytes": out.tell(),
+        "size": img.size,
+    }
+
+
+def hash_distance(first, second):
+    """Number of differing bits between two hex hashes."""
+    return bin(int(first, 16) ^ int(second, 16)).count("1")
+
+
+def is_near_duplicate(image, cached):
+    """
+    True when ``image`` and ``cached`` (both from prepare_receipt_image) show
+    the same receipt: their hashes are within HASH_DISTANCE bits and every
+    grid block below the status bar is within GRID_TOLERANCE grey levels.
+    """
+    if hash_distance(image["hash"], cached["hash"]) > HASH_DISTANCE:
+        return False
+    skip = STATUS_BAR_ROWS * GRID_SIZE[0]
+    first, second = image["grid"], cached["grid"]
+    if len(first) != len(second):
+        return False
+    return all(abs(a - b) <= GRID_TOLERANCE for a, b in zip(first[skip:], second[skip:]))
@@ -0,0 +1,103 @@
+import math
+import os
+import re
+
+# Below this confidence the caller should fall back to the LLM's category
+CONFIDENCE_THRESHOLD = float(os.getenv("LOCAL_CATEGORY_CONFIDENCE", "0.6"))
+
+# Pattern weights: a learned merchant beats a known merchant, which beats a generic keyword
+KEYWORD_WEIGHT = 1.0
+MERCHANT_WEIGHT = 3.0
+LEARNED_WEIGHT = 5.0
+# Score at which a single unopposed match counts as fully confident
+CONFIDENT_SCORE = 3.0
+
+_TOKEN_RE = re.compile(r"[a-z0-9&]+")
+_END = ""
+
+
+def tokenize(text):
+    """Lowercase word tokens ("D-Mart: Onion (500g)" -> ["d", "mart", "onion", "500g"])."""
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+def merchant_key(name):
+    """The part of a transaction name before any ":" as a token phrase, used to learn corrections."""
+    return " ".join(tokenize((name or "").split(":", 1)[0]))
+
+
+class LocalCategorizer:
+    """
+    Token trie over category keywords and merchant names.
+
+    A text is scanned once: from every token the trie is walked as far as
+    the following tokens allow, so multi-word patterns ("indian oil",
+    "big bazaar") match as a whole and the cost grows with the text, not
+    with the number of patterns. Every match adds its weight to its
+    category; the confidence is the winner's share of all matched weight,
+    scaled down while that weight is small.
+    """
+
+    def __init__(self, keywords=None, merchants=None):
+        self.root = {}
+        for patterns, weight in ((keywords, KEYWORD_WEIGHT), (merchants, MERCHANT_WEIGHT)):
+            for category, phrases in (patterns or {}).items():
+                for phrase in phrases:
+                    self.add(phrase, category, weight)
+
+    def add(self, phrase, category, weight):
+        tokens = tokenize(phrase)
+        if not tokens:
+            return
+        node = self.root
+        for token in tokens:
+            node = node.setdefault(token, {})
+        matches = node.setdefault(_END, {})
+        matches[category] = matches.get(category, 0) + weight
+
+    def scores(self, text):
+        """Matched weight per category in ``text``."""
+        tokens = tokenize(text)
+        totals = {}
+        for start in range(len(tokens)):
+            node = self.root
+            for token in tokens[start:]:
+                node = node.get(token)
+                if node is None:
+                    break
+                for category, weight in node.get(_END, {}).items():
+                    totals[category] = totals.get(category, 0) + weight
+        return totals
+
+    def categorize(self, text, learned=None):
+        """
+        Return ``(category, confidence)`` for ``text``, or ``(None, 0.0)`` if nothing matched.
+
+        ``learned`` is another LocalCategorizer (e.g. built from a user's own
+        corrections by ``from_corrections``) whose matches are added on top.
+        """
+        totals = self.scores(text)
+        if learned is not None:
+            for category, weight in learned.scores(text).items():
+                totals[category] = totals.get(category, 0) + weight
+        if not totals:
+            return None, 0.0
+        # Ties go to the alphabetically first category so results are stable
+        category, best = min(totals.items(), key=lambda item: (-item[1], item[0]))
+        share = best / sum(totals.values())
+        return category, round(share * min(1.0, best / CONFIDENT_SCORE), 3)
+
+    @classmethod
+    def from_corrections(cls, corrections):
+        """
+        Build a categorizer from ``{merchant phrase: {category: times chosen}}``.
+
+        Repeated choices weigh more, but only logarithmically, so one merchant
+        the user files under two categories stays ambiguous.
+        """
+        categorizer = cls()
+        for phrase, counts in (corrections or {}).items():
+            for category, count in counts.items():
+                if count > 0:
+                    categorizer.add(phrase, category, LEARNED_WEIGHT * (1 + math.log(count)))
+        return categorizer
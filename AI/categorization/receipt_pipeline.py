@@ -0,0 +1,132 @@
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from PIL import Image
+from AI.llm_gateway import generate_text
+from AI.categorization.run_ocr import get_ocr_text
+from AI.categorization.structured_output import (
+    allowed_categories, finalize_transaction, parse_model_json,
+    process_transaction_text, transaction_from_model_output,
+)
+
+# "single": one multimodal call turns the image straight into transaction JSON,
+# falling back to "two_step" (OCR call, then structuring) if that call fails.
+# "two_step": always OCR first; UPI screenshots are then often parsed locally.
+EXTRACTION_MODES = ("single", "two_step")
+EXTRACTION_MODE = os.getenv("RECEIPT_EXTRACTION_MODE", "single").lower()
+SINGLE_CALL_MODEL = os.getenv("RECEIPT_EXTRACTION_MODEL", "gemini-flash-latest")
+
+# Per mode and stage: number of runs and total milliseconds, for get_extraction_stats()
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+class NotATransaction(Exception):
+    """The image could not be read as a transaction."""
+
+
+@contextmanager
+def _stage(timings, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = round((time.perf_counter() - start) * 1000, 1)
+
+
+def record_timings(mode, timings):
+    with _stats_lock:
+        stages = _stats.setdefault(mode, {})
+        for name, ms in timings.items():
+            stage = stages.setdefault(name, {"count": 0, "total_ms": 0.0})
+            stage["count"] += 1
+            stage["total_ms"] += ms
+
+
+def get_extraction_stats():
+    """Average milliseconds per stage for each mode used by this process."""
+    with _stats_lock:
+        return {
+            mode: {name: {"count": s["count"], "avg_ms": round(s["total_ms"] / s["count"], 1)}
+                   for name, s in stages.items()}
+            for mode, stages in _stats.items()
+        }
+
+
+def extract_with_single_call(image_path, corrections=None):
+    """
+    Send the image once and get back the transaction JSON. ``image_path`` may
+    also be an in-memory blob from image_preprocessing. Raises
+    NotATransaction for images that are not transactions.
+    """
+    categories = allowed_categories(corrections)
+    prompt = f"""
+    You are a specialized AI for reading screenshots of UPI payments and photos of receipts.
+    Your ONLY output should be a single, valid JSON object. Do not include any other text, explanations, or markdown.
+
+    If the image is not a payment screenshot or receipt, or cannot be read, return exactly:
+    {{"error": "Not a transaction."}}
+
+    Otherwise return:
+    {{
+      "payee": "<merchant or person paid, as printed>",
+      "transaction": {{
+        "amount": <number, without currency symbols or commas>,
+        "category": "<one of {categories}>",
+        "date": "YYYY-MM-DD",
+        "name": "<short descriptive name, e.g. \\"Dinner at restaurant\\">",
+        "status": "Pending"
+      }}
+    }}
+    """
+    with (Image.open(image_path) if isinstance(image_path, str) else nullcontext(image_path)) as img:
+        response_text = generate_text([prompt, img], model=SINGLE_CALL_MODEL, call_site="receipts.single_call")
+    raw_data = parse_model_json(response_text)
+    if raw_data.get("error"):
+        raise NotATransaction(raw_data["error"])
+    transaction = transaction_from_model_output(raw_data)
+    # The payee is what the local categorizer and the user's corrections know about
+    return finalize_transaction(transaction, f"{raw_data.get('payee', '')} {transaction.get('name', '')}", corrections)
+
+
+def extract_transaction(image_path, user_id, corrections=None, mode=None):
+    """
+    Read a receipt image (a path or an in-memory blob) into a transaction
+    dict using ``mode`` (default RECEIPT_EXTRACTION_MODE). Returns ``(transaction, info)`` where ``info``
+    holds the mode actually used and per-stage ``timings_ms``; the
+    transaction is None when the image is not a readable transaction.
+    """
+    mode = mode or EXTRACTION_MODE
+    if mode not in EXTRACTION_MODES:
+        print(f"Unknown RECEIPT_EXTRACTION_MODE '{mode}', using two_step.")
+        mode = "two_step"
+    timings = {}
+    transaction = None
+    start = time.perf_counter()
+
+    if mode == "single":
+        try:
+            with _stage(timings, "extract"):
+                transaction = extract_with_single_call(image_path, corrections)
+        except NotATransaction as e:
+            print(f"Single-call extraction rejected the image: {e}")
+            mode_used = "single"
+        except Exception as e:
+            print(f"Single-call extraction failed ({e}); falling back to two_step.")
+            mode = "two_step"
+        else:
+            mode_used = "single"
+
+    if mode == "two_step":
+        mode_used = "two_step" if "extract" not in timings else "single+two_step"
+        with _stage(timings, "ocr"):
+            ocr_text = get_ocr_text(image_path)
+        if ocr_text.strip():
+            with _stage(timings, "structure"):
+                transaction = process_transaction_text(ocr_text, user_id, corrections)
+
+    timings["total"] = round((time.perf_counter() - start) * 1000, 1)
+    record_timings(mode_used, timings)
+    print(f"Receipt extraction ({mode_used}): {timings} ms")
+    return transaction, {"mode": mode_used, "timings_ms": timings}
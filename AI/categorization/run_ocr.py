@@ -1,46 +1,42 @@
 import os
-import google.generativeai as genai
+from contextlib import nullcontext
 from PIL import Image
 from dotenv import load_dotenv
+from AI.llm_gateway import api_key, generate_text
 
 # Load env
 load_dotenv()
 
-# Configure Gemini
 # Ensure GEMINI_API_KEY is set in your .env file
-api_key = os.getenv("GEMINI_API_KEY")
-
-
-if api_key:
-    genai.configure(api_key=api_key)
-else:
+if not api_key():
     print("Warning: GEMINI_API_KEY or GOOGLE_API_KEY not found in environment variables.")
 
 def get_ocr_text(image_path):
     """
     Extracts text from an image using Google Gemini 1.5 Flash.
+
+    ``image_path`` may also be an in-memory image: a PIL image or a
+    ``{"mime_type": ..., "data": ...}`` blob (see image_preprocessing).
     """
     # Check if the file exists
-    if not os.path.isfile(image_path):
+    if isinstance(image_path, str) and not os.path.isfile(image_path):
         print(f"Error: File '{image_path}' not found! Check the path.")
         return ""
 
-    if not api_key:
+    if not api_key():
         print("Error: API key not configured. Cannot run Gemini OCR.")
         return ""
 
     print("Processing OCR with Gemini...")
     try:
-
-        model = genai.GenerativeModel('gemini-flash-lite-latest')
-        
         # Use context manager to ensure file is closed
-        with Image.open(image_path) as img:
+        with (Image.open(image_path) if isinstance(image_path, str) else nullcontext(image_path)) as img:
             # Prompt for pure text extraction
-            response = model.generate_content(["Check whether the image is for screenshot of a trancastion via any UPI app. If yes then, extract all text from this image verbatim. Do not add any markdown formatting or explanations, just the raw text. If no, Just repond Not a screenshot.", img])
+            response_text = generate_text(["Check whether the image is for screenshot of a trancastion via any UPI app. If yes then, extract all text from this image verbatim. Do not add any markdown formatting or explanations, just the raw text. If no, Just repond Not a screenshot.", img],
+                                          model='gemini-flash-lite-latest', call_site='receipts.ocr')
             
-            if response.text:
-                cleaned_text = response.text.strip()
+            if response_text:
+                cleaned_text = response_text.strip()
                 # Check for the specific rejection phrase from the prompt
                 if "Not a screenshot" in cleaned_text:
                     print("Gemini rejected image: Not a transaction screenshot.")
@@ -1,20 +1,14 @@
-import google.generativeai as genai
 import os
 import json
 from datetime import datetime
 from dotenv import load_dotenv
+from AI.llm_gateway import generate_text
+from AI.categorization.local_categorizer import CONFIDENCE_THRESHOLD, LocalCategorizer
+from AI.categorization.upi_parser import is_complete, parse_upi_text
 
 # Load env first
 load_dotenv()
 
-# Configure Gemini
-api_key = os.getenv("GEMINI_API_KEY")
-if not api_key:
-    api_key = os.getenv("GOOGLE_API_KEY")
-
-if api_key:
-    genai.configure(api_key=api_key)
-
 # === Category Logic ===
 CATEGORY_KEYWORDS = {
     "Dining Out & Entertainment": ["restaurant", "cafe", "food", "zomato", "swiggy", "movie", "concert", "netflix", "spotify"],
@@ -27,9 +21,126 @@ CATEGORY_KEYWORDS = {
     "Other": []
 }
 
-def process_transaction_text(ocr_text: str, user_id: str) -> dict:
-    # === Get Categories ===
+# Merchants that show up as payees on receipts and UPI screenshots
+MERCHANT_KEYWORDS = {
+    "Dining Out & Entertainment": ["zomato", "swiggy", "netflix", "spotify", "dominos", "domino s", "mcdonald s", "mcdonalds", "kfc", "pizza hut", "starbucks",
+                                   "burger king", "haldiram", "barbeque nation", "pvr", "inox", "bookmyshow",
+                                   "hotstar", "prime video", "sony liv", "zee5", "eatsure"],
+    "Education & Self-Development": ["udemy", "coursera", "byju s", "byjus", "unacademy", "vedantu", "physics wallah",
+                                     "upgrad", "skillshare", "kindle", "crossword"],
+    "Groceries & Essentials": ["d mart", "dmart", "big bazaar", "bigbasket", "blinkit", "zepto", "jiomart",
+                               "reliance fresh", "more supermarket", "spencer s", "nature s basket", "instamart",
+                               "kirana"],
+    "Healthcare & Insurance": ["apollo", "medplus", "pharmeasy", "netmeds", "1mg", "practo", "lic", "star health",
+                               "hdfc ergo", "policybazaar"],
+    "Housing": ["nobroker", "nestaway", "maintenance", "society"],
+    "Transportation": ["uber", "ola", "rapido", "irctc", "redbus", "makemytrip", "indigo", "air india", "vistara", "metro",
+                       "fastag", "indian oil", "iocl", "bharat petroleum", "bpcl", "hindustan petroleum",
+                       "hpcl", "petrol", "diesel", "blablacar"],
+    "Utilities": ["jio", "airtel", "vodafone", "bsnl", "tata power", "adani electricity", "bescom", "msedcl",
+                  "tata play", "broadband", "recharge", "indane", "bharatgas"],
+}
+
+_local_categorizer = LocalCategorizer(CATEGORY_KEYWORDS, MERCHANT_KEYWORDS)
+
+
+def categorize_text(text: str, corrections: dict = None):
+    """
+    Categorize receipt text or a transaction name locally, without the LLM.
+
+    ``corrections`` maps merchant phrases to how often the user filed them
+    under each category; they take precedence over the built-in keywords.
+    Returns ``(category, confidence)``; the category is None when nothing
+    matched, and confidence below CONFIDENCE_THRESHOLD means "ask the LLM".
+    """
+    learned = LocalCategorizer.from_corrections(corrections) if corrections else None
+    return _local_categorizer.categorize(text, learned)
+
+def allowed_categories(corrections: dict = None) -> list:
+    """The built-in categories plus any the user has taught us."""
     categories = list(CATEGORY_KEYWORDS.keys())
+    for counts in (corrections or {}).values():
+        categories.extend(category for category in counts if category not in categories)
+    return categories
+
+def parse_model_json(response_text: str) -> dict:
+    """Parse a Gemini reply that should be one JSON object, tolerating markdown fences."""
+    if '```json' in response_text:
+        response_text = response_text.split('```json')[1].split('```')[0]
+    elif '```' in response_text:
+        response_text = response_text.split('```')[1].split('```')[0]
+    return json.loads(response_text.strip())
+
+def transaction_from_model_output(raw_data: dict) -> dict:
+    """Turn the model's {"transaction": {...}} or {"error": ...} reply into a complete transaction."""
+    # Check if the LLM returned a structured error
+    if raw_data.get("error"):
+        print(f"LLM returned a structured error: {raw_data['error']}")
+        return {
+            "amount": 0,
+            "category": "Other",
+            "date": datetime.now().strftime('%Y-%m-%d'),
+            "name": "Unreadable Transaction",
+            "status": "Failed"
+        }
+    # Initialize with defaults to ensure structure
+    transaction = {
+        "amount": 0,
+        "category": "Other",
+        "date": datetime.now().strftime('%Y-%m-%d'),
+        "name": "Unnamed Transaction",
+        "status": "Pending"
+    }
+    llm_transaction = raw_data.get("transaction", {})
+
+    # Ensure llm_transaction is a dict before updating
+    if isinstance(llm_transaction, dict):
+        transaction.update(llm_transaction)
+    else:
+        # Log if the transaction format is not a dict, and use defaults
+        print(f"Warning: LLM returned 'transaction' but it was not a dictionary. Using defaults.")
+    return transaction
+
+def finalize_transaction(transaction: dict, text: str, corrections: dict = None) -> dict:
+    """
+    Validate the category and timestamp the transaction. The local
+    categorizer's answer for ``text`` replaces the model's category when it
+    is confident, or when the model's category is not an allowed one.
+    """
+    categories = allowed_categories(corrections)
+    local_category, confidence = categorize_text(text, corrections)
+    if local_category and (confidence >= CONFIDENCE_THRESHOLD or transaction.get("category") not in categories):
+        print(f"Local categorizer chose '{local_category}' (confidence {confidence})")
+        transaction["category"] = local_category
+    if transaction.get("category") not in categories:
+        transaction["category"] = "Other"
+
+    transaction["timestamp"] = datetime.now().isoformat()
+
+    return transaction
+
+def process_transaction_text(ocr_text: str, user_id: str, corrections: dict = None) -> dict:
+    # === Get Categories ===
+    categories = allowed_categories(corrections)
+
+    # === Categorize locally first; the LLM's category is only used when this is unsure ===
+    local_category, confidence = categorize_text(ocr_text, corrections)
+
+    # === UPI screenshots with every field readable need no LLM call at all ===
+    upi_fields = parse_upi_text(ocr_text)
+    if is_complete(upi_fields):
+        print(f"Parsed {upi_fields['app'] or 'UPI'} receipt locally; skipping the LLM.")
+        payee_category, payee_confidence = categorize_text(upi_fields["payee"], corrections)
+        if payee_category and payee_confidence >= confidence:
+            local_category = payee_category
+        return {
+            "amount": upi_fields["amount"],
+            "category": local_category if local_category in categories else "Other",
+            "date": upi_fields["date"],
+            "name": upi_fields["payee"],
+            "status": "Pending",
+            "timestamp": datetime.now().isoformat(),
+        }
 
     # === Prompt the model ===
     prompt = f"""
@@ -75,45 +186,8 @@ def process_transaction_text(ocr_text: str, user_id: str) -> dict:
     """
 
     try:
-        model = genai.GenerativeModel('gemini-flash-latest')
-        response = model.generate_content(prompt)
-        
-        response_text = response.text
-        # Clean up markdown if present
-        if '```json' in response_text:
-            response_text = response_text.split('```json')[1].split('```')[0]
-        elif '```' in response_text:
-            response_text = response_text.split('```')[1].split('```')[0]
-        
-        raw_data = json.loads(response_text.strip())
-
-        # Check if the LLM returned a structured error
-        if raw_data.get("error"):
-            print(f"LLM returned a structured error: {raw_data['error']}")
-            transaction = {
-                "amount": 0,
-                "category": "Other",
-                "date": datetime.now().strftime('%Y-%m-%d'),
-                "name": "Unreadable Transaction",
-                "status": "Failed"
-            }
-        else:
-            # Initialize with defaults to ensure structure
-            transaction = {
-                "amount": 0,
-                "category": "Other",
-                "date": datetime.now().strftime('%Y-%m-%d'),
-                "name": "Unnamed Transaction",
-                "status": "Pending"
-            }
-            llm_transaction = raw_data.get("transaction", {})
-            
-            # Ensure llm_transaction is a dict before updating
-            if isinstance(llm_transaction, dict):
-                transaction.update(llm_transaction)
-            else:
-                # Log if the transaction format is not a dict, and use defaults
-                print(f"Warning: LLM returned 'transaction' but it was not a dictionary. Using defaults.")
+        response_text = generate_text(prompt, model='gemini-flash-latest', call_site='receipts.structure')
+        transaction = transaction_from_model_output(parse_model_json(response_text))
 
     except Exception as e:
         print(f"Error parsing LLM response: {e}")
@@ -126,9 +200,4 @@ def process_transaction_text(ocr_text: str, user_id: str) -> dict:
         }
 
     # Final validation and timestamping
-    if transaction.get("category") not in categories:
-        transaction["category"] = "Other"
-        
-    transaction["timestamp"] = datetime.now().isoformat()
-
-    return transaction
\ No newline at end of file
+    return finalize_transaction(transaction, ocr_text, corrections)
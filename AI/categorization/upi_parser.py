@@ -0,0 +1,145 @@
+import re
+from datetime import datetime
+
+# Fields a UPI screenshot must yield for the structuring LLM call to be skipped
+REQUIRED_FIELDS = ("amount", "date", "payee", "upi_ref")
+
+_AMOUNT_RE = re.compile(r"(?:₹|\bRs\.?|\bINR)\s*([0-9][0-9,]*(?:\.[0-9]{1,2})?)", re.IGNORECASE)
+_REF_RE = re.compile(r"\b(\d{12})\b")
+_UPI_ID_RE = re.compile(r"[\w.\-]+@[a-z]+", re.IGNORECASE)
+_DATE_PATTERNS = (
+    (re.compile(r"\b(\d{1,2})\s+([A-Za-z]{3})[a-z]*,?\s+(\d{4})\b"), ("day", "month", "year")),
+    (re.compile(r"\b([A-Za-z]{3})[a-z]*\s+(\d{1,2}),?\s+(\d{4})\b"), ("month", "day", "year")),
+    (re.compile(r"\b(\d{1,2})[/-](\d{1,2})[/-](\d{4})\b"), ("day", "month", "year")),
+    (re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b"), ("year", "month", "day")),
+)
+
+# One template per app: how to recognise its screenshots and which labels
+# precede each field. A label's value is the rest of its line, or the next
+# non-empty line when the label stands alone (as in "To\nSwiggy").
+TEMPLATES = {
+    "paytm": {
+        "detect": re.compile(r"paytm|@pty|paid successfully", re.IGNORECASE),
+        "amount": ("Amount",),
+        "payee": ("To",),
+        "date": ("Paid at",),
+        "upi_ref": ("UPI Ref No", "UPI Ref"),
+    },
+    "gpay": {
+        "detect": re.compile(r"google (?:pay|transaction id)|g pay|@ok(?:axis|hdfcbank|icici|sbi)", re.IGNORECASE),
+        "amount": (),
+        "payee": ("Paid to", "To"),
+        "date": ("Completed",),
+        "upi_ref": ("UPI transaction ID", "UPI Ref"),
+    },
+    "phonepe": {
+        "detect": re.compile(r"phonepe|@ybl|@ibl|@axl|\bUTR\b", re.IGNORECASE),
+        "amount": (),
+        "payee": ("Paid to", "Sent to"),
+        "date": ("Transaction Successful",),
+        "upi_ref": ("UTR", "UPI Ref"),
+    },
+}
+# Used when no app template recognises the text
+GENERIC_TEMPLATE = {
+    "amount": ("Amount",),
+    "payee": ("Paid to", "To"),
+    "date": (),
+    "upi_ref": ("UPI Ref No", "UPI transaction ID", "UTR", "Reference"),
+}
+
+
+def _lines(text):
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+
+def _after_label(lines, labels):
+    """Values that follow any of ``labels``, in the order they appear."""
+    for index, line in enumerate(lines):
+        for label in labels:
+            if line.lower().startswith(label.lower()):
+                rest = line[len(label):].strip(" :-")
+                # "To" must not match "Total", "Today" etc.
+                if rest and line[len(label)].isalnum():
+                    continue
+                if rest:
+                    yield rest
+                elif index + 1 < len(lines):
+                    yield lines[index + 1]
+
+
+def _amount(text):
+    match = _AMOUNT_RE.search(text)
+    return float(match.group(1).replace(",", "")) if match else None
+
+
+def _date(text):
+    for pattern, order in _DATE_PATTERNS:
+        for match in pattern.finditer(text):
+            parts = dict(zip(order, match.groups()))
+            month = parts["month"]
+            try:
+                month = int(month) if month.isdigit() else datetime.strptime(month[:3].title(), "%b").month
+                return datetime(int(parts["year"]), month, int(parts["day"])).strftime("%Y-%m-%d")
+            except ValueError:
+                continue
+    return None
+
+
+def _payee(value):
+    value = _UPI_ID_RE.sub("", value).replace("UPI ID", "").strip(" :-")
+    # Names on the payee line are sometimes followed by a verified tick or the amount
+    value = _AMOUNT_RE.split(value)[0].strip(" :-")
+    return value or None
+
+
+def detect_app(text):
+    """The template name matching ``text``, or None."""
+    for app, template in TEMPLATES.items():
+        if template["detect"].search(text):
+            return app
+    return None
+
+
+def parse_upi_text(text):
+    """
+    Extract ``amount``, ``date`` (YYYY-MM-DD), ``payee`` and ``upi_ref`` from
+    the OCR text of a UPI payment screenshot. Fields that cannot be found
+    are None; ``app`` names the template that was used.
+    """
+    text = text or ""
+    app = detect_app(text)
+    template = TEMPLATES[app] if app else GENERIC_TEMPLATE
+    lines = _lines(text)
+    fields = {"app": app, "amount": None, "date": None, "payee": None, "upi_ref": None}
+
+    for value in _after_label(lines, template["amount"]):
+        fields["amount"] = _amount(value)
+        if fields["amount"] is not None:
+            break
+    if fields["amount"] is None:
+        fields["amount"] = _amount(text)
+
+    for value in _after_label(lines, template["payee"]):
+        fields["payee"] = _payee(value)
+        if fields["payee"]:
+            break
+
+    for value in _after_label(lines, template["date"]):
+        fields["date"] = _date(value)
+        if fields["date"]:
+            break
+    if fields["date"] is None:
+        fields["date"] = _date(text)
+
+    for value in _after_label(lines, template["upi_ref"]):
+        match = _REF_RE.search(value)
+        if match:
+            fields["upi_ref"] = match.group(1)
+            break
+
+    return fields
+
+
+def is_complete(fields):
+    return all(fields.get(name) for name in REQUIRED_FIELDS)
@@ -0,0 +1,134 @@
+"""
+Persistent cache of embedding vectors, in front of AI.llm_gateway.embed_texts.
+
+    vectors = cached_embed_texts(texts, model="models/embedding-001",
+                                 call_site="chatbot.index", task_type="RETRIEVAL_DOCUMENT")
+
+A vector is stored under a SHA-256 of ``(model, task_type, text)``, so the
+same text is embedded once no matter which user or re-index asks for it
+(transactions at common merchants produce identical text across users).
+Only the misses are sent to the API, in embed_texts' batches.
+
+Entries live as float32 blobs in a SQLite file at EMBEDDING_CACHE_PATH
+(default .cache/embeddings.sqlite3), shared by every worker on the host.
+Set EMBEDDING_CACHE_PATH to an empty string to turn the cache off.
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from array import array
+from AI.llm_gateway import embed_texts
+
+logger = logging.getLogger(__name__)
+
+CACHE_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "embeddings.sqlite3"),
+)
+# What a missing directory, a read-only deploy or a broken file raises
+CACHE_ERRORS = (OSError, sqlite3.Error)
+# Keys looked up per SELECT; stays under SQLite's bound-parameter limit
+LOOKUP_CHUNK = 500
+
+_local = threading.local()
+_stats = {"hits": 0, "misses": 0}
+_stats_lock = threading.Lock()
+
+
+def cache_key(text, model, task_type=None):
+    return hashlib.sha256(f"{model}\0{task_type or ''}\0{text}".encode("utf-8")).hexdigest()
+
+
+def _connection():
+    """This thread's connection to the cache file, creating the table on first use."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        directory = os.path.dirname(CACHE_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(CACHE_PATH, timeout=10)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        except sqlite3.Error:
+            conn.close()
+            raise
+        _local.conn = conn
+    return conn
+
+
+def _lookup(keys):
+    conn = _connection()
+    found = {}
+    for offset in range(0, len(keys), LOOKUP_CHUNK):
+        chunk = keys[offset:offset + LOOKUP_CHUNK]
+        rows = conn.execute(
+            f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+        ).fetchall()
+        for key, blob in rows:
+            found[key] = array("f", blob).tolist()
+    return found
+
+
+def _store(entries):
+    conn = _connection()
+    with conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO embeddings (key, vector) VALUES (?, ?)",
+            [(key, array("f", vector).tobytes()) for key, vector in entries.items()],
+        )
+
+
+def cached_embed_texts(texts, *, model, call_site, task_type=None, user_id=None):
+    """
+    Embedding vectors for ``texts``, in order: cached ones from the cache
+    file, the rest from embed_texts (each distinct text once), which are
+    then added to the cache. Falls back to embedding everything if the
+    cache file cannot be used.
+    """
+    if not CACHE_PATH:
+        return embed_texts(texts, model=model, call_site=call_site, task_type=task_type, user_id=user_id)
+
+    keys = [cache_key(text, model, task_type) for text in texts]
+    try:
+        found = _lookup(list(set(keys)))
+    except CACHE_ERRORS as e:
+        logger.warning(f"Embedding cache unavailable, embedding without it: {e}")
+        return embed_texts(texts, model=model, call_site=call_site, task_type=task_type, user_id=user_id)
+
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in found:
+            missing.setdefault(key, text)
+    if missing:
+        vectors = embed_texts(list(missing.values()), model=model, call_site=call_site,
+                              task_type=task_type, user_id=user_id)
+        embedded = dict(zip(missing, vectors))
+        try:
+            _store(embedded)
+        except CACHE_ERRORS as e:
+            logger.warning(f"Could not save embeddings to the cache: {e}")
+        found.update(embedded)
+
+    with _stats_lock:
+        _stats["hits"] += len(texts) - len(missing)
+        _stats["misses"] += len(missing)
+    return [found[key] for key in keys]
+
+
+def get_embedding_cache_stats():
+    """
+    Hits and misses (texts) in this process, and the entries in the cache
+    file (None if there is no usable file yet; reading stats never creates it).
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["entries"] = None
+    if CACHE_PATH and (getattr(_local, "conn", None) is not None or os.path.exists(CACHE_PATH)):
+        try:
+            stats["entries"] = _connection().execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        except CACHE_ERRORS as e:
+            logger.warning(f"Could not read the embedding cache: {e}")
+    return stats
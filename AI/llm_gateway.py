@@ -0,0 +1,272 @@
+"""
+One way to call Gemini from anywhere in the app.
+
+    text = generate_text(prompt, model="gemini-flash-latest", call_site="insights.predictive")
+    text = generate_text([prompt, image], model=..., call_site=..., timeout=20)
+    vectors = embed_texts(texts, model="models/embedding-001", call_site="chatbot.index")
+
+Every call goes through the Gemini REST API on one process-wide
+``requests.Session``, so connections (and their TLS handshakes) are reused
+across requests and threads. ``timeout`` is per call and defaults to
+LLM_TIMEOUT seconds. Each call is logged and counted under its
+``call_site``: latency, tokens in and out, errors and refusals, as returned
+by get_llm_stats().
+
+Calls are also guarded by AI.llm_limits: a cap on calls in flight, a
+per-user token bucket (for calls made with ``user_id``) and a circuit
+breaker that fails calls fast while Gemini is down.
+"""
+import base64
+import io
+import logging
+import os
+import threading
+import time
+from collections import deque
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from AI.llm_limits import (
+    CircuitBreaker, ConcurrencyLimiter, LLMBusy, LLMError, LLMRateLimited,
+    LLMTimeout, LLMUnavailable, UserRateLimiter,
+)
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+API_ROOT = os.getenv("GEMINI_API_ROOT", "https://generativelanguage.googleapis.com/v1beta")
+DEFAULT_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+# Connections kept open to the API; calls beyond this many at once wait for one
+POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "10"))
+# batchEmbedContents accepts at most this many texts per request
+EMBED_BATCH_SIZE = 100
+# Latencies kept per call site for the percentiles in get_llm_stats()
+LATENCY_SAMPLES = 200
+
+_session = None
+_session_lock = threading.Lock()
+_stats = {}
+_stats_lock = threading.Lock()
+limiter = ConcurrencyLimiter()
+rate_limiter = UserRateLimiter()
+breaker = CircuitBreaker()
+# Refusals counted per call site, by exception type
+REFUSALS = {LLMBusy: "busy", LLMRateLimited: "rate_limited", LLMUnavailable: "breaker_open"}
+
+
+def api_key():
+    return os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, pool_block=True)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update({"Content-Type": "application/json"})
+                _session = session
+    return _session
+
+
+def _model_path(model):
+    return model if model.startswith("models/") else f"models/{model}"
+
+
+def _part(item):
+    """A request part for text, an image blob from image_preprocessing, or a PIL image."""
+    if isinstance(item, str):
+        return {"text": item}
+    if isinstance(item, dict):
+        data = item["data"]
+        mime_type = item.get("mime_type", "image/jpeg")
+    else:
+        out = io.BytesIO()
+        item.convert("RGB").save(out, format="JPEG", quality=90)
+        data, mime_type = out.getvalue(), "image/jpeg"
+    return {"inline_data": {"mime_type": mime_type, "data": base64.b64encode(data).decode("ascii")}}
+
+
+def _site(call_site):
+    """The stats entry for ``call_site``; call with _stats_lock held."""
+    return _stats.setdefault(call_site, {
+        "calls": 0, "errors": 0, "tokens_in": 0, "tokens_out": 0, "total_ms": 0.0,
+        "latencies": deque(maxlen=LATENCY_SAMPLES), "last_error": None,
+        "refused": {reason: 0 for reason in REFUSALS.values()},
+    })
+
+
+def _record(call_site, model, latency_ms, tokens_in=0, tokens_out=0, error=None):
+    with _stats_lock:
+        site = _site(call_site)
+        site["calls"] += 1
+        site["total_ms"] += latency_ms
+        site["latencies"].append(latency_ms)
+        site["tokens_in"] += tokens_in
+        site["tokens_out"] += tokens_out
+        if error is not None:
+            site["errors"] += 1
+            site["last_error"] = str(error)[:200]
+    logger.info(
+        "llm call site=%s model=%s status=%s latency_ms=%.1f tokens_in=%d tokens_out=%d",
+        call_site, model, "error" if error is not None else "ok", latency_ms, tokens_in, tokens_out,
+        extra={"llm_call": {"call_site": call_site, "model": model, "latency_ms": latency_ms,
+                            "tokens_in": tokens_in, "tokens_out": tokens_out,
+                            "error": str(error) if error is not None else None}},
+    )
+
+
+def _post(model, method, payload, timeout):
+    key = api_key()
+    if not key:
+        raise LLMError("GEMINI_API_KEY is not configured")
+    url = f"{API_ROOT}/{_model_path(model)}:{method}"
+    try:
+        response = get_session().post(url, json=payload, headers={"x-goog-api-key": key},
+                                      timeout=timeout or DEFAULT_TIMEOUT)
+    except requests.Timeout as e:
+        raise LLMTimeout(f"Gemini did not answer within {timeout or DEFAULT_TIMEOUT}s") from e
+    except requests.RequestException as e:
+        raise LLMError(f"Gemini request failed: {e}", outage=True) from e
+    if response.status_code != 200:
+        try:
+            message = response.json()["error"]["message"]
+        except (ValueError, KeyError, TypeError):
+            message = response.text[:200]
+        outage = response.status_code == 429 or response.status_code >= 500
+        raise LLMError(f"Gemini returned {response.status_code}: {message}", status=response.status_code, outage=outage)
+    return response.json()
+
+
+def _refuse(call_site, error):
+    with _stats_lock:
+        _site(call_site)["refused"][REFUSALS[type(error)]] += 1
+    logger.warning("llm call site=%s refused: %s", call_site, error)
+
+
+def _guarded_post(call_site, user_id, model, method, payload, timeout):
+    """
+    _post behind the circuit breaker, the per-user rate limit and the
+    in-flight cap. Refused calls are counted and re-raised without being made.
+    """
+    try:
+        # While the breaker is open, refuse before spending the user's tokens
+        breaker.before_call()
+        if user_id:
+            rate_limiter.take(user_id)
+        try:
+            with limiter.slot():
+                try:
+                    result = _post(model, method, payload, timeout)
+                except LLMError as e:
+                    breaker.record_failure(e)
+                    raise
+        except LLMBusy:
+            # Only the slot raises LLMBusy: the call was never made, so give the token back
+            if user_id:
+                rate_limiter.refund(user_id)
+            raise
+    except (LLMBusy, LLMRateLimited, LLMUnavailable) as e:
+        _refuse(call_site, e)
+        raise
+    breaker.record_success()
+    return result
+
+
+def generate_text(contents, *, model, call_site, timeout=None, temperature=None, max_output_tokens=None, user_id=None):
+    """
+    Send ``contents`` (a prompt, or a list of text and image parts) to
+    ``model`` and return the text of the first candidate. Raises LLMError
+    (LLMTimeout on timeout) when the call fails or returns no text, and one
+    of LLMBusy, LLMRateLimited (for ``user_id``) or LLMUnavailable when it
+    is refused without being made.
+    """
+    parts = [_part(item) for item in (contents if isinstance(contents, (list, tuple)) else [contents])]
+    payload = {"contents": [{"role": "user", "parts": parts}]}
+    config = {}
+    if temperature is not None:
+        config["temperature"] = temperature
+    if max_output_tokens is not None:
+        config["maxOutputTokens"] = max_output_tokens
+    if config:
+        payload["generationConfig"] = config
+
+    start = time.perf_counter()
+    tokens_in = tokens_out = 0
+    try:
+        result = _guarded_post(call_site, user_id, model, "generateContent", payload, timeout)
+        usage = result.get("usageMetadata", {})
+        tokens_in = usage.get("promptTokenCount", 0)
+        tokens_out = usage.get("candidatesTokenCount", 0)
+        candidates = result.get("candidates") or []
+        text = "".join(part.get("text", "") for part in candidates[0].get("content", {}).get("parts", [])) if candidates else ""
+        if not text:
+            reason = result.get("promptFeedback", {}).get("blockReason") or (candidates[0].get("finishReason") if candidates else None)
+            raise LLMError(f"Gemini returned no text ({reason or 'empty response'})")
+    except tuple(REFUSALS):
+        raise
+    except Exception as e:
+        _record(call_site, model, (time.perf_counter() - start) * 1000, tokens_in, tokens_out, error=e)
+        raise
+    _record(call_site, model, (time.perf_counter() - start) * 1000, tokens_in, tokens_out)
+    return text
+
+
+def embed_texts(texts, *, model, call_site, timeout=None, task_type=None, user_id=None):
+    """Embedding vectors for ``texts``, in order, sent in batches of EMBED_BATCH_SIZE."""
+    vectors = []
+    for offset in range(0, len(texts), EMBED_BATCH_SIZE):
+        batch = texts[offset:offset + EMBED_BATCH_SIZE]
+        batch_requests = []
+        for text in batch:
+            request = {"model": _model_path(model), "content": {"parts": [{"text": text}]}}
+            if task_type:
+                request["taskType"] = task_type
+            batch_requests.append(request)
+        start = time.perf_counter()
+        try:
+            result = _guarded_post(call_site, user_id, model, "batchEmbedContents", {"requests": batch_requests}, timeout)
+            embeddings = [embedding["values"] for embedding in result.get("embeddings", [])]
+            if len(embeddings) != len(batch):
+                raise LLMError(f"Gemini returned {len(embeddings)} embeddings for {len(batch)} texts")
+        except tuple(REFUSALS):
+            raise
+        except Exception as e:
+            _record(call_site, model, (time.perf_counter() - start) * 1000, error=e)
+            raise
+        # The embedding API does not report token usage; estimate it as for prompts (4 chars per token)
+        _record(call_site, model, (time.perf_counter() - start) * 1000, tokens_in=sum(len(t) for t in batch) // 4)
+        vectors.extend(embeddings)
+    return vectors
+
+
+def get_llm_stats():
+    """
+    Per call site: calls, errors, tokens in/out, average / p95 / max latency
+    in ms, and calls refused by the limits (which are not counted as calls).
+    """
+    with _stats_lock:
+        stats = {}
+        for call_site, site in _stats.items():
+            latencies = sorted(site["latencies"])
+            stats[call_site] = {
+                "calls": site["calls"],
+                "errors": site["errors"],
+                "refused": dict(site["refused"]),
+                "tokens_in": site["tokens_in"],
+                "tokens_out": site["tokens_out"],
+                "avg_ms": round(site["total_ms"] / site["calls"], 1) if site["calls"] else None,
+                "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 1) if latencies else None,
+                "max_ms": round(latencies[-1], 1) if latencies else None,
+                "last_error": site["last_error"],
+            }
+        return stats
+
+
+def get_llm_health():
+    """Circuit breaker state and calls in flight in this process."""
+    return {**breaker.snapshot(), "in_flight": limiter.in_flight, "max_in_flight": limiter.limit}
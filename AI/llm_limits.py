@@ -0,0 +1,206 @@
+"""
+Protection around Gemini calls, used by AI.llm_gateway.
+
+- ConcurrencyLimiter caps the model calls in flight. By default the cap is
+  per process. With LLM_SLOT_DIR set, it is shared by every process on the
+  host (all gunicorn workers) through lock files in that directory.
+- UserRateLimiter gives each user a token bucket: LLM_USER_BURST calls at
+  once, refilled at LLM_USER_RATE_PER_MINUTE.
+- CircuitBreaker opens after LLM_BREAKER_FAILURES consecutive outage
+  errors (timeouts, connection errors, 429 and 5xx). While it is open, calls
+  fail at once instead of waiting out their timeouts. After
+  LLM_BREAKER_COOLDOWN seconds one trial call is let through, and its
+  result closes or reopens the breaker.
+
+Each refusal raises an LLMError subclass, so callers' existing error
+handling (and their fallbacks) apply unchanged.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the per-process cap is available
+    fcntl = None
+
+MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "8"))
+# Seconds a call waits for a free slot before giving up
+QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "5"))
+SLOT_DIR = os.getenv("LLM_SLOT_DIR")
+USER_RATE_PER_MINUTE = float(os.getenv("LLM_USER_RATE_PER_MINUTE", "10"))
+USER_BURST = int(os.getenv("LLM_USER_BURST", "5"))
+BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+
+# Buckets are dropped once full again, when there are more than this many
+MAX_TRACKED_USERS = 10000
+SLOT_POLL_INTERVAL = 0.05
+
+
+class LLMError(Exception):
+    """
+    A Gemini call failed. ``status`` is the HTTP status when there was a
+    response; ``outage`` marks failures that count towards the circuit breaker.
+    """
+
+    def __init__(self, message, status=None, outage=False):
+        super().__init__(message)
+        self.status = status
+        self.outage = outage
+
+
+class LLMTimeout(LLMError):
+    """A Gemini call did not answer within its timeout."""
+
+    def __init__(self, message):
+        super().__init__(message, outage=True)
+
+
+class LLMBusy(LLMError):
+    """Every call slot stayed taken for QUEUE_TIMEOUT seconds."""
+
+
+class LLMRateLimited(LLMError):
+    """The user has used up their calls for now; ``retry_after`` is in seconds."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message, status=429)
+        self.retry_after = retry_after
+
+
+class LLMUnavailable(LLMError):
+    """The circuit breaker is open: Gemini has been failing, so the call was not made."""
+
+
+class ConcurrencyLimiter:
+    def __init__(self, limit=MAX_IN_FLIGHT, slot_dir=SLOT_DIR):
+        self.limit = limit
+        self.slot_dir = slot_dir if slot_dir and fcntl else None
+        self._semaphore = threading.BoundedSemaphore(limit)
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        if self.slot_dir:
+            os.makedirs(self.slot_dir, exist_ok=True)
+
+    def _acquire_file_slot(self, deadline):
+        paths = [os.path.join(self.slot_dir, f"llm-slot-{i}.lock") for i in range(self.limit)]
+        while True:
+            for path in paths:
+                fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return fd
+                except BlockingIOError:
+                    os.close(fd)
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(SLOT_POLL_INTERVAL)
+
+    @contextmanager
+    def slot(self, timeout=QUEUE_TIMEOUT):
+        """Hold one call slot for the duration of the block; raises LLMBusy if none frees up in time."""
+        if self.slot_dir:
+            fd = self._acquire_file_slot(time.monotonic() + timeout)
+            if fd is None:
+                raise LLMBusy(f"All {self.limit} Gemini call slots are busy")
+            release = lambda: (fcntl.flock(fd, fcntl.LOCK_UN), os.close(fd))
+        else:
+            if not self._semaphore.acquire(timeout=timeout):
+                raise LLMBusy(f"All {self.limit} Gemini call slots are busy")
+            release = self._semaphore.release
+        with self._lock:
+            self._in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            release()
+
+    @property
+    def in_flight(self):
+        """Calls in flight in this process."""
+        return self._in_flight
+
+
+class UserRateLimiter:
+    def __init__(self, rate_per_minute=USER_RATE_PER_MINUTE, burst=USER_BURST):
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, user_id):
+        """Spend one of ``user_id``'s tokens, or raise LLMRateLimited."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(user_id, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens < 1:
+                self._buckets[user_id] = (tokens, now)
+                retry_after = round((1 - tokens) / self.rate, 1)
+                raise LLMRateLimited(f"Too many AI requests; try again in {retry_after:.0f}s", retry_after)
+            self._buckets[user_id] = (tokens - 1, now)
+            if len(self._buckets) > MAX_TRACKED_USERS:
+                self._prune(now)
+
+    def refund(self, user_id):
+        """Give back a token taken for a call that was not made."""
+        with self._lock:
+            if user_id in self._buckets:
+                tokens, updated = self._buckets[user_id]
+                self._buckets[user_id] = (min(self.burst, tokens + 1), updated)
+
+    def _prune(self, now):
+        for user_id, (tokens, updated) in list(self._buckets.items()):
+            if tokens + (now - updated) * self.rate >= self.burst:
+                del self._buckets[user_id]
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold=BREAKER_FAILURES, cooldown=BREAKER_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise LLMUnavailable unless a call may go ahead now."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            now = time.monotonic()
+            if now - self.opened_at >= self.cooldown:
+                # Let one trial call through; if it never reports back,
+                # another is allowed after a further cooldown
+                self.state = self.HALF_OPEN
+                self.opened_at = now
+                return
+            raise LLMUnavailable("The AI service is temporarily unavailable; please try again shortly")
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self, error):
+        with self._lock:
+            if not getattr(error, "outage", False):
+                # The service answered (e.g. a 400), so it is up
+                self.state = self.CLOSED
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def snapshot(self):
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.failures}
@@ -0,0 +1,83 @@
+"""
+Embeddings computed locally with NumPy, for running the chatbot's vector
+index without the Gemini embedding API.
+
+    vectors = HashingEmbedder(dim=768).embed(["Expense: Swiggy Amount: ₹250 ..."])
+
+A hashing vectorizer: every text is split into features (lowercased words,
+adjacent word pairs, and character trigrams of longer words, so "grocery"
+still meets "groceries"), each feature is hashed to one of ``dim`` columns
+with a random sign, counts are damped with log1p and rows are L2
+normalised. Dates written as YYYY-MM-DD also contribute their month name
+and year, which is how questions refer to them ("in March").
+
+There is nothing to fit, so a text's vector never changes as more
+transactions are added and the same text always lands on the same vector.
+"""
+import calendar
+import os
+import re
+import zlib
+import numpy as np
+
+DIM = int(os.getenv("LOCAL_EMBEDDING_DIM", "768"))
+
+TOKEN_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}|[^\W_]+")
+DATE_PATTERN = re.compile(r"(\d{4})-(\d{2})-\d{2}")
+MONTH_NAMES = [name.lower() for name in calendar.month_name]
+# Words that appear in every document or question and only add noise
+STOP_WORDS = frozenset(
+    "a an and are at did do does for from how i in is me much my of on show the this to was what "
+    "when where which who with you your amount status type".split()
+)
+
+
+def _features(text):
+    words = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        date = DATE_PATTERN.fullmatch(token)
+        if date:
+            year, month = date.groups()
+            if 1 <= int(month) <= 12:
+                words.append(MONTH_NAMES[int(month)])
+            words.append(year)
+        elif token not in STOP_WORDS:
+            words.append(token)
+
+    features = list(words)
+    features.extend(f"{first} {second}" for first, second in zip(words, words[1:]))
+    for word in words:
+        if len(word) > 4 and not word.isdigit():
+            features.extend(f"#{word[i:i + 3]}" for i in range(len(word) - 2))
+    return features
+
+
+class HashingEmbedder:
+    def __init__(self, dim=DIM):
+        self.dim = dim
+        self.name = f"local-hashing-{dim}"
+        self._columns = {}
+
+    def _column(self, feature):
+        """Column and sign for ``feature``; crc32 is stable across processes, unlike hash()."""
+        column = self._columns.get(feature)
+        if column is None:
+            digest = zlib.crc32(feature.encode("utf-8"))
+            column = self._columns[feature] = (digest % self.dim, 1.0 if digest & 0x80000000 else -1.0)
+            if len(self._columns) > 200000:
+                self._columns.clear()
+        return column
+
+    def embed(self, texts):
+        """A ``len(texts) x dim`` float32 array of unit-length rows (all-zero for texts without features)."""
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            counts = {}
+            for feature in _features(text):
+                counts[feature] = counts.get(feature, 0) + 1
+            for feature, count in counts.items():
+                column, sign = self._column(feature)
+                matrix[row, column] += sign * np.log1p(count)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
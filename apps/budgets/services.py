@@ -1,9 +1,14 @@
 import json,logging
-import google.generativeai as genai
-from django.conf import settings
+from AI.llm_gateway import generate_text
 from apps.common_utils.firebase_service import get_user_categories, add_transaction, get_transactions, set_document, delete_transaction
 from google.cloud.firestore_v1.base_query import FieldFilter
 from apps.common_utils.firebase_config import db # Import db
+from apps.common_utils.rollup_service import get_monthly_rollups, sum_groups
+from apps.common_utils.request_loader import request_cached
+from apps.common_utils.concurrency import run_concurrently
+from functools import partial
+from apps.common_utils.llm_cache import cached_llm_result, BUDGET_CATEGORIZATION
+from apps.common_utils.prompt_builder import build_prompt, summarize_expenses
 from datetime import datetime # Import the datetime module
 
 # --- Service functions for Budgeting ---
@@ -66,6 +71,7 @@ def set_budget(user_id, category, budget, period):
     else:
         add_transaction(user_id, budget_data, "budgets")
 
+@request_cached("budgets")
 def get_budgets(user_id):
     all_budgets = get_transactions(user_id, "budgets")
     latest_budgets = {}
@@ -88,8 +94,9 @@ def delete_budget(user_id, budget_id):
     return delete_transaction(budget_id, "budgets", user_id)
 
 def get_budget_analysis(user_id):
-    user_budgets = get_budgets(user_id)
-    user_expenses = get_transactions(user_id, "expenses")
+    # Spend per category across all months comes from the monthly rollups
+    user_budgets, rollups = run_concurrently(partial(get_budgets, user_id), partial(get_monthly_rollups, user_id))
+    spent_by_category = sum_groups(rollups, "categories")
 
     total_budget = 0
     total_spent = 0
@@ -113,11 +120,8 @@ def get_budget_analysis(user_id):
             "display_name": "",
         }
 
-    for e in user_expenses:
-        cat_name = e.get("category")
-        if cat_name:
-            cat_name = cat_name.lower()
-        amount = float(e.get("amount", 0))
+    for cat_name, amount in spent_by_category.items():
+        cat_name = cat_name.lower()
 
         # Exact category matching
         if cat_name in budget_data_map:
@@ -151,7 +155,7 @@ def get_budget_analysis(user_id):
 
 # --- Service functions for Smart Saver (Stateless) ---
 
-def create_smart_saver_plan(data):
+def create_smart_saver_plan(data, user_id=None):
     """
     Generate a warm, budget-aware 'Smart Saver' plan using Gemini, JSON output ONLY.
     Impossible goals are rejected with a helpful message, and Gemini JSON is fully validated.
@@ -220,12 +224,10 @@ def create_smart_saver_plan(data):
     )
 
     try:
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        model = genai.GenerativeModel("gemini-1.5-flash-latest")
-        response = model.generate_content(prompt)
+        response_text = generate_text(prompt, model="gemini-1.5-flash-latest", call_site="budgets.smart_saver", user_id=user_id)
         logger.info("GenAI called successfully for plan")
 
-        plan_json_text = response.text.strip().lstrip("``````").strip()
+        plan_json_text = response_text.strip().lstrip("``````").strip()
         plan_data = json.loads(plan_json_text)
 
         # Output validation
@@ -251,6 +253,9 @@ def create_smart_saver_plan(data):
 
 # Smart Categorization
 
+# Bump when the prompt below changes so cached answers are not reused
+SMART_CATEGORIZATION_PROMPT_VERSION = 2
+
 def generate_smart_categorization(user_id):
     """
     Fetches all user expenses and uses the Gemini API to generate a
@@ -262,19 +267,14 @@ def generate_smart_categorization(user_id):
     if not all_expenses:
         return {"error": "No transactions found to analyze."}
 
-    # --- THIS IS THE FIX ---
-    # 2. Convert any datetime objects into JSON-serializable strings
-    for transaction in all_expenses:
-        if 'date' in transaction and isinstance(transaction['date'], datetime):
-            # Convert the datetime object to a standard ISO 8601 string format
-            transaction['date'] = transaction['date'].isoformat()
-    # --- END OF FIX ---
+    # 2. Aggregate them per merchant locally; IDs and item details stay out of the prompt
+    summary = summarize_expenses(all_expenses)
 
-    # 3. Construct a detailed prompt for the Gemini API
-    prompt = f"""
+    # 3. Construct a detailed prompt for the Gemini API, within the token budget
+    instructions = """
     You are an expert financial analyst for the "Neural Budget AI" app. Your task is to perform a detailed, hierarchical analysis of a user's spending.
 
-    Analyze the following list of transactions. For each transaction, first determine a general spending category (e.g., "Food & Dining", "Subscriptions & OTT", "Shopping", "Transport"). Then, within each category, identify specific merchants or sub-types (e.g., "Netflix", "Zomato", "Uber") by looking at the transaction name.
+    The user's transactions are summarised below, one row per merchant with its transaction count and total. For each merchant, first determine a general spending category (e.g., "Food & Dining", "Subscriptions & OTT", "Shopping", "Transport"). Then, within each category, list the specific merchants or sub-types (e.g., "Netflix", "Zomato", "Uber"). Put any rows summarised as "more rows" under a sub-category named "Other".
 
     Your final output must be a single, valid JSON object with one key: "analysis_results".
     The value of "analysis_results" should be an array of objects, where each object represents a main category.
@@ -289,21 +289,23 @@ def generate_smart_categorization(user_id):
     - "name": The specific merchant or sub-type (e.g., "Netflix").
     - "transaction_count": The number of transactions for this specific merchant.
     - "amount": The total amount spent on this specific merchant.
-
-    Here is the user's transaction data:
-    {json.dumps(all_expenses, indent=2)}
     """
+    prompt, _ = build_prompt(BUDGET_CATEGORIZATION, instructions, [
+        ("Merchants", ("merchant", "user category", "transactions", "total"), summary["merchants"]),
+    ])
 
-    # 4. Call the Gemini API and parse the response
-    try:
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        model = genai.GenerativeModel("gemini-1.5-flash-latest")
-        response = model.generate_content(prompt)
-        
-        result_text = response.text.strip().replace("```json", "").replace("```", "")
-        analysis_data = json.loads(result_text)
-        
-        return analysis_data
-    except Exception as e:
-        print(f"Gemini API Error: {e}")
-        return {"error": "The AI is currently busy and could not analyze your spending. Please try again later."}
\ No newline at end of file
+    # 4. Call the Gemini API and parse the response, unless this exact
+    # prompt was answered before
+    def ask_gemini():
+        try:
+            response_text = generate_text(prompt, model="gemini-1.5-flash-latest", call_site="budgets.smart_categorization", user_id=user_id)
+
+            result_text = response_text.strip().replace("```json", "").replace("```", "")
+            analysis_data = json.loads(result_text)
+
+            return analysis_data
+        except Exception as e:
+            print(f"Gemini API Error: {e}")
+            return {"error": "The AI is currently busy and could not analyze your spending. Please try again later."}
+
+    return cached_llm_result(BUDGET_CATEGORIZATION, SMART_CATEGORIZATION_PROMPT_VERSION, prompt, ask_gemini)
\ No newline at end of file
@@ -1,3 +1,5 @@
+import { awaitJob } from '/static/core/js/help.js';
+
 document.addEventListener('DOMContentLoaded', () => {
     const analyzeBtn = document.getElementById('analyze-btn');
     const spinner = document.getElementById('loading-spinner');
@@ -15,12 +17,8 @@ document.addEventListener('DOMContentLoaded', () => {
 
         try {
             const response = await fetch('/budgets/api/get-smart-analysis/');
-            const data = await response.json();
+            const data = await awaitJob(response);
 
-            if (!response.ok) {
-                throw new Error(data.error || 'Failed to get analysis.');
-            }
-            
             renderAnalysis(data.analysis_results);
 
         } catch (error) {
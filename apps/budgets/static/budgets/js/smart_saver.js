@@ -1,24 +1,6 @@
 // in apps/budgets/static/budgets/js/smart_saver.js
 
-/**
- * Helper function to get the CSRF token from the browser's cookies.
- * This is the official function provided in the Django documentation.
- */
-function getCookie(name) {
-    let cookieValue = null;
-    if (document.cookie && document.cookie !== '') {
-        const cookies = document.cookie.split(';');
-        for (let i = 0; i < cookies.length; i++) {
-            const cookie = cookies[i].trim();
-            // Does this cookie string begin with the name we want?
-            if (cookie.substring(0, name.length + 1) === (name + '=')) {
-                cookieValue = decodeURIComponent(cookie.substring(name.length + 1));
-                break;
-            }
-        }
-    }
-    return cookieValue;
-}
+import { awaitJob, getCookie } from '/static/core/js/help.js';
 
 document.addEventListener('DOMContentLoaded', () => {
     const form = document.getElementById('smart-saver-form');
@@ -44,14 +26,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 body: JSON.stringify(data)
             });
 
-            if (!response.ok) {
-                // Try to get a more specific error message from the backend if available
-                const errorData = await response.json().catch(() => ({}));
-                const errorMessage = errorData.error || 'Something went wrong. SAVI is taking a short nap!';
-                throw new Error(errorMessage);
-            }
-
-            const plan = await response.json();
+            const plan = await awaitJob(response);
             renderPlan(plan);
 
         } catch (error) {
@@ -6,6 +6,8 @@ from django.contrib import messages
 from django.http import JsonResponse
 
 from apps.common_utils.auth_utils import get_user_id
+from apps.common_utils.firebase_service import prefetch_user_documents
+from apps.common_utils.jobs import job_response
 from apps.budgets.services import (
     get_categories,
     set_budget as set_budget_service,
@@ -29,6 +31,7 @@ def set_budget(request):
         )
         return redirect("budgets:set_budget")
 
+    prefetch_user_documents(user_id)
     user_available_categories = get_categories(user_id)
     budget_analysis = get_budget_analysis(user_id)
 
@@ -72,8 +75,8 @@ def smart_saver(request):
     if request.method == "POST":
         try:
             data = json.loads(request.body)
-            plan_data = services.create_smart_saver_plan(data)
-            return JsonResponse(plan_data)
+            user_id = get_user_id(request)
+            return job_response(user_id, "smart_saver", services.create_smart_saver_plan, data, user_id=user_id)
         except Exception as e:
             return JsonResponse({"error": str(e)}, status=500)
 
@@ -88,11 +91,8 @@ def smart_categorization(request):
 
 
 def get_smart_analysis_data(request):
-    """API endpoint that returns the AI-generated spending analysis."""
+    """Starts the AI spending analysis as a background job; poll the returned status_url for it."""
     if request.method == "GET":
         user_id = get_user_id(request)
-        analysis_data = services.generate_smart_categorization(user_id)
-        if "error" in analysis_data:
-            return JsonResponse(analysis_data, status=400)
-        return JsonResponse(analysis_data)
+        return job_response(user_id, "budget_categorization", services.generate_smart_categorization, user_id)
     return JsonResponse({"error": "Invalid request method"}, status=405)
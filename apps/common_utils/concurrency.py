@@ -0,0 +1,62 @@
+"""
+Fan-out helper for independent Firestore queries.
+
+    expenses, incomes = run_concurrently(
+        partial(get_transactions, user_id, "expenses"),
+        partial(get_transactions, user_id, "incomes"),
+    )
+
+The calls run on one shared, bounded thread pool (``FANOUT_MAX_WORKERS``,
+default 8), so a page waits for its slowest query rather than the sum of
+them. Each call runs in a copy of the caller's context, which keeps the
+request's data loader active inside the workers.
+"""
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+
+_executor = None
+_executor_lock = threading.Lock()
+_worker = threading.local()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, "FANOUT_MAX_WORKERS", 8),
+                    thread_name_prefix="fanout",
+                )
+    return _executor
+
+
+def _run_in_worker(context, call):
+    _worker.active = True
+    try:
+        return context.run(call)
+    finally:
+        _worker.active = False
+
+
+def run_concurrently(*calls):
+    """
+    Run zero-argument callables concurrently and return their results in
+    order. If any call raises, the first exception (in argument order) is
+    re-raised once all of them have finished.
+
+    A call made from inside a pool worker runs its callables inline, so
+    nested fan-outs can never exhaust the pool and deadlock.
+    """
+    if len(calls) < 2 or getattr(_worker, "active", False):
+        return [call() for call in calls]
+
+    executor = _get_executor()
+    futures = [executor.submit(_run_in_worker, contextvars.copy_context(), call) for call in calls]
+    errors = [future.exception() for future in futures]
+    for error in errors:
+        if error is not None:
+            raise error
+    return [future.result() for future in futures]
@@ -1,5 +1,6 @@
 import os
 import json
+import atexit
 import firebase_admin
 from firebase_admin import credentials, firestore
 from dotenv import load_dotenv
@@ -8,8 +9,17 @@ load_dotenv()
 
 FIREBASE_API_KEY = os.getenv('FIREBASE_API_KEY')
 
+# 'firebase' (default) talks to Cloud Firestore; 'memory' swaps in the
+# in-process stand-in from memory_firestore.py so the app, tests and
+# benchmarks run offline. FIRESTORE_MEMORY_PATH keeps its data across runs.
+FIRESTORE_BACKEND = os.getenv('FIRESTORE_BACKEND', 'firebase').lower()
+
+if FIRESTORE_BACKEND == 'memory':
+    from apps.common_utils.memory_firestore import MemoryFirestoreClient
+    db = MemoryFirestoreClient(os.getenv('FIRESTORE_MEMORY_PATH'))
+    atexit.register(db.save)
 # Initialize Firebase Admin SDK
-if not firebase_admin._apps:
+elif not firebase_admin._apps:
     # Try to load from environment variable first (for Railway/production)
     firebase_creds_json = os.getenv('FIREBASE_CREDENTIALS')
     
@@ -3,19 +3,47 @@ from apps.common_utils.firebase_config import db
 from firebase_admin import auth, exceptions as firebase_exceptions, firestore
 import requests
 from apps.common_utils.firebase_config import FIREBASE_API_KEY
+from apps.common_utils.rollup_service import (
+    rollup_delta, rollup_ref, rollup_increments, accumulate_rollup, clear_user_rollups, ROLLUP_COLLECTIONS
+)
+from apps.common_utils.request_loader import current_loader, invalidate_request_cache, request_cached
 from django.conf import settings
 import os
+import threading
 
 FIREBASE_SIGN_IN_URL = "https://identitytoolkit.googleapis.com/v1/accounts:signInWithPassword"
 DEFAULT_PROFILE_PIC_URL = os.path.join(settings.MEDIA_URL, 'profile_photos', 'default_profile.jpg') # Assuming .jpeg
+MAX_BATCH_WRITES = 500  # Firestore's limit on operations per batch commit
+USER_DATA_COLLECTIONS = ("expenses", "incomes", "budgets", "user_categories", "categories", "category_corrections")
+DATA_WIPE_COLLECTION = "data_wipes"
+BULK_DELETE_MAX_ATTEMPTS = 5
+
+def get_document_data(collection, doc_id):
+    """
+    Return a document's data, or None if it does not exist. Within a request
+    the result is shared with every other caller asking for the same document.
+    """
+    loader = current_loader()
+    if loader is not None:
+        return loader.get_documents([(collection, doc_id)])[0]
+    doc = db.collection(collection).document(doc_id).get()
+    return doc.to_dict() if doc.exists else None
+
+def prefetch_user_documents(user_id):
+    """
+    Fetch the user's profile and categories documents in one round trip so
+    later get_user_profile / get_user_categories calls in this request are
+    served from memory. Does nothing outside a request.
+    """
+    loader = current_loader()
+    if loader is not None:
+        loader.get_documents([("user_profiles", user_id), ("user_categories", user_id)])
 
 def get_user_categories(user_id):
     """Fetch categories for a specific user from the single document storage."""
-    user_categories_doc_ref = db.collection("user_categories").document(user_id)
-    doc = user_categories_doc_ref.get()
+    categories_data = get_document_data("user_categories", user_id)
 
-    if doc.exists:
-        categories_data = doc.to_dict()
+    if categories_data is not None:
         categories = categories_data.get('categories', [])
         return categories
     else:
@@ -43,6 +71,7 @@ def copy_default_categories_to_user(user_id):
         'categories': default_category_names,
         'userId': user_id # Keep userId for potential future queries
     })
+    invalidate_request_cache(user_id)
 
 def add_category(user_id, category_name):
     """Adds a new category for a user."""
@@ -52,13 +81,194 @@ def add_category(user_id, category_name):
     })
 
 def add_transaction(user_id, transaction_data,collection):
-    """Add a transaction to Firestore."""
-    # print(typ)
-    transactions_ref = db.collection(collection)
-    transactions_ref.add({
+    """Add a transaction to Firestore, updating the user's monthly rollup in the same write."""
+    data = {
         "userId": user_id,
         **transaction_data
-    })
+    }
+    doc_ref = db.collection(collection).document()
+    delta = rollup_delta(user_id, collection, data)
+    invalidate_request_cache(user_id)
+    if delta is None:
+        doc_ref.set(data)
+        return
+
+    batch = db.batch()
+    batch.set(doc_ref, data)
+    rollup_doc_ref, rollup_payload = delta
+    batch.set(rollup_doc_ref, rollup_payload, merge=True)
+    batch.commit()
+
+def bulk_add_transactions(user_id, transactions, collection):
+    """
+    Add many transactions using batched writes.
+
+    Each commit carries at most MAX_BATCH_WRITES operations: the transaction
+    documents plus one merged rollup increment per month touched. Returns
+    ``{"added": int, "failures": [{"index": int, "error": str}, ...]}`` where
+    ``index`` is the position in ``transactions``.
+    """
+    added = 0
+    failures = []
+    pending = []
+    rollups = {}
+
+    def commit_pending():
+        nonlocal added
+        if not pending:
+            return
+        batch = db.batch()
+        for _, doc_ref, data in pending:
+            batch.set(doc_ref, data)
+        for month, rollup in rollups.items():
+            batch.set(rollup_ref(user_id, month), rollup_increments(rollup), merge=True)
+        try:
+            batch.commit()
+            added += len(pending)
+        except Exception as e:
+            failures.extend({"index": index, "error": str(e)} for index, _, _ in pending)
+        pending.clear()
+        rollups.clear()
+
+    invalidate_request_cache(user_id)
+    collection_ref = db.collection(collection)
+    for index, transaction in enumerate(transactions):
+        if not isinstance(transaction, dict):
+            failures.append({"index": index, "error": "Transaction must be an object"})
+            continue
+        try:
+            float(transaction.get("amount", 0))
+        except (ValueError, TypeError):
+            failures.append({"index": index, "error": "Invalid amount format"})
+            continue
+
+        # Room for this document plus, at worst, one more month's rollup
+        if len(pending) + len(rollups) + 2 > MAX_BATCH_WRITES:
+            commit_pending()
+
+        data = {
+            "userId": user_id,
+            **transaction
+        }
+        pending.append((index, collection_ref.document(), data))
+        if collection in ROLLUP_COLLECTIONS:
+            accumulate_rollup(rollups, user_id, collection, data)
+    commit_pending()
+
+    return {"added": added, "failures": failures}
+
+def begin_data_wipe(user_id, collections=USER_DATA_COLLECTIONS):
+    """
+    Mark the checkpoint in ``data_wipes/{user_id}`` as running and return its
+    state: a fresh one, or the unfinished one of a wipe that failed.
+    """
+    checkpoint_ref = db.collection(DATA_WIPE_COLLECTION).document(user_id)
+    checkpoint = checkpoint_ref.get()
+    state = checkpoint.to_dict() if checkpoint.exists else None
+    if not state or state.get("status") == "done" or state.get("collections") != list(collections):
+        state = {"userId": user_id, "collections": list(collections), "completed": [],
+                 "deleted": 0, "failed": 0}
+    # Deletes that failed last time are retried, so only this run's failures count
+    state["failed"] = 0
+    state["status"] = "running"
+    state["updated_at"] = firestore.SERVER_TIMESTAMP
+    checkpoint_ref.set(state)
+    return state
+
+def fail_data_wipe(user_id):
+    """Mark the user's wipe checkpoint as failed so it is resumed next time."""
+    db.collection(DATA_WIPE_COLLECTION).document(user_id).set(
+        {"status": "failed", "updated_at": firestore.SERVER_TIMESTAMP}, merge=True
+    )
+
+def bulk_delete_user_data(user_id, collections=USER_DATA_COLLECTIONS, page_size=MAX_BATCH_WRITES,
+                          on_progress=None, state=None):
+    """
+    Delete every document keyed to ``user_id`` in ``collections`` with a BulkWriter.
+
+    Documents are read a page at a time (IDs only) and deleted in parallel
+    batches. Progress is checkpointed to ``data_wipes/{user_id}`` after each
+    page, so a wipe that failed or was interrupted resumes with the
+    collections it had not finished. ``state`` is the checkpoint from
+    begin_data_wipe if the caller already marked the wipe as running.
+    ``on_progress(state)`` is called after each page. Returns the final
+    checkpoint state.
+    """
+    checkpoint_ref = db.collection(DATA_WIPE_COLLECTION).document(user_id)
+    if state is None:
+        state = begin_data_wipe(user_id, collections)
+
+    invalidate_request_cache(user_id)
+
+    lock = threading.Lock()
+    counts = {"deleted": 0, "failed": 0}
+
+    def on_result(reference, result, writer):
+        with lock:
+            counts["deleted"] += 1
+
+    def on_error(failure, writer):
+        if failure.attempts < BULK_DELETE_MAX_ATTEMPTS:
+            return True
+        with lock:
+            counts["failed"] += 1
+        print(f"Failed to delete {failure.operation.reference.path}: {failure.message}")
+        return False
+
+    writer = db.bulk_writer()
+    writer.on_write_result(on_result)
+    writer.on_write_error(on_error)
+    try:
+        for collection in collections:
+            if collection in state["completed"]:
+                continue
+            failed_before = counts["failed"]
+            query = (db.collection(collection)
+                     .where(filter=FieldFilter("userId", "==", user_id))
+                     .order_by("__name__")
+                     .select(["__name__"])  # document IDs only
+                     .limit(page_size))
+            last_doc = None
+            while True:
+                page = list((query.start_after(last_doc) if last_doc else query).stream())
+                for doc in page:
+                    writer.delete(doc.reference)
+                writer.flush()
+
+                with lock:
+                    state["deleted"] += counts["deleted"]
+                    counts["deleted"] = 0
+                    state["failed"] = counts["failed"]
+                state["updated_at"] = firestore.SERVER_TIMESTAMP
+                checkpoint_ref.set(state)
+                if on_progress:
+                    on_progress(dict(state, current_collection=collection))
+                if len(page) < page_size:
+                    break
+                last_doc = page[-1]
+
+            if counts["failed"] > failed_before:
+                continue
+            if collection in ROLLUP_COLLECTIONS:
+                clear_user_rollups(user_id)
+            state["completed"].append(collection)
+            checkpoint_ref.set(state)
+    except Exception:
+        state["status"] = "failed"
+        checkpoint_ref.set(state)
+        raise
+    finally:
+        writer.close()
+
+    state["status"] = "done" if len(state["completed"]) == len(collections) else "failed"
+    state["updated_at"] = firestore.SERVER_TIMESTAMP
+    checkpoint_ref.set(state)
+    return state
+
+def get_data_wipe_status(user_id):
+    """Return the last checkpoint written by bulk_delete_user_data, or None."""
+    doc = db.collection(DATA_WIPE_COLLECTION).document(user_id).get()
+    return doc.to_dict() if doc.exists else None
 
 def set_document(collection_name, doc_id, data):
     """
@@ -66,6 +276,7 @@ def set_document(collection_name, doc_id, data):
     """
     doc_ref = db.collection(collection_name).document(doc_id)
     doc_ref.set(data)
+    invalidate_request_cache(data.get("userId"))
 
 def create_user_profile(uid, email, display_name, first_name=None, last_name=None, phone_number=None):
     """Creates an initial user profile document in Firestore."""
@@ -81,13 +292,12 @@ def create_user_profile(uid, email, display_name, first_name=None, last_name=Non
     if phone_number: profile_data['phone_number'] = phone_number
 
     user_profile_ref.set(profile_data)
+    invalidate_request_cache(uid)
 
 def get_user_profile(uid):
     """Retrieves a user profile document from Firestore."""
-    user_profile_ref = db.collection('user_profiles').document(uid)
-    doc = user_profile_ref.get()
-    if doc.exists:
-        profile_data = doc.to_dict()
+    profile_data = get_document_data('user_profiles', uid)
+    if profile_data is not None:
         # Ensure photo_url exists, default if not
         if 'photo_url' not in profile_data or not profile_data['photo_url']:
             profile_data['photo_url'] = DEFAULT_PROFILE_PIC_URL
@@ -98,19 +308,38 @@ def update_user_profile(uid, data):
     """Updates a user profile document in Firestore."""
     user_profile_ref = db.collection('user_profiles').document(uid)
     user_profile_ref.update(data)
+    invalidate_request_cache(uid)
 
 def update_user_profile_picture(uid, photo_url):
     """Updates only the profile picture URL in a user's profile."""
     user_profile_ref = db.collection('user_profiles').document(uid)
     user_profile_ref.update({'photo_url': photo_url})
+    invalidate_request_cache(uid)
+
+@request_cached("transactions")
+def get_transactions(user_id, collection, limit=None, since=None, until=None, order_by=None, descending=False):
+    """
+    Fetch a user's documents from ``collection``.
 
-def get_transactions(user_id,collection):
+    ``since`` (inclusive) and ``until`` (exclusive) become range filters on
+    ``date`` so only the requested window is read from Firestore; ``order_by``
+    and ``limit`` are applied server-side as well.
+    """
     try:
         transactions_ref = db.collection(collection)
     except Exception as e:
         print(e)
         return []
     query = transactions_ref.where(filter=FieldFilter("userId", "==", user_id))
+    if since is not None:
+        query = query.where(filter=FieldFilter("date", ">=", since))
+    if until is not None:
+        query = query.where(filter=FieldFilter("date", "<", until))
+    if order_by:
+        direction = firestore.Query.DESCENDING if descending else firestore.Query.ASCENDING
+        query = query.order_by(order_by, direction=direction)
+    if limit:
+        query = query.limit(limit)
     
     query = query.get()
     
@@ -121,6 +350,54 @@ def get_transactions(user_id,collection):
         transactions.append(transaction)
     return transactions
 
+def aggregate_transactions(user_id, collection, since=None, until=None, filters=None):
+    """
+    Count, sum and average a user's ``amount`` values with a server-side
+    aggregation query, without reading the documents themselves.
+
+    ``since``/``until`` and ``filters`` work as in get_transactions /
+    get_transactions_page. Returns ``{"count": int, "total": float,
+    "average": float}``; non-numeric amounts are ignored by Firestore.
+    """
+    query = db.collection(collection).where(filter=FieldFilter("userId", "==", user_id))
+    if since is not None:
+        query = query.where(filter=FieldFilter("date", ">=", since))
+    if until is not None:
+        query = query.where(filter=FieldFilter("date", "<", until))
+    for field, op, value in filters or []:
+        query = query.where(filter=FieldFilter(field, op, value))
+    aggregation = query.count(alias="count").sum("amount", alias="total").avg("amount", alias="average")
+    results = {result.alias: result.value for result in aggregation.get()[0]}
+    return {
+        "count": int(results.get("count") or 0),
+        "total": float(results.get("total") or 0),
+        "average": float(results.get("average") or 0),
+    }
+
+def get_transactions_page(user_id, collection, order_field="date", descending=True, limit=10, start_after=None, filters=None):
+    """
+    Fetch one page of a user's transactions ordered by ``order_field``.
+
+    Ties are broken by document ID so the ordering is total. ``start_after``
+    is the ``(value, doc_id)`` pair of the last row already returned; only
+    ``limit`` documents are read regardless of how many the user has.
+    """
+    direction = firestore.Query.DESCENDING if descending else firestore.Query.ASCENDING
+    query = db.collection(collection).where(filter=FieldFilter("userId", "==", user_id))
+    for field, op, value in filters or []:
+        query = query.where(filter=FieldFilter(field, op, value))
+    query = query.order_by(order_field, direction=direction).order_by("__name__", direction=direction)
+    if start_after is not None:
+        value, doc_id = start_after
+        query = query.start_after({order_field: value, "__name__": doc_id})
+
+    transactions = []
+    for doc in query.limit(limit).stream():
+        transaction = doc.to_dict()
+        transaction["id"] = doc.id
+        transactions.append(transaction)
+    return transactions
+
 def add_category(category_name):
     """Add a category to Firestore."""
     categories_ref = db.collection("categories")
@@ -136,9 +413,25 @@ def delete_transaction(transaction_id, collection, user_id):
     the user owns the transaction they are trying to delete.
     """
     # TODO: Add a security rule or check to verify user_id owns the transaction_id
-    db.collection(collection).document(transaction_id).delete()
+    doc_ref = db.collection(collection).document(transaction_id)
+    invalidate_request_cache(user_id)
+    if collection in ROLLUP_COLLECTIONS:
+        _delete_with_rollup(db.transaction(), doc_ref, collection)
+    else:
+        doc_ref.delete()
     print(f"Deleted transaction {transaction_id} from {collection}")
 
+@firestore.transactional
+def _delete_with_rollup(transaction, doc_ref, collection):
+    """Delete a transaction and subtract it from its month's rollup atomically."""
+    snapshot = doc_ref.get(transaction=transaction)
+    if not snapshot.exists:
+        return
+    data = snapshot.to_dict()
+    transaction.delete(doc_ref)
+    rollup_doc_ref, rollup_payload = rollup_delta(data.get("userId"), collection, data, sign=-1)
+    transaction.set(rollup_doc_ref, rollup_payload, merge=True)
+
 def firebase_login(email, password):
     payload = {
         "email": email,
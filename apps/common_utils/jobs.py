@@ -0,0 +1,142 @@
+"""
+Background jobs for slow, LLM-backed requests.
+
+``submit_job`` records a job in the ``jobs`` collection and runs it on a
+bounded in-process thread pool (``JOB_MAX_WORKERS``, default 4), so the web
+worker that received the request is free again immediately. The job
+document holds the status (``queued`` -> ``running`` -> ``done``/``failed``)
+and the result, so any web process can answer ``GET /jobs/<job_id>/``.
+
+Jobs are not persisted across restarts: one still queued or running when its
+process exits stays in that state until it expires (``expires_at``, for a
+Firestore TTL policy on ``jobs``). Clients stop polling after a timeout.
+"""
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from django.conf import settings
+from django.http import JsonResponse
+from django.urls import reverse
+from apps.common_utils.firebase_config import db
+from apps.common_utils.llm_cache import fingerprint
+
+logger = logging.getLogger(__name__)
+
+JOB_COLLECTION = "jobs"
+JOB_RETENTION = timedelta(days=1)
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class JobQueueFull(Exception):
+    """Raised by submit_job when JOB_MAX_PENDING jobs are already waiting or running."""
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_lock = threading.Lock()
+_pending = 0
+# (user_id, kind, input fingerprint) -> job_id of the job queued or running for it
+_active = {}
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, "JOB_MAX_WORKERS", 4),
+                    thread_name_prefix="job",
+                )
+    return _executor
+
+
+def _job_ref(job_id):
+    return db.collection(JOB_COLLECTION).document(job_id)
+
+
+def _run(job_id, dedupe_key, func, args, kwargs):
+    global _pending
+    ref = _job_ref(job_id)
+    try:
+        ref.update({"status": RUNNING, "started_at": datetime.now(timezone.utc)})
+        result = func(*args, **kwargs)
+        ref.update({"status": DONE, "result": result, "finished_at": datetime.now(timezone.utc)})
+    except Exception as e:
+        logger.exception("Job %s failed", job_id)
+        ref.update({"status": FAILED, "error": str(e), "finished_at": datetime.now(timezone.utc)})
+    finally:
+        with _lock:
+            _pending -= 1
+            _active.pop(dedupe_key, None)
+
+
+def submit_job(user_id, kind, func, *args, **kwargs):
+    """
+    Run ``func(*args, **kwargs)`` in the background and return the job ID.
+
+    The result must be JSON-like (it is stored on the job document).
+    Submitting the same ``kind`` with the same arguments while such a job is
+    still queued or running returns the existing job's ID instead of
+    starting another. Raises JobQueueFull when the queue is at capacity.
+    """
+    global _pending
+    dedupe_key = (user_id, kind, fingerprint([args, kwargs]))
+    with _lock:
+        if dedupe_key in _active:
+            return _active[dedupe_key]
+        if _pending >= getattr(settings, "JOB_MAX_PENDING", 100):
+            raise JobQueueFull("Too many requests are being processed. Please try again shortly.")
+        job_id = uuid.uuid4().hex
+        _active[dedupe_key] = job_id
+        _pending += 1
+
+    now = datetime.now(timezone.utc)
+    try:
+        _job_ref(job_id).set({
+            "userId": user_id,
+            "kind": kind,
+            "status": QUEUED,
+            "created_at": now,
+            "expires_at": now + JOB_RETENTION,
+        })
+        _get_executor().submit(_run, job_id, dedupe_key, func, args, kwargs)
+    except Exception:
+        with _lock:
+            _pending -= 1
+            _active.pop(dedupe_key, None)
+        raise
+    return job_id
+
+
+def get_job(job_id, user_id):
+    """Return the job's public state, or None if it does not exist or belongs to someone else."""
+    if not user_id:
+        return None
+    doc = _job_ref(job_id).get()
+    if not doc.exists:
+        return None
+    job = doc.to_dict()
+    if job.get("userId") != user_id:
+        return None
+    state = {"job_id": job_id, "kind": job.get("kind"), "status": job.get("status")}
+    if job.get("status") == DONE:
+        state["result"] = job.get("result")
+    elif job.get("status") == FAILED:
+        state["error"] = job.get("error")
+    return state
+
+
+def job_response(user_id, kind, func, *args, **kwargs):
+    """Submit a job and answer 202 with where to poll for it (503 if the queue is full)."""
+    try:
+        job_id = submit_job(user_id, kind, func, *args, **kwargs)
+    except JobQueueFull as e:
+        return JsonResponse({"error": str(e)}, status=503)
+    return JsonResponse({
+        "job_id": job_id,
+        "status": QUEUED,
+        "status_url": reverse("core:job_status", args=[job_id]),
+    }, status=202)
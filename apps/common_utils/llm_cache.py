@@ -0,0 +1,97 @@
+"""
+Content-addressed cache for Gemini results.
+
+A result is stored under a hash of ``(namespace, prompt version, inputs)``,
+where ``inputs`` is everything the prompt is built from (e.g. the user's
+transactions). Asking again with unchanged data returns the stored result
+without calling the model; any change to the data, or a bump of the prompt
+version, produces a new key.
+
+Entries live in the ``llm`` cache configured in settings (file-based, so
+they survive restarts), which expires them after ``LLM_CACHE_TTL`` seconds
+and culls the oldest once ``LLM_CACHE_MAX_ENTRIES`` is reached.
+"""
+import hashlib
+import json
+import logging
+import threading
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+CACHE_ALIAS = "llm"
+STATS_KEY = "llm-cache:stats:{namespace}:{outcome}"
+
+# One namespace per cached prompt
+SMART_CATEGORIZATION = "smart_categorization"
+BUDGET_CATEGORIZATION = "budget_categorization"
+PREDICTIVE_ANALYSIS = "predictive_analysis"
+INVESTMENT_GUIDE = "investment_guide"
+NAMESPACES = (SMART_CATEGORIZATION, BUDGET_CATEGORIZATION, PREDICTIVE_ANALYSIS, INVESTMENT_GUIDE)
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def fingerprint(inputs):
+    """Stable SHA-256 of JSON-like ``inputs`` (dict key order does not matter)."""
+    canonical = json.dumps(inputs, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _cacheable(result):
+    # The services report failures as {"error": ...}; those are retried, not cached.
+    return result is not None and not (isinstance(result, dict) and "error" in result)
+
+
+def _count(cache, namespace, outcome):
+    with _stats_lock:
+        counts = _stats.setdefault(namespace, {"hits": 0, "misses": 0})
+        counts[outcome] += 1
+    # Shared totals across worker processes
+    key = STATS_KEY.format(namespace=namespace, outcome=outcome)
+    try:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def cached_llm_result(namespace, version, inputs, compute, timeout=None):
+    """
+    Return the cached result for ``inputs`` or call ``compute()`` and cache it.
+
+    ``version`` identifies the prompt template; bump it whenever the prompt
+    changes so old answers are not served. Results that are ``None`` or carry
+    an ``"error"`` key are returned but not cached.
+    """
+    cache = caches[CACHE_ALIAS]
+    key = f"{namespace}:v{version}:{fingerprint(inputs)}"
+    result = cache.get(key)
+    if result is not None:
+        _count(cache, namespace, "hits")
+        logger.info("LLM cache hit for %s", namespace)
+        return result
+
+    _count(cache, namespace, "misses")
+    result = compute()
+    if _cacheable(result):
+        cache.set(key, result, timeout=timeout if timeout is not None else cache.default_timeout)
+    return result
+
+
+def get_cache_stats(namespaces=NAMESPACES):
+    """
+    Hit/miss counters per namespace: ``process`` counts this process since
+    start-up, ``total`` counts all processes sharing the cache.
+    """
+    cache = caches[CACHE_ALIAS]
+    with _stats_lock:
+        process = {namespace: dict(counts) for namespace, counts in _stats.items()}
+    total = {}
+    for namespace in sorted(set(namespaces) | set(process)):
+        total[namespace] = {
+            outcome: cache.get(STATS_KEY.format(namespace=namespace, outcome=outcome), 0)
+            for outcome in ("hits", "misses")
+        }
+    return {"process": process, "total": total}
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from apps.common_utils.firebase_config import db
+from apps.common_utils.rollup_service import rebuild_user_rollups
+
+
+class Command(BaseCommand):
+    help = "Backfill the user_rollups/{uid}/months documents from raw incomes and expenses."
+
+    def add_arguments(self, parser):
+        parser.add_argument("user_ids", nargs="*", help="Users to rebuild (default: every user profile).")
+
+    def handle(self, *args, **options):
+        user_ids = options["user_ids"] or [doc.id for doc in db.collection("user_profiles").stream()]
+        for user_id in user_ids:
+            months = rebuild_user_rollups(user_id)
+            self.stdout.write(f"Rebuilt {months} month(s) for {user_id}")
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rollups for {len(user_ids)} user(s)."))
@@ -0,0 +1,946 @@
+"""
+In-process stand-in for the Firestore client.
+
+Implements the subset of the ``google.cloud.firestore`` client API that the
+app uses (collections, documents, queries with ``FieldFilter``, ordering,
+cursors, limits, batches, transactions, ``BulkWriter``, aggregation queries
+and field transforms such as ``Increment``) on top of plain dictionaries, so
+the app, its tests and its benchmarks can run without Firebase credentials.
+
+Select it with ``FIRESTORE_BACKEND=memory`` (see ``firebase_config.py``).
+Set ``FIRESTORE_MEMORY_PATH`` to persist the data between runs.
+"""
+import bisect
+import copy
+import itertools
+import os
+import pickle
+import threading
+import uuid
+from datetime import datetime, timezone
+
+from google.api_core import exceptions as gexc
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1.base_aggregation import AggregationResult
+from google.cloud.firestore_v1.base_query import BaseFilter, FieldFilter
+from google.cloud.firestore_v1.field_path import FieldPath, parse_field_path
+
+MAX_BATCH_WRITES = 500
+DOCUMENT_ID = "__name__"
+ASCENDING = "ASCENDING"
+DESCENDING = "DESCENDING"
+
+_MISSING = object()
+
+
+# --- Value helpers ---
+
+def _normalize(value):
+    """Store values the way Firestore returns them (UTC-aware timestamps)."""
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc)
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def _type_rank(value):
+    """Firestore's cross-type ordering: null < bool < number < timestamp < string < ..."""
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, datetime):
+        return 3
+    if isinstance(value, str):
+        return 4
+    if isinstance(value, bytes):
+        return 5
+    if isinstance(value, DocumentReference):
+        return 6
+    if isinstance(value, (list, tuple)):
+        return 8
+    return 9
+
+
+def _sort_key(value):
+    rank = _type_rank(value)
+    if rank == 6:
+        return (rank, value.path)
+    if rank in (8, 9):
+        return (rank, repr(value))
+    return (rank, value)
+
+
+_parsed_field_paths = {}
+
+
+def _field_parts(field_path):
+    if isinstance(field_path, FieldPath):
+        return list(field_path.parts)
+    if field_path == DOCUMENT_ID:
+        return [DOCUMENT_ID]
+    # Queries evaluate the same few paths against every document
+    parts = _parsed_field_paths.get(field_path)
+    if parts is None:
+        parts = _parsed_field_paths[field_path] = parse_field_path(field_path)
+    return parts
+
+
+def _get_field(doc_id, data, field_path):
+    parts = _field_parts(field_path)
+    if parts == [DOCUMENT_ID]:
+        return doc_id
+    value = data
+    for part in parts:
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _compare(left, op, right):
+    if op == "==":
+        return _type_rank(left) == _type_rank(right) and left == right
+    if op == "!=":
+        return left is not None and left != right
+    if op == "in":
+        return any(_compare(left, "==", candidate) for candidate in right)
+    if op == "not-in":
+        return left is not None and all(not _compare(left, "==", candidate) for candidate in right)
+    if op == "array_contains":
+        return isinstance(left, list) and right in left
+    if op == "array_contains_any":
+        return isinstance(left, list) and any(candidate in left for candidate in right)
+    # Range comparisons only match values of the same type class.
+    if _type_rank(left) != _type_rank(right):
+        return False
+    if op == "<":
+        return left < right
+    if op == "<=":
+        return left <= right
+    if op == ">":
+        return left > right
+    if op == ">=":
+        return left >= right
+    raise ValueError(f"Unsupported operator: {op}")
+
+
+def _apply_value(current, value):
+    """Resolve sentinels and transforms against the stored value."""
+    if value is transforms.SERVER_TIMESTAMP:
+        return datetime.now(timezone.utc)
+    if isinstance(value, transforms.Increment):
+        base = current if isinstance(current, (int, float)) and not isinstance(current, bool) else 0
+        return base + value.value
+    if isinstance(value, transforms.Maximum):
+        return value.value if not isinstance(current, (int, float)) else max(current, value.value)
+    if isinstance(value, transforms.Minimum):
+        return value.value if not isinstance(current, (int, float)) else min(current, value.value)
+    if isinstance(value, transforms.ArrayUnion):
+        existing = list(current) if isinstance(current, list) else []
+        return existing + [v for v in value.values if v not in existing]
+    if isinstance(value, transforms.ArrayRemove):
+        existing = list(current) if isinstance(current, list) else []
+        return [v for v in existing if v not in value.values]
+    if isinstance(value, dict):
+        base = current if isinstance(current, dict) else {}
+        return {k: _apply_value(base.get(k, _MISSING), v) for k, v in value.items()
+                if v is not transforms.DELETE_FIELD}
+    return _normalize(value)
+
+
+def _merge_into(target, data):
+    for key, value in data.items():
+        if value is transforms.DELETE_FIELD:
+            target.pop(key, None)
+        elif isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge_into(target[key], value)
+        else:
+            target[key] = _apply_value(target.get(key, _MISSING), value)
+
+
+def _set_nested(target, parts, value):
+    for part in parts[:-1]:
+        if not isinstance(target.get(part), dict):
+            target[part] = {}
+        target = target[part]
+    if value is transforms.DELETE_FIELD:
+        target.pop(parts[-1], None)
+    else:
+        target[parts[-1]] = _apply_value(target.get(parts[-1], _MISSING), value)
+
+
+# --- Storage ---
+
+def _index_key(value):
+    try:
+        hash(value)
+    except TypeError:
+        return (_type_rank(value), repr(value))
+    return (_type_rank(value), value)
+
+
+class _Store:
+    """Documents keyed by collection path, plus read/write counters.
+
+    Stored documents are never mutated in place (writes replace them), so
+    snapshots can share them and only copy on ``to_dict()``.
+
+    Like Firestore's indexes, ``equal_ids`` keeps a ``{value: doc ids}`` map
+    per queried field, so ``userId ==`` queries look at one user's documents
+    instead of the whole collection, and ``sorted_ids`` keeps those documents
+    ordered by a second field, so ordered queries with a limit stop early.
+    Both are built on first use and maintained on every write.
+    """
+
+    def __init__(self):
+        self.collections = {}
+        self.indexes = {}
+        self.sorted_indexes = {}
+        self.lock = threading.RLock()
+        self.reads = 0
+        self.writes = 0
+        self.deletes = 0
+
+    def docs(self, collection_path):
+        return self.collections.setdefault(collection_path, {})
+
+    def get(self, collection_path, doc_id):
+        return self.collections.get(collection_path, {}).get(doc_id)
+
+    def put(self, collection_path, doc_id, data):
+        docs = self.docs(collection_path)
+        self._unindex(collection_path, doc_id, docs.get(doc_id))
+        docs[doc_id] = data
+        for field_path, index in self.indexes.get(collection_path, {}).items():
+            value = _get_field(doc_id, data, field_path)
+            if value is not _MISSING:
+                index.setdefault(_index_key(value), set()).add(doc_id)
+        for entries, entry in self._sorted_entries(collection_path, doc_id, data):
+            bisect.insort(entries, entry)
+        self.writes += 1
+
+    def remove(self, collection_path, doc_id):
+        self._unindex(collection_path, doc_id, self.collections.get(collection_path, {}).pop(doc_id, None))
+        self.deletes += 1
+
+    def _unindex(self, collection_path, doc_id, data):
+        if data is None:
+            return
+        for field_path, index in self.indexes.get(collection_path, {}).items():
+            value = _get_field(doc_id, data, field_path)
+            if value is not _MISSING:
+                index.get(_index_key(value), set()).discard(doc_id)
+        for entries, entry in self._sorted_entries(collection_path, doc_id, data):
+            position = bisect.bisect_left(entries, entry)
+            if position < len(entries) and entries[position] == entry:
+                del entries[position]
+
+    def _sorted_entries(self, collection_path, doc_id, data):
+        """Yield ``(index entries, entry)`` for each sorted index ``data`` belongs to."""
+        for (eq_field, eq_key, order_field), entries in self.sorted_indexes.get(collection_path, {}).items():
+            eq_value = _get_field(doc_id, data, eq_field)
+            if eq_value is _MISSING or _index_key(eq_value) != eq_key:
+                continue
+            value = _get_field(doc_id, data, order_field)
+            if value is not _MISSING:
+                yield entries, (_sort_key(value), doc_id)
+
+    def equal_ids(self, collection_path, field_path, value):
+        """IDs of the documents in ``collection_path`` whose field equals ``value``."""
+        indexes = self.indexes.setdefault(collection_path, {})
+        index = indexes.get(field_path)
+        if index is None:
+            index = indexes[field_path] = {}
+            for doc_id, data in self.collections.get(collection_path, {}).items():
+                field_value = _get_field(doc_id, data, field_path)
+                if field_value is not _MISSING:
+                    index.setdefault(_index_key(field_value), set()).add(doc_id)
+        return index.get(_index_key(value), ())
+
+    def sorted_ids(self, collection_path, eq_field, eq_value, order_field):
+        """
+        ``[(sort key, doc id)]`` for the documents whose ``eq_field`` equals
+        ``eq_value`` and that have ``order_field``, in ascending order.
+        """
+        indexes = self.sorted_indexes.setdefault(collection_path, {})
+        key = (eq_field, _index_key(eq_value), order_field)
+        entries = indexes.get(key)
+        if entries is None:
+            docs = self.collections.get(collection_path, {})
+            entries = []
+            for doc_id in self.equal_ids(collection_path, eq_field, eq_value):
+                value = _get_field(doc_id, docs[doc_id], order_field)
+                if value is not _MISSING:
+                    entries.append((_sort_key(value), doc_id))
+            entries.sort()
+            indexes[key] = entries
+        return entries
+
+    def clear(self):
+        self.collections.clear()
+        self.indexes.clear()
+        self.sorted_indexes.clear()
+
+
+class DocumentSnapshot:
+    def __init__(self, reference, data, read_time=None):
+        self.reference = reference
+        self._data = data
+        self.read_time = read_time or datetime.now(timezone.utc)
+
+    @property
+    def id(self):
+        return self.reference.id
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field_path):
+        value = _get_field(self.id, self._data or {}, field_path)
+        if value is _MISSING:
+            raise KeyError(field_path)
+        return copy.deepcopy(value)
+
+
+class DocumentReference:
+    def __init__(self, client, collection_path, doc_id):
+        self._client = client
+        self._collection_path = collection_path
+        self.id = doc_id
+
+    @property
+    def path(self):
+        return f"{self._collection_path}/{self.id}"
+
+    @property
+    def _document_path(self):
+        return self.path
+
+    @property
+    def parent(self):
+        return CollectionReference(self._client, self._collection_path)
+
+    def __eq__(self, other):
+        return isinstance(other, DocumentReference) and other.path == self.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+    def collection(self, collection_id):
+        return CollectionReference(self._client, f"{self.path}/{collection_id}")
+
+    def get(self, field_paths=None, transaction=None, **kwargs):
+        store = self._client._store
+        with store.lock:
+            store.reads += 1
+            data = store.get(self._collection_path, self.id)
+            return DocumentSnapshot(self, data)
+
+    def create(self, document_data):
+        with self._client._store.lock:
+            if self._client._store.get(self._collection_path, self.id) is not None:
+                raise gexc.AlreadyExists(f"Document already exists: {self.path}")
+            self._write_set(document_data, merge=False)
+
+    def set(self, document_data, merge=False):
+        with self._client._store.lock:
+            self._write_set(document_data, merge)
+
+    def update(self, field_updates, option=None):
+        with self._client._store.lock:
+            self._write_update(field_updates)
+
+    def delete(self, option=None):
+        with self._client._store.lock:
+            self._client._store.remove(self._collection_path, self.id)
+
+    def _write_set(self, document_data, merge):
+        store = self._client._store
+        if merge:
+            current = copy.deepcopy(store.get(self._collection_path, self.id)) or {}
+            _merge_into(current, document_data)
+        else:
+            current = _apply_value({}, document_data)
+        store.put(self._collection_path, self.id, current)
+
+    def _write_update(self, field_updates):
+        store = self._client._store
+        current = store.get(self._collection_path, self.id)
+        if current is None:
+            raise gexc.NotFound(f"No document to update: {self.path}")
+        current = copy.deepcopy(current)
+        for field_path, value in field_updates.items():
+            _set_nested(current, _field_parts(field_path), value)
+        store.put(self._collection_path, self.id, current)
+
+
+# --- Queries ---
+
+class Query:
+    def __init__(self, client, collection_path, all_descendants=False, filters=(),
+                 orders=(), limit=None, limit_to_last=False, offset=0,
+                 start=None, end=None):
+        self._client = client
+        self._collection_path = collection_path
+        self._all_descendants = all_descendants
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit
+        self._limit_to_last = limit_to_last
+        self._offset = offset
+        self._start = start
+        self._end = end
+
+    def _copy(self, **overrides):
+        params = dict(
+            all_descendants=self._all_descendants, filters=self._filters,
+            orders=self._orders, limit=self._limit, limit_to_last=self._limit_to_last,
+            offset=self._offset, start=self._start, end=self._end,
+        )
+        params.update(overrides)
+        return Query(self._client, self._collection_path, **params)
+
+    def where(self, field_path=None, op_string=None, value=None, *, filter=None):
+        if filter is None:
+            filter = FieldFilter(field_path, op_string, value)
+        if not isinstance(filter, BaseFilter):
+            raise ValueError("filter must be a FieldFilter")
+        return self._copy(filters=self._filters + (filter,))
+
+    def order_by(self, field_path, direction=ASCENDING):
+        if isinstance(field_path, FieldPath):
+            field_path = field_path.to_api_repr()
+        return self._copy(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count):
+        return self._copy(limit=count, limit_to_last=False)
+
+    def limit_to_last(self, count):
+        return self._copy(limit=count, limit_to_last=True)
+
+    def offset(self, num_to_skip):
+        return self._copy(offset=num_to_skip)
+
+    def start_at(self, document_fields_or_snapshot):
+        return self._copy(start=(document_fields_or_snapshot, True))
+
+    def start_after(self, document_fields_or_snapshot):
+        return self._copy(start=(document_fields_or_snapshot, False))
+
+    def end_at(self, document_fields_or_snapshot):
+        return self._copy(end=(document_fields_or_snapshot, True))
+
+    def end_before(self, document_fields_or_snapshot):
+        return self._copy(end=(document_fields_or_snapshot, False))
+
+    def select(self, field_paths):
+        return self
+
+    # --- Execution ---
+
+    def _candidates(self):
+        store = self._client._store
+        if not self._all_descendants:
+            docs = store.collections.get(self._collection_path, {})
+            for flt in self._filters:
+                if (isinstance(flt, FieldFilter) and flt.op_string == "=="
+                        and isinstance(flt.field_path, str) and flt.field_path != DOCUMENT_ID):
+                    value = _normalize(flt.value)
+                    for doc_id in store.equal_ids(self._collection_path, flt.field_path, value):
+                        yield self._collection_path, doc_id, docs[doc_id]
+                    return
+            for doc_id, data in docs.items():
+                yield self._collection_path, doc_id, data
+            return
+        for path, docs in store.collections.items():
+            if path.rsplit("/", 1)[-1] == self._collection_path:
+                for doc_id, data in docs.items():
+                    yield path, doc_id, data
+
+    @staticmethod
+    def _compile(flt):
+        """Turn a filter into a ``(doc_id, data) -> bool`` predicate."""
+        if not isinstance(flt, FieldFilter):
+            # Composite (And / Or) filters
+            predicates = [Query._compile(sub) for sub in flt.filters]
+            if type(flt).__name__ == "And":
+                return lambda doc_id, data: all(p(doc_id, data) for p in predicates)
+            return lambda doc_id, data: any(p(doc_id, data) for p in predicates)
+
+        field_path = flt.field_path
+        op = flt.op_string if isinstance(flt.op_string, str) else flt.op_string.name
+        if op in ("IS_NULL", "IS_NOT_NULL", "IS_NAN", "IS_NOT_NAN"):
+            def check_unary(doc_id, data):
+                value = _get_field(doc_id, data, field_path)
+                if value is _MISSING:
+                    return False
+                if op == "IS_NULL":
+                    return value is None
+                if op == "IS_NOT_NULL":
+                    return value is not None
+                is_nan = isinstance(value, float) and value != value
+                return is_nan if op == "IS_NAN" else not is_nan
+            return check_unary
+
+        compare_to = flt.value
+        if field_path == DOCUMENT_ID and isinstance(compare_to, DocumentReference):
+            compare_to = compare_to.id
+        compare_to = _normalize(compare_to)
+        op = op.replace("-", "_") if op.startswith("array") else op
+
+        def check(doc_id, data):
+            value = _get_field(doc_id, data, field_path)
+            return value is not _MISSING and _compare(value, op, compare_to)
+        return check
+
+    def _matches(self, doc_id, data, flt):
+        return self._compile(flt)(doc_id, data)
+
+    def _effective_orders(self):
+        orders = list(self._orders)
+        # Inequality filters imply an ordering on that field, and every
+        # query is finally ordered by document id.
+        if not orders:
+            for flt in self._filters:
+                if isinstance(flt, FieldFilter) and flt.op_string in ("<", "<=", ">", ">=", "!=", "not-in"):
+                    orders.append((flt.field_path, ASCENDING))
+                    break
+        if not any(field == DOCUMENT_ID for field, _ in orders):
+            direction = orders[-1][1] if orders else ASCENDING
+            orders.append((DOCUMENT_ID, direction))
+        return orders
+
+    def _cursor_values(self, cursor, orders):
+        if isinstance(cursor, DocumentSnapshot):
+            data = cursor._data or {}
+            return [_get_field(cursor.id, data, field) for field, _ in orders]
+        if isinstance(cursor, dict):
+            values = []
+            for field, _ in orders:
+                value = cursor.get(field, _MISSING)
+                if isinstance(value, DocumentReference):
+                    value = value.id
+                values.append(_normalize(value) if value is not _MISSING else _MISSING)
+            return values
+        return [_normalize(v) for v in cursor]
+
+    @staticmethod
+    def _position(row_values, cursor_values, orders):
+        """Return -1/0/1 comparing a row to a cursor in query order."""
+        for value, cursor_value, (_, direction) in zip(row_values, cursor_values, orders):
+            if cursor_value is _MISSING:
+                break
+            left, right = _sort_key(value), _sort_key(cursor_value)
+            if left == right:
+                continue
+            result = -1 if left < right else 1
+            return -result if direction == DESCENDING else result
+        return 0
+
+    def _index_plan(self, orders):
+        """
+        Return ``(eq_field, eq_value, order_field, direction)`` when the query
+        is an equality filter ordered by one field (then by ID, in the same
+        direction), which a sorted index can serve in order.
+        """
+        if self._all_descendants or self._limit_to_last or len(orders) != 2:
+            return None
+        (field, direction), (last_field, last_direction) = orders
+        if last_field != DOCUMENT_ID or field == DOCUMENT_ID or direction != last_direction:
+            return None
+        for flt in self._filters:
+            if (isinstance(flt, FieldFilter) and flt.op_string == "==" and isinstance(flt.field_path, str)
+                    and flt.field_path not in (DOCUMENT_ID, field)):
+                return flt.field_path, _normalize(flt.value), field, direction
+        return None
+
+    def _indexed_rows(self, plan, predicates):
+        eq_field, eq_value, order_field, direction = plan
+        store = self._client._store
+        docs = store.collections.get(self._collection_path, {})
+        entries = store.sorted_ids(self._collection_path, eq_field, eq_value, order_field)
+        for _, doc_id in (reversed(entries) if direction == DESCENDING else entries):
+            data = docs[doc_id]
+            if all(predicate(doc_id, data) for predicate in predicates):
+                yield [_get_field(doc_id, data, order_field), doc_id], self._collection_path, doc_id, data
+
+    def _scanned_rows(self, orders, predicates):
+        rows = []
+        for collection_path, doc_id, data in self._candidates():
+            if not all(predicate(doc_id, data) for predicate in predicates):
+                continue
+            values = [_get_field(doc_id, data, field) for field, _ in orders]
+            if any(value is _MISSING for value in values):
+                continue
+            rows.append((values, collection_path, doc_id, data))
+
+        for index in range(len(orders) - 1, -1, -1):
+            _, direction = orders[index]
+            rows.sort(key=lambda row: _sort_key(row[0][index]),
+                      reverse=direction == DESCENDING)
+        return rows
+
+    def _run(self):
+        with self._client._store.lock:
+            orders = self._effective_orders()
+            predicates = [self._compile(flt) for flt in self._filters]
+            plan = self._index_plan(orders)
+            rows = self._indexed_rows(plan, predicates) if plan else self._scanned_rows(orders, predicates)
+
+            if self._start is not None:
+                cursor, inclusive = self._start
+                start_values = self._cursor_values(cursor, orders)
+                rows = (row for row in rows
+                        if self._position(row[0], start_values, orders) > (-1 if inclusive else 0))
+            if self._end is not None:
+                cursor, inclusive = self._end
+                end_values = self._cursor_values(cursor, orders)
+                rows = (row for row in rows
+                        if self._position(row[0], end_values, orders) < (1 if inclusive else 0))
+
+            if self._limit_to_last:
+                rows = list(rows)[self._offset:][-self._limit:]
+            else:
+                stop = self._offset + self._limit if self._limit is not None else None
+                rows = list(itertools.islice(rows, self._offset, stop))
+
+            self._client._store.reads += max(len(rows), 1)
+            return [
+                DocumentSnapshot(DocumentReference(self._client, collection_path, doc_id), data)
+                for _, collection_path, doc_id, data in rows
+            ]
+
+    def stream(self, transaction=None, **kwargs):
+        return iter(self._run())
+
+    def get(self, transaction=None, **kwargs):
+        return self._run()
+
+    # --- Aggregations ---
+
+    def count(self, alias=None):
+        return AggregationQuery(self).count(alias=alias)
+
+    def sum(self, field_ref, alias=None):
+        return AggregationQuery(self).sum(field_ref, alias=alias)
+
+    def avg(self, field_ref, alias=None):
+        return AggregationQuery(self).avg(field_ref, alias=alias)
+
+
+class AggregationQuery:
+    def __init__(self, nested_query):
+        self._nested_query = nested_query
+        self._aggregations = []
+
+    def _add(self, kind, field_ref, alias):
+        alias = alias or f"field_{len(self._aggregations) + 1}"
+        self._aggregations.append((kind, field_ref, alias))
+        return self
+
+    def count(self, alias=None):
+        return self._add("count", None, alias)
+
+    def sum(self, field_ref, alias=None):
+        return self._add("sum", field_ref, alias)
+
+    def avg(self, field_ref, alias=None):
+        return self._add("avg", field_ref, alias)
+
+    def get(self, transaction=None, **kwargs):
+        query = self._nested_query
+        store = query._client._store
+        with store.lock:
+            reads_before = store.reads
+            snapshots = query._run()
+            # Aggregations are billed per 1000 index entries, not per document.
+            store.reads = reads_before + 1 + len(snapshots) // 1000
+        results = []
+        for kind, field_ref, alias in self._aggregations:
+            if kind == "count":
+                value = len(snapshots)
+            else:
+                numbers = [
+                    v for v in (_get_field(s.id, s._data, field_ref) for s in snapshots)
+                    if isinstance(v, (int, float)) and not isinstance(v, bool)
+                ]
+                if kind == "sum":
+                    value = sum(numbers)
+                else:
+                    value = sum(numbers) / len(numbers) if numbers else None
+            results.append(AggregationResult(alias=alias, value=value, read_time=datetime.now(timezone.utc)))
+        return [results]
+
+    def stream(self, transaction=None, **kwargs):
+        return iter(self.get(transaction=transaction))
+
+
+class CollectionReference(Query):
+    def __init__(self, client, collection_path):
+        super().__init__(client, collection_path)
+
+    @property
+    def id(self):
+        return self._collection_path.rsplit("/", 1)[-1]
+
+    def document(self, document_id=None):
+        return DocumentReference(self._client, self._collection_path, document_id or uuid.uuid4().hex[:20])
+
+    def add(self, document_data, document_id=None):
+        reference = self.document(document_id)
+        reference.create(document_data)
+        return datetime.now(timezone.utc), reference
+
+    def list_documents(self, page_size=None):
+        with self._client._store.lock:
+            ids = list(self._client._store.collections.get(self._collection_path, {}))
+        return [self.document(doc_id) for doc_id in ids]
+
+
+class CollectionGroup(Query):
+    def __init__(self, client, collection_id):
+        super().__init__(client, collection_id, all_descendants=True)
+
+
+# --- Writes ---
+
+class WriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._ops = []
+
+    def __len__(self):
+        return len(self._ops)
+
+    def create(self, reference, document_data):
+        self._ops.append(("create", reference, document_data))
+        return self
+
+    def set(self, reference, document_data, merge=False):
+        self._ops.append(("set", reference, (document_data, merge)))
+        return self
+
+    def update(self, reference, field_updates, option=None):
+        self._ops.append(("update", reference, field_updates))
+        return self
+
+    def delete(self, reference, option=None):
+        self._ops.append(("delete", reference, None))
+        return self
+
+    def commit(self, **kwargs):
+        if len(self._ops) > MAX_BATCH_WRITES:
+            raise gexc.InvalidArgument(f"maximum {MAX_BATCH_WRITES} writes allowed per request")
+        store = self._client._store
+        with store.lock:
+            # Validate first so the batch applies atomically.
+            for kind, reference, _ in self._ops:
+                exists = store.get(reference._collection_path, reference.id) is not None
+                if kind == "update" and not exists:
+                    raise gexc.NotFound(f"No document to update: {reference.path}")
+                if kind == "create" and exists:
+                    raise gexc.AlreadyExists(f"Document already exists: {reference.path}")
+            for kind, reference, payload in self._ops:
+                if kind == "create":
+                    reference._write_set(payload, merge=False)
+                elif kind == "set":
+                    reference._write_set(payload[0], merge=payload[1])
+                elif kind == "update":
+                    reference._write_update(payload)
+                else:
+                    store.remove(reference._collection_path, reference.id)
+        results = [object() for _ in self._ops]
+        self._ops = []
+        return results
+
+
+class Transaction(WriteBatch):
+    """Serializes transactions on the store lock; works with ``firestore.transactional``."""
+
+    _max_attempts = 1
+    _read_only = False
+
+    def __init__(self, client, **kwargs):
+        super().__init__(client)
+        self._id = None
+
+    @property
+    def in_progress(self):
+        return self._id is not None
+
+    def _clean_up(self):
+        self._ops = []
+        self._id = None
+
+    def _begin(self, retry_id=None):
+        self._client._store.lock.acquire()
+        self._id = uuid.uuid4().bytes
+
+    def _rollback(self):
+        if self._id is not None:
+            self._clean_up()
+            self._client._store.lock.release()
+
+    def _commit(self):
+        try:
+            return self.commit()
+        finally:
+            self._id = None
+            self._client._store.lock.release()
+
+    def get(self, ref_or_query, **kwargs):
+        if isinstance(ref_or_query, DocumentReference):
+            return iter([ref_or_query.get()])
+        return ref_or_query.stream()
+
+
+class BulkWriter:
+    """Applies writes immediately; failures go through ``on_write_error``."""
+
+    def __init__(self, client):
+        self._client = client
+        self._success_callback = None
+        self._error_callback = None
+        self._is_open = True
+
+    def on_write_result(self, callback):
+        self._success_callback = callback
+
+    def on_write_error(self, callback):
+        self._error_callback = callback
+
+    def on_batch_result(self, callback):
+        pass
+
+    def _execute(self, reference, operation):
+        attempts = 0
+        while True:
+            attempts += 1
+            try:
+                operation()
+            except gexc.GoogleAPICallError as exc:
+                failure = _BulkWriteFailure(reference, attempts, exc.code, exc.message)
+                if self._error_callback and self._error_callback(failure, self):
+                    continue
+                return
+            if self._success_callback:
+                self._success_callback(reference, object(), self)
+            return
+
+    def create(self, reference, document_data, attempts=0):
+        self._execute(reference, lambda: reference.create(document_data))
+
+    def set(self, reference, document_data, merge=False, attempts=0):
+        self._execute(reference, lambda: reference.set(document_data, merge=merge))
+
+    def update(self, reference, field_updates, option=None, attempts=0):
+        self._execute(reference, lambda: reference.update(field_updates))
+
+    def delete(self, reference, option=None, attempts=0):
+        self._execute(reference, lambda: reference.delete())
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self._is_open = False
+
+
+class _BulkWriteOperation:
+    def __init__(self, reference, attempts):
+        self.reference = reference
+        self.attempts = attempts
+
+
+class _BulkWriteFailure:
+    def __init__(self, reference, attempts, code, message):
+        self.operation = _BulkWriteOperation(reference, attempts)
+        self.code = code
+        self.message = message
+
+    @property
+    def attempts(self):
+        return self.operation.attempts
+
+
+# --- Client ---
+
+class MemoryFirestoreClient:
+    """Drop-in for ``firestore.client()`` backed by in-process dictionaries."""
+
+    def __init__(self, path=None):
+        self._store = _Store()
+        self._path = path
+        if path and os.path.exists(path):
+            with open(path, "rb") as handle:
+                self._store.collections = pickle.load(handle)
+
+    def collection(self, collection_path):
+        return CollectionReference(self, collection_path)
+
+    def collection_group(self, collection_id):
+        return CollectionGroup(self, collection_id)
+
+    def document(self, document_path):
+        collection_path, doc_id = document_path.rsplit("/", 1)
+        return DocumentReference(self, collection_path, doc_id)
+
+    def collections(self):
+        with self._store.lock:
+            roots = {path for path in self._store.collections if "/" not in path}
+        return [CollectionReference(self, path) for path in sorted(roots)]
+
+    def get_all(self, references, field_paths=None, transaction=None, **kwargs):
+        for reference in references:
+            yield reference.get()
+
+    def batch(self):
+        return WriteBatch(self)
+
+    def transaction(self, **kwargs):
+        return Transaction(self, **kwargs)
+
+    def bulk_writer(self, options=None):
+        return BulkWriter(self)
+
+    # --- Helpers for tests and benchmarks ---
+
+    @property
+    def stats(self):
+        store = self._store
+        return {"reads": store.reads, "writes": store.writes, "deletes": store.deletes}
+
+    def reset_stats(self):
+        with self._store.lock:
+            self._store.reads = self._store.writes = self._store.deletes = 0
+
+    def clear(self):
+        with self._store.lock:
+            self._store.clear()
+        self.reset_stats()
+
+    def document_count(self, collection_path=None):
+        with self._store.lock:
+            if collection_path is not None:
+                return len(self._store.collections.get(collection_path, {}))
+            return sum(len(docs) for docs in self._store.collections.values())
+
+    def save(self):
+        """Persist the data to ``FIRESTORE_MEMORY_PATH`` (if configured)."""
+        if not self._path:
+            return
+        with self._store.lock:
+            with open(self._path, "wb") as handle:
+                pickle.dump(self._store.collections, handle)
@@ -0,0 +1,179 @@
+"""
+Compact, size-bounded prompts for the Gemini analyses.
+
+Instead of pasting every transaction into a prompt, ``summarize_expenses``
+aggregates them locally per merchant, month and category, and
+``build_prompt`` renders those aggregates as small tables under a hard
+token budget (``LLM_PROMPT_TOKEN_BUDGET``). When the tables do not fit,
+rows are dropped from the end of the lowest-priority table first and
+replaced by one "N more rows" line carrying their combined total, so the
+same data always yields the same prompt.
+
+Tokens are estimated at four characters each, which is close to Gemini's
+count for this kind of text and needs no network call. Every built prompt
+is logged with its token count and tallied in ``get_prompt_stats()``.
+"""
+import logging
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4
+# Names like "D-Mart: Onion (500g)" are merchant + item; the item is dropped
+MERCHANT_SEPARATOR = ":"
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def count_tokens(text):
+    """Estimated number of Gemini tokens in ``text``."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def merchant_key(name):
+    """Normalised merchant for a transaction name ("D-Mart: Onion (500g)" -> "d mart")."""
+    merchant = (name or "").split(MERCHANT_SEPARATOR, 1)[0]
+    return re.sub(r"[^a-z0-9&]+", " ", merchant.lower()).strip()
+
+
+def _day(date):
+    if isinstance(date, datetime):
+        return date.strftime("%Y-%m-%d")
+    if isinstance(date, str) and len(date) >= 10:
+        return date[:10]
+    return None
+
+
+def _most_common(counter):
+    # Ties are broken alphabetically so the choice is stable
+    return min(counter.items(), key=lambda item: (-item[1], item[0]))[0]
+
+
+def _rounded(amount):
+    return round(amount, 2)
+
+
+def summarize_expenses(transactions):
+    """
+    Aggregate expense documents into the tables the prompts are built from.
+
+    Returns a dict with ``merchants`` (merchant, category, count, total),
+    ``months`` (month, count, total) and ``categories`` (category, count,
+    total) rows, each sorted by total (largest first), plus overall
+    ``count``/``total``/``first_date``/``last_date``. Merchants whose names
+    differ only in case, punctuation or the item after a colon are merged
+    and shown under their most frequent spelling; IDs, user IDs and status
+    are not carried over.
+    """
+    merchants = defaultdict(lambda: {"names": Counter(), "categories": Counter(), "count": 0, "total": 0.0})
+    months = defaultdict(lambda: {"count": 0, "total": 0.0})
+    categories = defaultdict(lambda: {"count": 0, "total": 0.0})
+    dates = []
+
+    for tx in transactions:
+        amount = float(tx.get("amount") or 0)
+        name = (tx.get("name") or "").split(MERCHANT_SEPARATOR, 1)[0].strip() or "Unknown"
+        category = tx.get("category") or "Uncategorized"
+        merchant = merchants[merchant_key(name) or "unknown"]
+        merchant["names"][name] += 1
+        merchant["categories"][category] += 1
+        merchant["count"] += 1
+        merchant["total"] += amount
+        day = _day(tx.get("date"))
+        for bucket in (months[day[:7] if day else "unknown"], categories[category]):
+            bucket["count"] += 1
+            bucket["total"] += amount
+        if day:
+            dates.append(day)
+
+    def ranked(rows):
+        return sorted(rows, key=lambda row: (-row[-1], row[0]))
+
+    return {
+        "count": sum(m["count"] for m in merchants.values()),
+        "total": _rounded(sum(m["total"] for m in merchants.values())),
+        "first_date": min(dates) if dates else None,
+        "last_date": max(dates) if dates else None,
+        "merchants": ranked(
+            (_most_common(m["names"]), _most_common(m["categories"]), m["count"], _rounded(m["total"]))
+            for m in merchants.values()
+        ),
+        "months": sorted((month, b["count"], _rounded(b["total"])) for month, b in months.items()),
+        "categories": ranked((category, b["count"], _rounded(b["total"])) for category, b in categories.items()),
+    }
+
+
+def _render_row(row):
+    return " | ".join(str(value) for value in row)
+
+
+def _omitted_line(count, total):
+    return f"\n... {count} more rows, total {_rounded(total)}"
+
+
+def build_prompt(namespace, instructions, tables, token_budget=None):
+    """
+    Render ``instructions`` followed by ``tables`` within ``token_budget`` tokens.
+
+    ``tables`` is a list of ``(title, columns, rows)`` in priority order; the
+    last value of each row should be its amount. If the prompt would exceed
+    the budget, rows are dropped from the end of the last table, then the one
+    before it, and so on. Returns ``(prompt, token_count)``.
+    """
+    budget = token_budget or getattr(settings, "LLM_PROMPT_TOKEN_BUDGET", 6000)
+    max_chars = budget * CHARS_PER_TOKEN
+    header = instructions.strip()
+    sections = []
+    chars = len(header)
+    for title, columns, rows in tables:
+        heading = f"\n\n{title} ({' | '.join(columns)}):"
+        lines = ["\n" + _render_row(row) for row in rows]
+        sections.append((heading, list(rows), lines))
+        chars += len(heading) + sum(len(line) for line in lines)
+
+    # Drop rows from the end of the lowest-priority tables until the prompt fits
+    kept = [len(lines) for _, _, lines in sections]
+    dropped = 0
+    for index in reversed(range(len(sections))):
+        _, rows, lines = sections[index]
+        omitted_total, summary_chars = 0.0, 0
+        while kept[index] > 0 and chars > max_chars:
+            kept[index] -= 1
+            dropped += 1
+            row = rows[kept[index]]
+            omitted_total += row[-1] if isinstance(row[-1], (int, float)) else 0
+            # The dropped rows are replaced by one summary line, which grows as they do
+            chars -= len(lines[kept[index]]) + summary_chars
+            summary_chars = len(_omitted_line(len(rows) - kept[index], omitted_total))
+            chars += summary_chars
+
+    parts = [header]
+    for (heading, rows, lines), count in zip(sections, kept):
+        parts.append(heading)
+        parts.extend(lines[:count])
+        if count < len(lines):
+            omitted = rows[count:]
+            parts.append(_omitted_line(len(omitted), sum(r[-1] for r in omitted if isinstance(r[-1], (int, float)))))
+    prompt = "".join(parts)
+    tokens = count_tokens(prompt)
+
+    with _stats_lock:
+        stats = _stats.setdefault(namespace, {"calls": 0, "tokens": 0, "max_tokens": 0, "truncated": 0})
+        stats["calls"] += 1
+        stats["tokens"] += tokens
+        stats["max_tokens"] = max(stats["max_tokens"], tokens)
+        stats["truncated"] += 1 if dropped else 0
+    logger.info("%s prompt: %d tokens (budget %d, %d rows dropped)", namespace, tokens, budget, dropped)
+    return prompt, tokens
+
+
+def get_prompt_stats():
+    """Per-namespace prompt sizes built by this process: calls, total/max tokens, truncations."""
+    with _stats_lock:
+        return {namespace: dict(stats) for namespace, stats in _stats.items()}
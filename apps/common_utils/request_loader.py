@@ -0,0 +1,131 @@
+"""
+Request-scoped memoization of Firestore reads.
+
+``apps.core.loader_middleware.RequestLoaderMiddleware`` attaches a
+``RequestDataLoader`` to every request (``request.data_loader``) and makes it
+current for the request's context. While it is active, functions decorated
+with ``@request_cached`` and ``get_document_data`` serve repeated reads from
+memory, so e.g. the profile fetched by the ``user_full_name`` context
+processor is not fetched again by the view. Writes call
+``invalidate_request_cache`` so a request always sees its own changes.
+"""
+import contextvars
+import functools
+import threading
+from apps.common_utils.firebase_config import db
+
+_current_loader = contextvars.ContextVar("request_data_loader", default=None)
+
+
+def _copy(value):
+    # Callers add or overwrite top-level keys on the returned dicts (e.g.
+    # 'type', or an isoformat 'date'), so hand out shallow copies.
+    if isinstance(value, list):
+        return [dict(item) if isinstance(item, dict) else item for item in value]
+    if isinstance(value, dict):
+        return dict(value)
+    return value
+
+
+def _size(value):
+    # Documents a cached result stands for: one per list item, else one.
+    return len(value) if isinstance(value, list) else 1
+
+
+class RequestDataLoader:
+    """Per-request cache of Firestore results, keyed by ``(namespace, user_id, args, kwargs)``."""
+
+    def __init__(self):
+        self._cache = {}
+        self._lock = threading.Lock()
+        self.fetches = 0
+        self.saved_calls = 0
+        self.saved_reads = 0
+
+    def load(self, key, fetch):
+        with self._lock:
+            if key in self._cache:
+                value = self._cache[key]
+                self.saved_calls += 1
+                self.saved_reads += _size(value)
+                return _copy(value)
+        value = fetch()
+        with self._lock:
+            self._cache[key] = value
+            self.fetches += 1
+        return _copy(value)
+
+    def get_documents(self, pairs):
+        """
+        Return the data (or ``None``) of each ``(collection, doc_id)`` in
+        ``pairs``, fetching all uncached ones with a single ``db.get_all``.
+        """
+        keys = [("doc:" + collection, doc_id, (), ()) for collection, doc_id in pairs]
+        with self._lock:
+            missing = [(pair, key) for pair, key in zip(pairs, keys) if key not in self._cache]
+            cached = len(pairs) - len(missing)
+            self.saved_calls += cached
+            self.saved_reads += cached
+        if missing:
+            refs = {}
+            for (collection, doc_id), key in missing:
+                ref = db.collection(collection).document(doc_id)
+                refs[ref.path] = (ref, key)
+            fetched = {path: None for path in refs}
+            for snapshot in db.get_all([ref for ref, _ in refs.values()]):
+                fetched[snapshot.reference.path] = snapshot.to_dict() if snapshot.exists else None
+            with self._lock:
+                for path, (_, key) in refs.items():
+                    self._cache[key] = fetched[path]
+                self.fetches += 1
+        with self._lock:
+            return [_copy(self._cache[key]) for key in keys]
+
+    def invalidate(self, user_id=None):
+        """Forget everything cached for ``user_id`` (or everything)."""
+        with self._lock:
+            if user_id is None:
+                self._cache.clear()
+            else:
+                for key in [key for key in self._cache if key[1] == user_id]:
+                    del self._cache[key]
+
+
+def current_loader():
+    return _current_loader.get()
+
+
+def activate(loader):
+    """Make ``loader`` current; returns a token for ``deactivate``."""
+    return _current_loader.set(loader)
+
+
+def deactivate(token):
+    _current_loader.reset(token)
+
+
+def invalidate_request_cache(user_id=None):
+    loader = _current_loader.get()
+    if loader is not None:
+        loader.invalidate(user_id)
+
+
+def request_cached(namespace):
+    """
+    Memoize a read whose first argument is the user ID for the life of the
+    current request. Outside a request the function is called directly.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(user_id, *args, **kwargs):
+            loader = _current_loader.get()
+            if loader is None:
+                return func(user_id, *args, **kwargs)
+            key = (namespace, user_id, args, tuple(sorted(kwargs.items())))
+            try:
+                hash(key)
+            except TypeError:
+                return func(user_id, *args, **kwargs)
+            return loader.load(key, lambda: func(user_id, *args, **kwargs))
+        return wrapper
+    return decorator
@@ -0,0 +1,187 @@
+"""
+Per-user monthly rollups of incomes and expenses.
+
+Each ``user_rollups/{uid}/months/{YYYY-MM}`` document holds the month's
+totals and counts, broken down by expense category and income source:
+
+    {
+        "userId": uid, "month": "2025-08",
+        "expense_total": 1234.5, "expense_count": 12,
+        "income_total": 30000.0, "income_count": 1,
+        "categories": {"Groceries": {"total": 800.0, "count": 9}, ...},
+        "sources": {"Salary": {"total": 30000.0, "count": 1}},
+    }
+
+``firebase_service.add_transaction`` / ``delete_transaction`` keep them up to
+date with ``Increment`` transforms in the same atomic write as the
+transaction itself, so reports read O(months) documents instead of
+O(transactions). Users written before rollups existed are backfilled on
+first read (or with ``manage.py rebuild_rollups``).
+"""
+from datetime import datetime
+from dateutil import parser
+from firebase_admin import firestore
+from google.cloud.firestore_v1.base_query import FieldFilter
+from apps.common_utils.firebase_config import db
+from apps.common_utils.request_loader import request_cached
+
+ROLLUP_COLLECTION = "user_rollups"
+MONTHS_SUBCOLLECTION = "months"
+UNKNOWN_MONTH = "unknown"
+
+# collection -> (total/count prefix, field to group by, map holding the groups)
+ROLLUP_COLLECTIONS = {
+    "expenses": ("expense", "category", "categories"),
+    "incomes": ("income", "source", "sources"),
+}
+
+
+def month_key(date_value):
+    """Return the ``YYYY-MM`` bucket for a stored date, or ``None`` if unparseable."""
+    if isinstance(date_value, datetime):
+        return date_value.strftime("%Y-%m")
+    if isinstance(date_value, str):
+        try:
+            return parser.parse(date_value).strftime("%Y-%m")
+        except (ValueError, TypeError, OverflowError):
+            return None
+    return None
+
+
+def rollup_ref(user_id, month):
+    return (db.collection(ROLLUP_COLLECTION).document(user_id)
+            .collection(MONTHS_SUBCOLLECTION).document(month))
+
+
+def rollup_delta(user_id, collection, transaction, sign=1):
+    """
+    Build the ``(reference, merge-payload)`` that applies ``transaction`` to
+    its month's rollup, or ``None`` for collections that are not rolled up.
+    """
+    if collection not in ROLLUP_COLLECTIONS:
+        return None
+    prefix, group_field, group_map = ROLLUP_COLLECTIONS[collection]
+    try:
+        amount = float(transaction.get("amount", 0))
+    except (ValueError, TypeError):
+        amount = 0.0
+    month = month_key(transaction.get("date"))
+    group = transaction.get(group_field) or "Uncategorized"
+
+    payload = {
+        "userId": user_id,
+        # Undated transactions still count towards all-time totals but are
+        # kept out of month range queries.
+        "month": month,
+        f"{prefix}_total": firestore.Increment(sign * amount),
+        f"{prefix}_count": firestore.Increment(sign),
+        group_map: {group: {"total": firestore.Increment(sign * amount), "count": firestore.Increment(sign)}},
+    }
+    return rollup_ref(user_id, month or UNKNOWN_MONTH), payload
+
+
+def accumulate_rollup(rollups, user_id, collection, transaction):
+    """Add ``transaction`` to the in-memory ``{month: rollup}`` map ``rollups``."""
+    prefix, group_field, group_map = ROLLUP_COLLECTIONS[collection]
+    try:
+        amount = float(transaction.get("amount", 0))
+    except (ValueError, TypeError):
+        amount = 0.0
+    month = month_key(transaction.get("date"))
+    rollup = rollups.setdefault(month or UNKNOWN_MONTH, _empty_rollup(user_id, month))
+    rollup[f"{prefix}_total"] += amount
+    rollup[f"{prefix}_count"] += 1
+    group = rollup[group_map].setdefault(transaction.get(group_field) or "Uncategorized", {"total": 0.0, "count": 0})
+    group["total"] += amount
+    group["count"] += 1
+
+
+def _empty_rollup(user_id, month):
+    return {
+        "userId": user_id, "month": month,
+        "expense_total": 0.0, "expense_count": 0,
+        "income_total": 0.0, "income_count": 0,
+        "categories": {}, "sources": {},
+    }
+
+
+def rollup_increments(rollup):
+    """Turn an accumulated rollup into a merge-payload of ``Increment`` transforms."""
+    payload = {"userId": rollup["userId"], "month": rollup["month"]}
+    for key, value in rollup.items():
+        if key.endswith(("_total", "_count")):
+            if value:
+                payload[key] = firestore.Increment(value)
+        elif key in ("categories", "sources") and value:
+            payload[key] = {
+                name: {"total": firestore.Increment(group["total"]), "count": firestore.Increment(group["count"])}
+                for name, group in value.items()
+            }
+    return payload
+
+
+def rebuild_user_rollups(user_id):
+    """Recompute a user's rollups from their raw transactions. Returns the month count."""
+    rollups = {}
+    for collection in ROLLUP_COLLECTIONS:
+        docs = db.collection(collection).where(filter=FieldFilter("userId", "==", user_id)).stream()
+        for doc in docs:
+            accumulate_rollup(rollups, user_id, collection, doc.to_dict())
+
+    user_ref = db.collection(ROLLUP_COLLECTION).document(user_id)
+    batch = db.batch()
+    pending = 0
+    for doc in user_ref.collection(MONTHS_SUBCOLLECTION).stream():
+        if doc.id not in rollups:
+            batch.delete(doc.reference)
+            pending += 1
+    for month, rollup in rollups.items():
+        batch.set(rollup_ref(user_id, month), rollup)
+        pending += 1
+        if pending >= 450:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+    batch.set(user_ref, {"userId": user_id, "rebuilt_at": firestore.SERVER_TIMESTAMP})
+    batch.commit()
+    return len(rollups)
+
+
+def clear_user_rollups(user_id):
+    """Drop a user's rollups, e.g. after their transactions were wiped."""
+    user_ref = db.collection(ROLLUP_COLLECTION).document(user_id)
+    for doc in user_ref.collection(MONTHS_SUBCOLLECTION).stream():
+        doc.reference.delete()
+    user_ref.delete()
+
+
+@request_cached("rollups")
+def get_monthly_rollups(user_id, since=None, until=None):
+    """
+    Return ``{month: rollup}`` for the user, sorted by month.
+
+    ``since`` (inclusive) and ``until`` (exclusive) are datetimes or
+    ``YYYY-MM`` strings; without bounds the undated bucket is included too.
+    """
+    user_ref = db.collection(ROLLUP_COLLECTION).document(user_id)
+    marker = user_ref.get()
+    if not marker.exists:
+        rebuild_user_rollups(user_id)
+
+    query = user_ref.collection(MONTHS_SUBCOLLECTION)
+    if since is not None:
+        query = query.where(filter=FieldFilter("month", ">=", since if isinstance(since, str) else month_key(since)))
+    if until is not None:
+        query = query.where(filter=FieldFilter("month", "<", until if isinstance(until, str) else month_key(until)))
+    return dict(sorted((doc.id, doc.to_dict()) for doc in query.stream()))
+
+
+def sum_groups(rollups, group_map):
+    """Merge the per-month ``categories``/``sources`` maps into all-window totals."""
+    totals = {}
+    for rollup in rollups.values():
+        for name, group in (rollup.get(group_map) or {}).items():
+            if group.get("count", 0) <= 0:
+                continue
+            totals[name] = totals.get(name, 0) + group.get("total", 0)
+    return totals
@@ -0,0 +1,38 @@
+# apps/core/loader_middleware.py
+
+import logging
+from apps.common_utils.request_loader import RequestDataLoader, activate, deactivate
+
+logger = logging.getLogger(__name__)
+
+
+class RequestLoaderMiddleware:
+    """
+    Gives each request its own RequestDataLoader so repeated Firestore reads
+    (the profile read by the context processor and again by the view, the
+    same transactions read by two services, ...) are fetched once.
+
+    The number of reads served from memory is logged and returned in the
+    ``X-Firestore-Reads-Saved`` header.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        loader = RequestDataLoader()
+        request.data_loader = loader
+        token = activate(loader)
+        try:
+            response = self.get_response(request)
+        finally:
+            deactivate(token)
+
+        if loader.fetches or loader.saved_calls:
+            response["X-Firestore-Fetches"] = str(loader.fetches)
+            response["X-Firestore-Reads-Saved"] = str(loader.saved_reads)
+            logger.debug(
+                "%s %s: %d Firestore fetches, %d cached calls saved %d document reads",
+                request.method, request.path, loader.fetches, loader.saved_calls, loader.saved_reads,
+            )
+        return response
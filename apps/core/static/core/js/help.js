@@ -20,4 +20,31 @@ export function getCookie(name) {
         }
     }
     return cookieValue;
-}
\ No newline at end of file
+}
+/**
+ * Waits for a background job started by an API endpoint (a 202 response with
+ * a status_url) and resolves with its result. Rejects with the job's error,
+ * or with the response's error if the job could not be started.
+ */
+export async function awaitJob(response, { interval = 1500, timeout = 120000 } = {}) {
+    const started = await response.json().catch(() => ({}));
+    if (!response.ok) throw new Error(started.error || 'Something went wrong. Please try again.');
+    if (!started.status_url) return started;
+    return pollJob(started.status_url, { interval, timeout });
+}
+
+export async function pollJob(statusUrl, { interval = 1500, timeout = 120000 } = {}) {
+    const deadline = Date.now() + timeout;
+    while (Date.now() < deadline) {
+        const res = await fetch(statusUrl);
+        const job = await res.json().catch(() => ({}));
+        if (!res.ok) throw new Error(job.error || 'Could not check the progress of your request.');
+        if (job.status === 'failed') throw new Error(job.error || 'The request failed. Please try again.');
+        if (job.status === 'done') {
+            if (job.result && job.result.error) throw new Error(job.result.error);
+            return job.result;
+        }
+        await new Promise(resolve => setTimeout(resolve, interval));
+    }
+    throw new Error('This is taking longer than expected. Please try again in a moment.');
+}
@@ -6,4 +6,5 @@ app_name = 'core'
 urlpatterns = [
     path('', views.home, name='home'),
     path('chatbot-api/', views.chatbot_api, name='chatbot_api'),
+    path('jobs/<str:job_id>/', views.job_status, name='job_status'),
 ]
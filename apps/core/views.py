@@ -1,16 +1,21 @@
 from django.shortcuts import render
 import json
-# import google.generativeai as genai
 from django.views.decorators.csrf import csrf_exempt
 from django.http import JsonResponse
-from django.conf import settings
-
-# Configure Gemini API
-# genai.configure(api_key=settings.GEMINI_API_KEY)
+from apps.common_utils.auth_utils import get_user_id
+from apps.common_utils.jobs import get_job
+from AI.llm_gateway import LLMBusy, LLMRateLimited, LLMUnavailable, generate_text
 
 def home(request):
     return render(request, 'core/index.html')
 
+def job_status(request, job_id):
+    """Polled by the pages that start a background job; returns its status and, once done, the result."""
+    job = get_job(job_id, get_user_id(request))
+    if job is None:
+        return JsonResponse({"error": "Job not found."}, status=404)
+    return JsonResponse(job)
+
 def chatbot_api(request):
     if request.method != "POST":
         return JsonResponse({"error": "Invalid request method. Please use POST."}, status=405)
@@ -29,13 +34,19 @@ def chatbot_api(request):
         )
 
         # Use the latest, recommended model
-        model = genai.GenerativeModel("gemini-1.5-flash-latest")
-        response = model.generate_content(prompt)
+        reply = generate_text(prompt, model="gemini-1.5-flash-latest", call_site="core.chatbot_api",
+                              user_id=get_user_id(request))
         
-        return JsonResponse({"reply": response.text})
+        return JsonResponse({"reply": reply})
     
     except json.JSONDecodeError:
         return JsonResponse({"error": "Invalid JSON in request body."}, status=400)
+    except LLMRateLimited as e:
+        response = JsonResponse({"error": str(e)}, status=429)
+        response["Retry-After"] = str(int(e.retry_after) + 1)
+        return response
+    except (LLMBusy, LLMUnavailable) as e:
+        return JsonResponse({"error": str(e)}, status=503)
     except Exception as e:
         print(f"An error occurred in chatbot_api: {e}") 
         return JsonResponse({"error": "An internal server error occurred."}, status=500)
\ No newline at end of file
@@ -0,0 +1,219 @@
+"""
+Endpoint benchmarks against the in-process Firestore backend.
+
+``run_benchmarks`` seeds a synthetic ledger of ``size`` transactions for one
+user (plus a few small ledgers for other users), then drives each endpoint in
+``ENDPOINTS`` through Django's test client and records:
+
+    p50_ms / p95_ms  latency over ``iterations`` requests
+    peak_kib         peak Python memory allocated during one request
+    reads            Firestore document reads per request (db.stats)
+
+The LLM behind the chatbot is stubbed so only the app's own work is timed;
+one chatbot question is answered from the rollups and one goes to the LLM.
+Run it with ``FIRESTORE_BACKEND=memory python manage.py benchmark``; results
+are compared against ``benchmark_baselines.json``.
+"""
+import contextlib
+import io
+import json
+import math
+import random
+import statistics
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.sessions.backends.signed_cookies import SessionStore
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from apps.common_utils.firebase_config import db
+from apps.common_utils.firebase_service import bulk_add_transactions, set_document
+from apps.common_utils.memory_firestore import MemoryFirestoreClient
+from apps.common_utils.rollup_service import rebuild_user_rollups
+from apps.ml_features.services import chatbot_service_simple
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEFAULT_ITERATIONS = 20
+DEFAULT_TOLERANCE = 0.25
+BASELINE_PATH = Path(__file__).resolve().parent / "benchmark_baselines.json"
+
+BENCHMARK_USER_ID = "benchmark-user"
+OTHER_USERS = 20
+OTHER_USER_TRANSACTIONS = 100
+
+EXPENSE_CATEGORIES = ["Groceries", "Transportation", "Utilities", "Healthcare", "Travel",
+                      "Entertainment & Dining", "Shopping & Personal Care", "Housing"]
+INCOME_SOURCES = ["Salary", "Freelancing", "Business", "Investments", "Other"]
+STUB_LLM_REPLY = "You spent the most on groceries this month."
+
+# (name, method, url name, GET params / JSON body)
+ENDPOINTS = (
+    ("dashboard_view", "get", "reports:dashboard", None),
+    ("get_transactions_history", "get", "transactions:get_transactions", {"itemCount": 20}),
+    ("set_budget", "get", "budgets:set_budget", None),
+    ("get_income_data", "get", "reports:income_data", None),
+    ("get_admin_analytics_api", "get", "datagen:get_admin_analytics_api", None),
+    # Answered from the monthly rollups without calling the LLM
+    ("chatbot_aggregate", "post", "ml_features:chatbot_response", {"message": "How much did I spend on groceries?"}),
+    # Not an aggregate question, so it goes through retrieval and the LLM
+    ("chatbot_response", "post", "ml_features:chatbot_response", {"message": "Any advice on my Swiggy spending?"}),
+)
+
+
+def _synthetic_ledger(size, seed):
+    """Return ``(expenses, incomes)`` totalling ``size`` rows over the last year."""
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    income_count = max(1, size // 10)
+    expenses = [{
+        "name": f"Purchase {i}",
+        "category": rng.choice(EXPENSE_CATEGORIES),
+        "amount": round(rng.uniform(50, 5000), 2),
+        "date": now - timedelta(days=rng.uniform(0, 365)),
+        "status": "Completed",
+    } for i in range(size - income_count)]
+    incomes = [{
+        "source": rng.choice(INCOME_SOURCES),
+        "amount": round(rng.uniform(1000, 50000), 2),
+        "date": now - timedelta(days=rng.uniform(0, 365)),
+        "status": "Received",
+    } for _ in range(income_count)]
+    return expenses, incomes
+
+
+def seed_ledger(size):
+    """Replace the backend's data with a benchmark user holding ``size`` transactions."""
+    db.clear()
+    now = datetime.now(timezone.utc)
+    users = [(BENCHMARK_USER_ID, size)] + [(f"benchmark-other-{i}", OTHER_USER_TRANSACTIONS) for i in range(OTHER_USERS)]
+    for index, (user_id, count) in enumerate(users):
+        set_document("user_profiles", user_id, {
+            "email": f"{user_id}@example.com", "first_name": "Bench", "last_name": str(index),
+            "created_at": now - timedelta(days=index),
+        })
+        set_document("user_categories", user_id, {"categories": EXPENSE_CATEGORIES, "userId": user_id})
+        expenses, incomes = _synthetic_ledger(count, seed=index)
+        bulk_add_transactions(user_id, expenses, "expenses")
+        bulk_add_transactions(user_id, incomes, "incomes")
+        bulk_add_transactions(user_id, [
+            {"category": category.lower(), "budget": 10000, "period": "monthly", "created_at": now}
+            for category in EXPENSE_CATEGORIES[:4]
+        ], "budgets")
+        # Marks the rollups as built so the first request does not rebuild them
+        rebuild_user_rollups(user_id)
+
+
+def _login(client, user_id):
+    session = SessionStore()
+    session.update({"user_id": user_id, "id_token": "benchmark", "email": f"{user_id}@example.com"})
+    session.save()
+    client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+
+
+def _request(client, method, url, params):
+    with contextlib.redirect_stdout(io.StringIO()):
+        if method == "post":
+            response = client.post(url, data=json.dumps(params or {}), content_type="application/json")
+        else:
+            response = client.get(url, params or {})
+    if response.status_code != 200:
+        raise AssertionError(f"{method.upper()} {url} returned {response.status_code}: {response.content[:200]!r}")
+    return response
+
+
+def _percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+def measure_endpoint(client, method, url, params, iterations):
+    # One warm-up request fills lazily built caches (e.g. the admin snapshot)
+    _request(client, method, url, params)
+
+    latencies = []
+    reads = []
+    for _ in range(iterations):
+        db.reset_stats()
+        start = time.perf_counter()
+        _request(client, method, url, params)
+        latencies.append((time.perf_counter() - start) * 1000)
+        reads.append(db.stats["reads"])
+
+    tracemalloc.start()
+    try:
+        _request(client, method, url, params)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "p50_ms": round(_percentile(latencies, 50), 2),
+        "p95_ms": round(_percentile(latencies, 95), 2),
+        "peak_kib": round(peak / 1024, 1),
+        "reads": int(statistics.median(reads)),
+    }
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, iterations=DEFAULT_ITERATIONS, endpoints=ENDPOINTS, on_result=None):
+    """
+    Return ``{str(size): {endpoint: metrics}}``. ``on_result(size, name,
+    metrics)`` is called as each measurement completes.
+    """
+    if not isinstance(db, MemoryFirestoreClient):
+        raise RuntimeError("Benchmarks seed and wipe data; run them with FIRESTORE_BACKEND=memory.")
+
+    results = {}
+    with override_settings(
+        SESSION_ENGINE="django.contrib.sessions.backends.signed_cookies",
+        STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage",
+        ALLOWED_HOSTS=["testserver"],
+    ), mock.patch.object(chatbot_service_simple, "call_gemini_api", return_value=STUB_LLM_REPLY):
+        for size in sizes:
+            seed_ledger(size)
+            client = Client()
+            _login(client, BENCHMARK_USER_ID)
+            results[str(size)] = {}
+            for name, method, url_name, params in endpoints:
+                metrics = measure_endpoint(client, method, reverse(url_name), params, iterations)
+                results[str(size)][name] = metrics
+                if on_result:
+                    on_result(size, name, metrics)
+    return results
+
+
+def load_baseline(path=BASELINE_PATH):
+    path = Path(path)
+    if not path.exists():
+        return {}
+    with open(path) as handle:
+        return json.load(handle)
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    with open(path, "w") as handle:
+        json.dump(results, handle, indent=2, sort_keys=True)
+        handle.write("\n")
+
+
+def compare_to_baseline(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    List human-readable regressions: more reads than the baseline, or
+    latency/memory more than ``tolerance`` above it.
+    """
+    regressions = []
+    for size, endpoints in results.items():
+        for name, metrics in endpoints.items():
+            base = baseline.get(size, {}).get(name)
+            if not base:
+                continue
+            if metrics["reads"] > base["reads"]:
+                regressions.append(f"{name} @ {size}: reads {base['reads']} -> {metrics['reads']}")
+            for key in ("p95_ms", "peak_kib"):
+                if metrics[key] > base[key] * (1 + tolerance):
+                    regressions.append(f"{name} @ {size}: {key} {base[key]} -> {metrics[key]}")
+    return regressions
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.datagen.benchmarks import (
+    BASELINE_PATH, DEFAULT_ITERATIONS, DEFAULT_SIZES, DEFAULT_TOLERANCE,
+    compare_to_baseline, load_baseline, run_benchmarks, save_baseline,
+)
+
+
+class Command(BaseCommand):
+    help = "Benchmark the main endpoints against the in-memory Firestore backend (FIRESTORE_BACKEND=memory)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                            help="Transactions in the benchmark user's ledger, one run per size.")
+        parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS,
+                            help="Timed requests per endpoint.")
+        parser.add_argument("--baseline", default=str(BASELINE_PATH), help="Baseline JSON file.")
+        parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                            help="Allowed p95/memory increase over the baseline (0.25 = 25%%).")
+        parser.add_argument("--update-baseline", action="store_true", help="Write these results as the new baseline.")
+        parser.add_argument("--fail-on-regression", action="store_true", help="Exit non-zero on a regression.")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'size':>7}  {'endpoint':<26}{'p50 ms':>10}{'p95 ms':>10}{'peak KiB':>11}{'reads':>8}")
+
+        def report(size, name, metrics):
+            self.stdout.write(
+                f"{size:>7}  {name:<26}{metrics['p50_ms']:>10}{metrics['p95_ms']:>10}"
+                f"{metrics['peak_kib']:>11}{metrics['reads']:>8}"
+            )
+
+        try:
+            results = run_benchmarks(sizes=options["sizes"], iterations=options["iterations"], on_result=report)
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+        if options["update_baseline"]:
+            baseline = load_baseline(options["baseline"])
+            baseline.update(results)
+            save_baseline(baseline, options["baseline"])
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {options['baseline']}"))
+            return
+
+        regressions = compare_to_baseline(results, load_baseline(options["baseline"]), options["tolerance"])
+        for regression in regressions:
+            self.stdout.write(self.style.WARNING(f"REGRESSION {regression}"))
+        if regressions and options["fail_on_regression"]:
+            raise CommandError(f"{len(regressions)} regression(s) against {options['baseline']}")
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from apps.datagen.services import refresh_admin_analytics_snapshot
+
+
+class Command(BaseCommand):
+    help = "Rebuild the cached admin overview analytics (run periodically, e.g. from cron)."
+
+    def handle(self, *args, **options):
+        snapshot = refresh_admin_analytics_snapshot()
+        for entry in snapshot["top_categories"]:
+            self.stdout.write(f"{entry['category']}: {entry['total']:.2f}")
+        self.stdout.write(self.style.SUCCESS("Admin analytics snapshot refreshed."))
@@ -1,16 +1,13 @@
 import json
-import google.generativeai as genai
 from django.conf import settings
+from AI.llm_gateway import generate_text
 from datetime import datetime
-from apps.common_utils.firebase_service import add_transaction, get_user_categories
+from apps.common_utils.firebase_service import bulk_add_transactions, get_user_categories
 
 def generate_transaction_batch(num_transactions: int, user_categories: list):
     """
     Generates a batch of hyper-realistic transaction data using an optimized Gemini API prompt.
     """
-    genai.configure(api_key=settings.GEMINI_API_KEY)
-    model = genai.GenerativeModel("gemini-1.5-flash-latest")
-    
     categories_str = ", ".join([f'"{c}"' for c in user_categories])
 
     prompt = f"""
@@ -46,8 +43,8 @@ def generate_transaction_batch(num_transactions: int, user_categories: list):
     """
     
     try:
-        response = model.generate_content(prompt)
-        response_text = response.text.strip().replace("```json", "").replace("```", "")
+        response_text = generate_text(prompt, model="gemini-1.5-flash-latest", call_site="datagen.batch", timeout=120)
+        response_text = response_text.strip().replace("```json", "").replace("```", "")
         return json.loads(response_text)
     except Exception as e:
         print(f"Error parsing Gemini response: {e}")
@@ -66,98 +63,201 @@ def add_generated_data_to_user(user_id, num_transactions):
     if not transactions:
         raise Exception("Failed to generate transaction data from the AI.")
 
-    added_count = 0
+    by_collection = {'incomes': [], 'expenses': []}
     for txn in transactions:
         collection = 'incomes' if txn.get('category') == 'Income' else 'expenses'
         try:
             # Convert date string to datetime object for Firestore
             txn['date'] = datetime.strptime(txn['date'], '%Y-%m-%d')
-            add_transaction(user_id, txn, collection)
-            added_count += 1
-        except (ValueError, KeyError) as e:
+            by_collection[collection].append(txn)
+        except (ValueError, KeyError, TypeError) as e:
             print(f"Skipping invalid transaction record: {txn}. Error: {e}")
             continue
-    
+
+    added_count = 0
+    for collection, records in by_collection.items():
+        added_count += _bulk_add(user_id, records, collection)
     return added_count
 
 
+def _bulk_add(user_id, records, collection):
+    """Insert ``records`` with batched writes and report any that failed."""
+    if not records:
+        return 0
+    result = bulk_add_transactions(user_id, records, collection)
+    for failure in result['failures']:
+        print(f"Skipping transaction record: {records[failure['index']]}. Error: {failure['error']}")
+    return result['added']
+
+
 # Add this new function to your datagen/services.py file
-from apps.common_utils.firebase_service import db
+from apps.common_utils.firebase_service import db, begin_data_wipe, bulk_delete_user_data, fail_data_wipe
 from google.cloud.firestore_v1.base_query import FieldFilter
+import threading
 
-def delete_all_user_transactions(user_id):
+TRANSACTION_COLLECTIONS = ('expenses', 'incomes')
+_running_wipes = set()
+_running_wipes_lock = threading.Lock()
+
+def delete_all_user_transactions(user_id, state=None):
     """
-    Finds and deletes all documents in 'expenses' and 'incomes' collections
-    for a given user_id.
+    Deletes all documents in 'expenses' and 'incomes' collections for a
+    given user_id using the bulk delete engine. Returns the deleted count.
     """
-    collections_to_delete = ['expenses', 'incomes']
-    deleted_count = 0
+    state = bulk_delete_user_data(
+        user_id,
+        collections=TRANSACTION_COLLECTIONS,
+        on_progress=lambda progress: print(
+            f"Wipe {user_id}: {progress['deleted']} deleted ({progress['current_collection']})"
+        ),
+        state=state,
+    )
+    return state['deleted']
 
-    for collection_name in collections_to_delete:
-        # Query for all documents belonging to the user in the collection
-        docs = db.collection(collection_name).where(
-            filter=FieldFilter("userId", "==", user_id)
-        ).stream()
+def start_transaction_wipe(user_id):
+    """
+    Run delete_all_user_transactions in a background thread so the request
+    returns immediately. The checkpoint is marked as running before this
+    returns, so a status poll never sees the previous wipe. Returns False if
+    a wipe is already running for the user in this process.
+    """
+    with _running_wipes_lock:
+        if user_id in _running_wipes:
+            return False
+        _running_wipes.add(user_id)
 
-        for doc in docs:
-            doc.reference.delete()
-            deleted_count += 1
-            print(f"Deleted {doc.id} from {collection_name}")
+    try:
+        state = begin_data_wipe(user_id, TRANSACTION_COLLECTIONS)
+    except Exception:
+        with _running_wipes_lock:
+            _running_wipes.discard(user_id)
+        raise
 
-    return deleted_count
+    def run():
+        try:
+            delete_all_user_transactions(user_id, state=state)
+        except Exception as e:
+            print(f"Data wipe for {user_id} failed: {e}")
+            try:
+                fail_data_wipe(user_id)
+            except Exception as e:
+                print(f"Could not mark the data wipe for {user_id} as failed: {e}")
+        finally:
+            with _running_wipes_lock:
+                _running_wipes.discard(user_id)
+
+    threading.Thread(target=run, name=f"data-wipe-{user_id}", daemon=True).start()
+    return True
 
 # in apps/datagen/services.py
 
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from collections import Counter
+from functools import partial
 from apps.common_utils.firebase_service import db
+from apps.common_utils.concurrency import run_concurrently
+from apps.common_utils.rollup_service import MONTHS_SUBCOLLECTION, sum_groups
+from apps.common_utils.llm_cache import get_cache_stats
+from apps.common_utils.prompt_builder import get_prompt_stats
+from AI.categorization.receipt_pipeline import get_extraction_stats
+from AI.llm_gateway import get_llm_health, get_llm_stats
+from AI.embedding_cache import get_embedding_cache_stats
+
+ANALYTICS_SNAPSHOT_COLLECTION = 'analytics_snapshots'
+ADMIN_SNAPSHOT_ID = 'admin_overview'
+_snapshot_refresh_lock = threading.Lock()
+
+def _count(query):
+    """Server-side count() of the documents matching ``query``."""
+    return query.count(alias='count').get()[0][0].value
+
+def refresh_admin_analytics_snapshot():
+    """
+    Rank spending categories across all users and store the top 5 in
+    analytics_snapshots/admin_overview.
+
+    Firestore aggregations cannot group by a field, so the ranking is built
+    from the per-user monthly rollups (one small document per user-month)
+    rather than from every expense, and cached between refreshes.
+    """
+    months = db.collection_group(MONTHS_SUBCOLLECTION).select(['categories']).stream()
+    category_totals = Counter(sum_groups({doc.reference.path: doc.to_dict() for doc in months}, 'categories'))
+    top_5_categories = category_totals.most_common(5)
+
+    snapshot = {
+        'top_categories': [{'category': category, 'total': total} for category, total in top_5_categories],
+        'generated_at': datetime.now(timezone.utc),
+    }
+    db.collection(ANALYTICS_SNAPSHOT_COLLECTION).document(ADMIN_SNAPSHOT_ID).set(snapshot)
+    return snapshot
+
+def _start_snapshot_refresh():
+    """Refresh the snapshot in the background unless a refresh is already running."""
+    if not _snapshot_refresh_lock.acquire(blocking=False):
+        return
+
+    def run():
+        try:
+            refresh_admin_analytics_snapshot()
+        except Exception as e:
+            print(f"Admin analytics refresh failed: {e}")
+        finally:
+            _snapshot_refresh_lock.release()
+
+    threading.Thread(target=run, name="admin-analytics-refresh", daemon=True).start()
+
+def get_admin_analytics_snapshot():
+    """
+    Return the cached category ranking. A stale snapshot (older than
+    ADMIN_ANALYTICS_TTL seconds) is still served while a fresh one is built;
+    only the very first call builds it inline.
+    """
+    doc = db.collection(ANALYTICS_SNAPSHOT_COLLECTION).document(ADMIN_SNAPSHOT_ID).get()
+    if not doc.exists:
+        return refresh_admin_analytics_snapshot()
+    snapshot = doc.to_dict()
+    generated_at = snapshot.get('generated_at')
+    ttl = timedelta(seconds=getattr(settings, 'ADMIN_ANALYTICS_TTL', 900))
+    if not isinstance(generated_at, datetime) or datetime.now(timezone.utc) - generated_at > ttl:
+        _start_snapshot_refresh()
+    return snapshot
 
 def get_admin_dashboard_analytics():
     """
-    Fetches and calculates key metrics for the admin dashboard from Firestore.
+    Fetches key metrics for the admin dashboard from Firestore.
+
+    User counts are count() aggregations evaluated by Firestore; the top
+    categories come from the cached analytics snapshot. Neither reads
+    individual user or expense documents.
     """
-    # 1. Get User Metrics
+    # 1. Get User Metrics, and 2. New Users in the Last 7 Days
     user_profiles_ref = db.collection('user_profiles')
-    all_users = list(user_profiles_ref.stream())
-    total_users = len(all_users)
-
-    # 2. Calculate New Users in the Last 7 Days
-    seven_days_ago = datetime.now() - timedelta(days=7)
-    new_users_last_7_days = 0
-    for user in all_users:
-        user_data = user.to_dict()
-        created_at = user_data.get('created_at')
-        # Ensure created_at is a datetime object before comparing
-        if isinstance(created_at, datetime) and created_at.replace(tzinfo=None) > seven_days_ago:
-            new_users_last_7_days += 1
-
-    # 3. Analyze Top 5 Spending Categories across ALL users
-    expenses_ref = db.collection('expenses')
-    all_expenses = expenses_ref.stream()
-    
-    category_counts = Counter()
-    for expense in all_expenses:
-        expense_data = expense.to_dict()
-        category = expense_data.get('category')
-        if category:
-            # Ensure amount is a number before adding
-            amount = expense_data.get('amount', 0)
-            if isinstance(amount, (int, float)):
-                category_counts[category] += amount
-
-    # Get the top 5 most common categories by total spend
-    top_5_categories = category_counts.most_common(5)
-    
-    # Format for Chart.js
+    seven_days_ago = datetime.now(timezone.utc) - timedelta(days=7)
+    total_users, new_users_last_7_days, snapshot = run_concurrently(
+        partial(_count, user_profiles_ref),
+        partial(_count, user_profiles_ref.where(filter=FieldFilter('created_at', '>', seven_days_ago))),
+        get_admin_analytics_snapshot,
+    )
+
+    # 3. Top 5 Spending Categories across ALL users, formatted for Chart.js
+    top_categories = snapshot.get('top_categories', [])
     top_categories_chart_data = {
-        'labels': [category for category, amount in top_5_categories],
-        'values': [amount for category, amount in top_5_categories]
+        'labels': [entry['category'] for entry in top_categories],
+        'values': [entry['total'] for entry in top_categories]
     }
 
+    generated_at = snapshot.get('generated_at')
     return {
         'total_users': total_users,
         'new_users_last_7_days': new_users_last_7_days,
-        'top_categories_chart': top_categories_chart_data
+        'top_categories_chart': top_categories_chart_data,
+        'top_categories_updated_at': generated_at.isoformat() if isinstance(generated_at, datetime) else None,
+        'llm_cache': get_cache_stats(),
+        'llm_prompts': get_prompt_stats(),
+        'receipt_extraction': get_extraction_stats(),
+        'llm_calls': get_llm_stats(),
+        'llm_health': get_llm_health(),
+        'embedding_cache': get_embedding_cache_stats(),
     }
 
 # Add this new function to your datagen/services.py file
@@ -166,9 +266,6 @@ def generate_historical_data(user_id, constraints):
     """
     Generates a batch of historical transaction data based on user constraints.
     """
-    genai.configure(api_key=settings.GEMINI_API_KEY)
-    model = genai.GenerativeModel("gemini-1.5-flash-latest")
-    
     # --- NEW OPTIMIZED PROMPT ---
     prompt = f"""
     You are an AI data generator for "Neural Budget AI". Your task is to create a JSON array of hyper-realistic historical transactions for a user.
@@ -196,22 +293,21 @@ def generate_historical_data(user_id, constraints):
     """
     
     try:
-        response = model.generate_content(prompt)
-        response_text = response.text.strip().replace("```json", "").replace("```", "")
+        response_text = generate_text(prompt, model="gemini-1.5-flash-latest", call_site="datagen.historical", timeout=120)
+        response_text = response_text.strip().replace("```json", "").replace("```", "")
         transactions = json.loads(response_text)
     except Exception as e:
         print(f"Error parsing Gemini response: {e}")
         return []
 
     # Add the generated data to the user's account
-    added_count = 0
+    valid_transactions = []
     for txn in transactions:
         try:
             txn['date'] = datetime.strptime(txn['date'], '%Y-%m-%d')
-            add_transaction(user_id, txn, 'expenses')
-            added_count += 1
-        except (ValueError, KeyError) as e:
+            valid_transactions.append(txn)
+        except (ValueError, KeyError, TypeError) as e:
             print(f"Skipping invalid transaction record: {txn}. Error: {e}")
             continue
-            
-    return added_count
+
+    return _bulk_add(user_id, valid_transactions, 'expenses')
@@ -1,5 +1,41 @@
 import { getCookie } from '/static/core/js/help.js';
 
+const POLL_INTERVAL_MS = 1500;
+// Give up if the deleted count has not moved for this long
+const STALL_TIMEOUT_MS = 2 * 60 * 1000;
+
+// The deletion runs in the background; poll its progress until it finishes.
+async function waitForDeletion(statusMessage) {
+    let lastDeleted = -1;
+    let lastProgressAt = Date.now();
+    while (true) {
+        const response = await fetch('/datagen/api/delete-data/status/');
+        const data = await response.json();
+        if (!response.ok) {
+            throw new Error(data.error || 'Could not check deletion progress.');
+        }
+        if (data.status === 'done') {
+            return data;
+        }
+        if (data.status === 'failed') {
+            throw new Error(`Deletion stopped after ${data.deleted} records (${data.failed} failed). Click delete again to resume.`);
+        }
+        if (data.status !== 'running') {
+            throw new Error('The deletion did not start. Please try again.');
+        }
+        if (data.deleted !== lastDeleted) {
+            lastDeleted = data.deleted;
+            lastProgressAt = Date.now();
+        } else if (Date.now() - lastProgressAt > STALL_TIMEOUT_MS) {
+            throw new Error(`Deletion has not progressed after ${data.deleted} records. Click delete again to resume.`);
+        }
+        statusMessage.textContent = `Deleting... ${data.deleted} records removed so far.`;
+        statusMessage.className = 'status-message';
+        statusMessage.style.display = 'block';
+        await new Promise(resolve => setTimeout(resolve, POLL_INTERVAL_MS));
+    }
+}
+
 document.addEventListener('DOMContentLoaded', () => {
     const deleteBtn = document.getElementById('delete-btn');
     const statusMessage = document.getElementById('status-message');
@@ -24,13 +60,17 @@ document.addEventListener('DOMContentLoaded', () => {
             });
 
             const data = await response.json();
-            
-            statusMessage.textContent = data.message || data.error;
-            statusMessage.className = response.ok ? 'status-message success' : 'status-message error';
+            if (!response.ok && response.status !== 409) {
+                throw new Error(data.error || 'Failed to start deletion.');
+            }
+
+            const result = await waitForDeletion(statusMessage);
+            statusMessage.textContent = `Successfully deleted ${result.deleted} transaction records.`;
+            statusMessage.className = 'status-message success';
             statusMessage.style.display = 'block';
 
         } catch (error) {
-            statusMessage.textContent = 'A network error occurred. Please try again.';
+            statusMessage.textContent = error.message || 'A network error occurred. Please try again.';
             statusMessage.className = 'status-message error';
             statusMessage.style.display = 'block';
         } finally {
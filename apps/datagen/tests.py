@@ -1,3 +1,72 @@
-from django.test import TestCase
+import threading
+from unittest import mock, skipUnless
+from django.test import SimpleTestCase
+from apps.common_utils.firebase_config import db
+from apps.common_utils.firebase_service import get_data_wipe_status
+from apps.common_utils.memory_firestore import MemoryFirestoreClient
+from apps.datagen import services
+from apps.datagen.benchmarks import compare_to_baseline, run_benchmarks
 
-# Create your tests here.
+# Endpoints whose Firestore reads must not grow with the size of the ledger
+CONSTANT_READ_ENDPOINTS = (
+    "dashboard_view", "get_transactions_history", "set_budget",
+    "get_income_data", "get_admin_analytics_api",
+)
+
+
+class EndpointBenchmarkTests(SimpleTestCase):
+    @skipUnless(isinstance(db, MemoryFirestoreClient), "Set FIRESTORE_BACKEND=memory to run the benchmarks.")
+    def test_reads_do_not_grow_with_ledger_size(self):
+        results = run_benchmarks(sizes=(200, 2000), iterations=2)
+        for name in CONSTANT_READ_ENDPOINTS:
+            self.assertEqual(results["200"][name]["reads"], results["2000"][name]["reads"], name)
+
+    def test_compare_to_baseline_flags_extra_reads_and_slowdowns(self):
+        baseline = {"1000": {"dashboard_view": {"p50_ms": 10, "p95_ms": 10, "peak_kib": 100, "reads": 17}}}
+        results = {"1000": {"dashboard_view": {"p50_ms": 10, "p95_ms": 20, "peak_kib": 110, "reads": 18}}}
+        regressions = compare_to_baseline(results, baseline, tolerance=0.25)
+        self.assertEqual(len(regressions), 2)
+        self.assertIn("reads 17 -> 18", regressions[0])
+        self.assertIn("p95_ms", regressions[1])
+
+
+@skipUnless(isinstance(db, MemoryFirestoreClient), "Set FIRESTORE_BACKEND=memory to run the wipe tests.")
+class DataWipeTests(SimpleTestCase):
+    user_id = "wipe-test-user"
+
+    def setUp(self):
+        db.collection("data_wipes").document(self.user_id).set(
+            {"userId": self.user_id, "status": "done", "deleted": 42, "failed": 0,
+             "collections": list(services.TRANSACTION_COLLECTIONS), "completed": []}
+        )
+
+    def _start(self, target):
+        started = threading.Event()
+        release = threading.Event()
+
+        def delete(user_id, state=None):
+            started.set()
+            release.wait(5)
+            return target(user_id, state)
+
+        with mock.patch.object(services, "delete_all_user_transactions", side_effect=delete):
+            self.assertTrue(services.start_transaction_wipe(self.user_id))
+            started.wait(5)
+            status = get_data_wipe_status(self.user_id)
+            release.set()
+            for thread in threading.enumerate():
+                if thread.name == f"data-wipe-{self.user_id}":
+                    thread.join(5)
+        return status
+
+    def test_status_is_running_before_the_thread_reports_progress(self):
+        status = self._start(lambda user_id, state: 0)
+        self.assertEqual(status["status"], "running")
+        self.assertEqual(status["deleted"], 0)
+
+    def test_a_crashed_wipe_is_marked_failed(self):
+        def crash(user_id, state):
+            raise RuntimeError("boom")
+
+        self._start(crash)
+        self.assertEqual(get_data_wipe_status(self.user_id)["status"], "failed")
@@ -20,5 +20,6 @@ urlpatterns = [
     # --- API Endpoints ---
     path('api/generate-data/', views.generate_data_api, name='generate_data_api'),
     path('api/delete-data/', views.delete_data_api, name='delete_data_api'),
+    path('api/delete-data/status/', views.delete_data_status_api, name='delete_data_status_api'),
     path('api/get-admin-analytics/', views.get_admin_analytics_api, name='get_admin_analytics_api'),
 ]
\ No newline at end of file
@@ -3,7 +3,7 @@ from django.shortcuts import render
 from django.http import JsonResponse
 from apps.common_utils.auth_utils import get_email, get_user_id
 # Make sure get_user_profile is imported
-from apps.common_utils.firebase_service import get_user_profile
+from apps.common_utils.firebase_service import get_user_profile, get_data_wipe_status
 from . import services
 
 def data_generator_page(request):
@@ -44,12 +44,29 @@ def delete_data_page(request):
     return render(request, 'datagen/delete_data.html', {'user_name': user_name})
 
 def delete_data_api(request):
-    """API endpoint to handle the data deletion request."""
+    """API endpoint that starts deleting the user's transactions in the background."""
     if request.method == 'POST':
         try:
             user_id = get_user_id(request)
-            deleted_count = services.delete_all_user_transactions(user_id)
-            return JsonResponse({'message': f'Successfully deleted {deleted_count} transaction records.'})
+            if not services.start_transaction_wipe(user_id):
+                return JsonResponse({'message': 'A deletion is already in progress.'}, status=409)
+            return JsonResponse({'message': 'Deletion started.'}, status=202)
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=500)
+    return JsonResponse({'error': 'Invalid request method'}, status=405)
+
+def delete_data_status_api(request):
+    """API endpoint reporting the progress of the user's last data deletion."""
+    if request.method == 'GET':
+        try:
+            wipe = get_data_wipe_status(get_user_id(request))
+            if not wipe:
+                return JsonResponse({'status': 'none', 'deleted': 0, 'failed': 0})
+            return JsonResponse({
+                'status': wipe.get('status'),
+                'deleted': wipe.get('deleted', 0),
+                'failed': wipe.get('failed', 0),
+            })
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
     return JsonResponse({'error': 'Invalid request method'}, status=405)
@@ -2,9 +2,20 @@
 import json
 from datetime import datetime, timedelta
 import statistics
-import google.generativeai as genai
-from django.conf import settings
-from apps.common_utils.firebase_service import get_transactions
+from AI.llm_gateway import generate_text
+from apps.common_utils.firebase_config import db
+from apps.common_utils.firebase_service import get_transactions, aggregate_transactions
+from apps.common_utils.request_loader import invalidate_request_cache
+from apps.common_utils.rollup_service import get_monthly_rollups, sum_groups
+from apps.common_utils.llm_cache import (
+    cached_llm_result, PREDICTIVE_ANALYSIS, SMART_CATEGORIZATION, INVESTMENT_GUIDE
+)
+from apps.common_utils.prompt_builder import build_prompt, summarize_expenses
+
+# Bump when the corresponding prompt changes so cached answers are not reused
+PREDICTIVE_PROMPT_VERSION = 2
+SMART_CATEGORIZATION_PROMPT_VERSION = 2
+INVESTMENT_GUIDE_PROMPT_VERSION = 1
 
 
 def generate_predictive_analysis(user_id):
@@ -15,47 +26,31 @@ def generate_predictive_analysis(user_id):
     - Prepares structured aggregates (monthly + category) before passing to Gemini.
     """
 
-    # 1. Fetch transactions
-    all_expenses = get_transactions(user_id, 'expenses')
-    if not all_expenses:
-        return {"error": "No transaction data found to generate an analysis."}
-
+    # 1. Count the last 6 months of transactions from the monthly rollups
     six_months_ago = datetime.now() - timedelta(days=180)
-    recent_expenses = [
-        tx for tx in all_expenses
-        if isinstance(tx.get('date'), datetime) and tx['date'].replace(tzinfo=None) > six_months_ago
-    ]
+    rollups = get_monthly_rollups(user_id, since=six_months_ago)
+    recent_count = sum(r.get("expense_count", 0) for r in rollups.values())
 
     # 3. Fallback to all data if too few recent transactions
-    if len(recent_expenses) < 30:  # less than 30 transactions in 6 months = too sparse
+    if recent_count < 30:  # less than 30 transactions in 6 months = too sparse
         print("Recent data is insufficient. Falling back to all available data.")
-        analysis_data_source = all_expenses
+        rollups = get_monthly_rollups(user_id)
+        analysis_data_source = get_transactions(user_id, 'expenses')
     else:
-        analysis_data_source = recent_expenses
+        analysis_data_source = get_transactions(user_id, 'expenses', since=six_months_ago)
 
-    # 4. Preprocess transactions
-    monthly_totals = {}
-    category_totals = {}
-    cleaned_transactions = []
-
-    for tx in analysis_data_source:
-        amount = float(tx.get("amount", 0))
-        date_obj = tx.get("date")
-
-        if isinstance(date_obj, datetime):
-            tx["date"] = date_obj.isoformat()
-            month_key = date_obj.strftime("%Y-%m")
-        else:
-            month_key = "unknown"
-
-        # Monthly aggregation
-        monthly_totals[month_key] = monthly_totals.get(month_key, 0) + amount
+    if not analysis_data_source:
+        return {"error": "No transaction data found to generate an analysis."}
 
-        # Category aggregation
-        category = tx.get("category", "Uncategorized")
-        category_totals[category] = category_totals.get(category, 0) + amount
+    # 4. Monthly + category aggregates come straight from the rollups
+    monthly_totals = {
+        month: r.get("expense_total", 0)
+        for month, r in rollups.items()
+        if r.get("month") and r.get("expense_count", 0) > 0
+    }
+    category_totals = sum_groups(rollups, "categories")
 
-        cleaned_transactions.append(tx)
+    summary = summarize_expenses(analysis_data_source)
 
     # Compute average + recent trend for prompt guidance
     monthly_values = list(monthly_totals.values())
@@ -63,8 +58,8 @@ def generate_predictive_analysis(user_id):
     last_month_spend = round(monthly_values[-1], 2) if monthly_values else 0
     spend_trend = "increasing" if last_month_spend > avg_monthly_spend else "decreasing"
 
-    # 5. Construct enriched prompt
-    prompt = f"""
+    # 5. Construct the prompt from aggregates (merchants are trimmed first if it gets too long)
+    instructions = f"""
     You are a financial data analyst for "Neural Budget AI".
     Analyze the user's spending patterns and provide a predictive analysis.
 
@@ -85,36 +80,65 @@ def generate_predictive_analysis(user_id):
        - Trend direction = {spend_trend}
 
     2. "category_chart":
-       - Group transactions by category and provide the total spend per category.
+       - Provide the total spend per category, using the category totals below.
        - Provide:
          {{
            "labels": [<category1>, <category2>, ...],
            "values": [<amount1>, <amount2>, ...]
          }}
 
-    Transaction Data (for deeper insights):
-    {json.dumps(cleaned_transactions, indent=2)}
-
-    Monthly Aggregates:
-    {json.dumps(monthly_totals, indent=2)}
-
-    Category Aggregates:
-    {json.dumps(category_totals, indent=2)}
+    The data below is aggregated from {summary["count"]} transactions
+    ({summary["first_date"]} to {summary["last_date"]}, total {summary["total"]}).
     """
-
-    # 6. Call Gemini API
-    try:
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        model = genai.GenerativeModel("gemini-1.5-flash-latest")
-        response = model.generate_content(prompt)
-
-        result_text = response.text.strip().replace("```json", "").replace("```", "")
-        analysis_data = json.loads(result_text)
-
-        return analysis_data
-    except Exception as e:
-        print(f"Gemini API Error: {e}")
-        return {"error": "The AI could not generate your analysis. Please try again later."}
+    prompt, _ = build_prompt(PREDICTIVE_ANALYSIS, instructions, [
+        ("Monthly totals", ("month", "total"), [(month, round(total, 2)) for month, total in monthly_totals.items()]),
+        ("Category totals", ("category", "total"),
+         sorted(((name, round(total, 2)) for name, total in category_totals.items()), key=lambda row: (-row[1], row[0]))),
+        ("Top merchants", ("merchant", "category", "transactions", "total"), summary["merchants"]),
+    ])
+
+    # 6. Call Gemini API (skipped when the same data was analysed before)
+    def ask_gemini():
+        try:
+            response_text = generate_text(prompt, model="gemini-1.5-flash-latest", call_site="insights.predictive", user_id=user_id)
+
+            result_text = response_text.strip().replace("```json", "").replace("```", "")
+            analysis_data = json.loads(result_text)
+
+            return analysis_data
+        except Exception as e:
+            print(f"Gemini API Error: {e}")
+            return {"error": "The AI could not generate your analysis. Please try again later."}
+
+    result = cached_llm_result(PREDICTIVE_ANALYSIS, PREDICTIVE_PROMPT_VERSION, prompt, ask_gemini)
+    if "error" in result:
+        # Errors are not cached, so the next visit asks the model again
+        return local_predictive_charts(monthly_totals, category_totals)
+    return result
+
+
+def local_predictive_charts(monthly_totals, category_totals):
+    """
+    The predictive charts computed without the model, shown when Gemini
+    fails or is unavailable: the forecast is the mean of the last three months.
+    """
+    monthly_values = list(monthly_totals.values())
+    average = round(statistics.mean(monthly_values), 2) if monthly_values else 0
+    last_month = round(monthly_values[-1], 2) if monthly_values else 0
+    recent = monthly_values[-3:]
+    forecast = round(statistics.mean(recent), 2) if recent else 0
+    categories = sorted(category_totals.items(), key=lambda item: (-item[1], item[0]))
+    return {
+        "forecast_chart": {
+            "labels": ["Average Monthly Spend", "Last Month Spend", "Next 30 Days (Forecast)"],
+            "values": [average, last_month, forecast],
+        },
+        "category_chart": {
+            "labels": [name for name, _ in categories],
+            "values": [round(total, 2) for _, total in categories],
+        },
+        "notice": "The AI forecast is unavailable right now, so this is a simple estimate from your recent months.",
+    }
 
 
 def generate_smart_categorization(user_id):
@@ -125,48 +149,49 @@ def generate_smart_categorization(user_id):
     if not all_expenses:
         return {"error": "No transactions found to analyze."}
 
-    for transaction in all_expenses:
-        if 'date' in transaction and isinstance(transaction['date'], datetime):
-            transaction['date'] = transaction['date'].isoformat()
-
-    prompt = f"""
+    summary = summarize_expenses(all_expenses)
+    instructions = """
     You are an expert financial analyst for "Neural Budget AI".
     Perform a detailed, hierarchical analysis of the user's spending.
 
-    For each transaction, determine:
+    The user's transactions are summarised below, one row per merchant.
+    For each merchant, determine:
     - A general category (e.g., "Food & Dining", "Subscriptions & OTT")
     - Specific merchants or sub-types (e.g., "Netflix", "Zomato")
+    Put any rows summarised as "more rows" under a sub_category named "Other".
 
     Output a valid JSON object:
-    {{
+    {
       "analysis_results": [
-        {{
+        {
           "category": "<Main Category>",
           "icon": "<FontAwesome Icon>",
           "breakdown": [
-            {{
+            {
               "sub_category": "<Merchant/Sub-Type>",
               "transaction_count": <int>,
               "amount": <float>
-            }},
+            },
             ...
           ]
-        }},
+        },
         ...
       ]
-    }}
-
-    Here is the user's transaction data:
-    {json.dumps(all_expenses, indent=2)}
+    }
     """
-    try:
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        model = genai.GenerativeModel("gemini-1.5-flash-latest")
-        response = model.generate_content(prompt)
-        result_text = response.text.strip().replace("```json", "").replace("```", "")
-        return json.loads(result_text)
-    except Exception as e:
-        return {"error": f"AI analysis failed: {e}"}
+    prompt, _ = build_prompt(SMART_CATEGORIZATION, instructions, [
+        ("Merchants", ("merchant", "user category", "transactions", "total"), summary["merchants"]),
+    ])
+
+    def ask_gemini():
+        try:
+            response_text = generate_text(prompt, model="gemini-1.5-flash-latest", call_site="insights.smart_categorization", user_id=user_id)
+            result_text = response_text.strip().replace("```json", "").replace("```", "")
+            return json.loads(result_text)
+        except Exception as e:
+            return {"error": f"AI analysis failed: {e}"}
+
+    return cached_llm_result(SMART_CATEGORIZATION, SMART_CATEGORIZATION_PROMPT_VERSION, prompt, ask_gemini)
 
 
 def update_user_salary(user_id, salary):
@@ -179,6 +204,7 @@ def update_user_salary(user_id, salary):
         
     user_profile_ref = db.collection('user_profiles').document(user_id)
     user_profile_ref.set({'monthly_salary': salary_float}, merge=True)
+    invalidate_request_cache(user_id)
 
 def generate_investment_guide(user_id, location, salary):
     """
@@ -187,14 +213,7 @@ def generate_investment_guide(user_id, location, salary):
     print("--- 1. Starting Investment Guide Generation ---")
     
     thirty_days_ago = datetime.now() - timedelta(days=30)
-    all_expenses = get_transactions(user_id, 'expenses')
-    
-    recent_expenses = [
-        t for t in all_expenses
-        if isinstance(t.get('date'), datetime) and t['date'].replace(tzinfo=None) > thirty_days_ago
-    ]
-    
-    total_monthly_expenses = sum(t.get('amount', 0) for t in recent_expenses)
+    total_monthly_expenses = aggregate_transactions(user_id, 'expenses', since=thirty_days_ago)["total"]
     print(f"--- 2. Calculated last 30 days expenses: ₹{total_monthly_expenses:.2f} ---")
 
     monthly_savings = float(salary) - total_monthly_expenses
@@ -217,21 +236,24 @@ def generate_investment_guide(user_id, location, salary):
 
 
     # 4. Call the Gemini API and return the response
-    try:
-        print("--- 4. Sending prompt to Gemini API... ---")
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        model = genai.GenerativeModel("gemini-1.5-flash-latest")
-        response = model.generate_content(prompt)
-        
-        print("--- 5. Received response from Gemini. Parsing JSON... ---")
-        result_text = response.text.strip().replace("```json", "").replace("```", "")
-        parsed_response = json.loads(result_text)
-        print("--- 6. JSON parsed successfully. Sending tips to user. ---")
-        return parsed_response
-
-    except Exception as e:
-        print(f"--- CRITICAL ERROR during Gemini API call: {e} ---")
-        return {"error": f"The AI could not generate investment tips. Details: {e}"}
+    def ask_gemini():
+        try:
+            print("--- 4. Sending prompt to Gemini API... ---")
+            response_text = generate_text(prompt, model="gemini-1.5-flash-latest", call_site="insights.investment_guide", user_id=user_id)
+
+            print("--- 5. Received response from Gemini. Parsing JSON... ---")
+            result_text = response_text.strip().replace("```json", "").replace("```", "")
+            parsed_response = json.loads(result_text)
+            print("--- 6. JSON parsed successfully. Sending tips to user. ---")
+            return parsed_response
+
+        except Exception as e:
+            print(f"--- CRITICAL ERROR during Gemini API call: {e} ---")
+            return {"error": f"The AI could not generate investment tips. Details: {e}"}
+
+    # The prompt only depends on the location and the rounded savings
+    inputs = {"location": location, "monthly_savings": f"{monthly_savings:.2f}"}
+    return cached_llm_result(INVESTMENT_GUIDE, INVESTMENT_GUIDE_PROMPT_VERSION, inputs, ask_gemini)
 import requests
 
 def get_city_from_coordinates(lat, lon):
@@ -1,4 +1,4 @@
-import { getCookie } from '/static/core/js/help.js';
+import { awaitJob, getCookie } from '/static/core/js/help.js';
 
 document.addEventListener('DOMContentLoaded', () => {
     const setupContainer = document.getElementById('setup-container');
@@ -105,9 +105,8 @@ function positionSuccess(pos) {
                 },
                 body: JSON.stringify({ salary: userSalary, location: userLocation }),
             });
-            const data = await response.json();
-            if (!response.ok) throw new Error(data.error);
-            
+            const data = await awaitJob(response);
+
             renderTips(data.investment_tips);
             salaryDisplay.textContent = parseFloat(userSalary).toFixed(2);
 
@@ -1,11 +1,28 @@
-document.addEventListener('DOMContentLoaded', () => {
-    const dataElement = document.getElementById('chart-data');
-    if (!dataElement) {
-        console.error('Chart data not found in the template.');
+import { pollJob } from '/static/core/js/help.js';
+
+document.addEventListener('DOMContentLoaded', async () => {
+    const statusElement = document.getElementById('job-status-url');
+    if (!statusElement) return;
+
+    const spinner = document.getElementById('loading-spinner');
+    let chartData;
+    try {
+        chartData = await pollJob(JSON.parse(statusElement.textContent));
+    } catch (error) {
+        spinner.style.display = 'none';
+        document.getElementById('analysis-error-message').textContent = error.message;
+        document.getElementById('analysis-error').style.display = 'block';
         return;
     }
+    spinner.style.display = 'none';
+    document.getElementById('charts-grid').style.display = '';
 
-    const chartData = JSON.parse(dataElement.textContent);
+    // Shown when the charts were estimated locally because the AI was unavailable
+    if (chartData.notice) {
+        const notice = document.getElementById('analysis-notice');
+        notice.textContent = chartData.notice;
+        notice.style.display = '';
+    }
 
     // Render Forecast Chart (Bar Chart)
     if (chartData.forecast_chart) {
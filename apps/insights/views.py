@@ -1,15 +1,23 @@
+import json
 from django.shortcuts import render
 from django.http import JsonResponse
 from apps.common_utils.auth_utils import get_email, get_user_id
 from apps.common_utils.firebase_service import get_user_profile
+from apps.common_utils.jobs import JobQueueFull, job_response, submit_job
 from . import services
 
 
 def predictive_analysis_page(request):
-    """Renders the Predictive Analysis page and provides data."""
+    """
+    Renders the Predictive Analysis page straight away; the analysis runs as a
+    background job that the page polls for.
+    """
     user_id = get_user_id(request)
-    visualizations_data = services.generate_predictive_analysis(user_id)
-    context = {"visualizations": visualizations_data}
+    try:
+        job_id = submit_job(user_id, "predictive_analysis", services.generate_predictive_analysis, user_id)
+        context = {"job_id": job_id}
+    except JobQueueFull as e:
+        context = {"error": str(e)}
     return render(request, "insights/predictive_analysis.html", context)
 
 
@@ -21,12 +29,9 @@ def smart_categorization_page(request):
 
 
 def get_smart_analysis_api(request):
-    """API endpoint that returns the AI-generated spending analysis."""
+    """Starts the AI spending analysis as a background job; poll the returned status_url for it."""
     user_id = get_user_id(request)
-    analysis_data = services.generate_smart_categorization(user_id)
-    if "error" in analysis_data:
-        return JsonResponse(analysis_data, status=400)
-    return JsonResponse(analysis_data)
+    return job_response(user_id, "smart_categorization", services.generate_smart_categorization, user_id)
 
 
 def spending_insights_page(request):
@@ -53,7 +58,8 @@ def investment_guide_page(request):
 
 def generate_investment_tips_api(request):
     """
-    API endpoint that saves the user's salary and returns AI-generated tips.
+    API endpoint that saves the user's salary and starts generating the
+    AI investment tips as a background job.
     """
     if request.method == "POST":
         try:
@@ -69,11 +75,9 @@ def generate_investment_tips_api(request):
             services.update_user_salary(user_id, salary)
             
             # Generate the investment tips
-            tips_data = services.generate_investment_guide(user_id, location, salary)
-            
-            if "error" in tips_data:
-                return JsonResponse(tips_data, status=400)
-            return JsonResponse(tips_data)
+            return job_response(user_id, "investment_guide", services.generate_investment_guide, user_id, location, salary)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
         except Exception as e:
             return JsonResponse({"error": str(e)}, status=500)
     return JsonResponse({"error": "Invalid request method"}, status=405)
@@ -0,0 +1,64 @@
+"""
+Per-user category corrections for the local categorizer.
+
+Every saved expense records which category the user filed its merchant
+under, in ``category_corrections/{user_id}`` as
+``{"merchants": {"d mart": {"Groceries": 3}}}``. Those counts are handed to
+``AI.categorization.structured_output`` so the user's own choices win over
+the built-in keywords the next time the merchant appears.
+"""
+import logging
+from firebase_admin import firestore
+from apps.common_utils.firebase_config import db
+from apps.common_utils.firebase_service import get_document_data
+from apps.common_utils.request_loader import invalidate_request_cache
+from AI.categorization.local_categorizer import CONFIDENCE_THRESHOLD, merchant_key
+from AI.categorization.structured_output import categorize_text
+
+logger = logging.getLogger(__name__)
+
+CORRECTIONS_COLLECTION = "category_corrections"
+
+
+def get_category_corrections(user_id):
+    """``{merchant phrase: {category: times chosen}}`` for the user."""
+    if not user_id:
+        return {}
+    data = get_document_data(CORRECTIONS_COLLECTION, user_id) or {}
+    return data.get("merchants", {})
+
+
+def record_category_choice(user_id, name, category):
+    """Remember that the user filed the merchant in ``name`` under ``category``."""
+    record_category_choices(user_id, [(name, category)])
+
+
+def record_category_choices(user_id, choices):
+    """
+    Record several ``(name, category)`` choices, e.g. from a batch upload,
+    in one write to the user's corrections document.
+    """
+    merchants = {}
+    for name, category in choices:
+        key = merchant_key(name)
+        if key and category:
+            counts = merchants.setdefault(key, {})
+            counts[category] = counts.get(category, 0) + 1
+    if not user_id or not merchants:
+        return
+    try:
+        db.collection(CORRECTIONS_COLLECTION).document(user_id).set({
+            "userId": user_id,
+            "merchants": {key: {category: firestore.Increment(count) for category, count in counts.items()}
+                          for key, counts in merchants.items()},
+        }, merge=True)
+        invalidate_request_cache(user_id)
+    except Exception as e:
+        # Learning is best effort; the transactions themselves are already saved
+        logger.warning(f"Could not record category choices for {user_id}: {e}")
+
+
+def suggest_category(user_id, text):
+    """Local category guess for a transaction name: ``{"category", "confidence", "confident"}``."""
+    category, confidence = categorize_text(text, get_category_corrections(user_id))
+    return {"category": category, "confidence": confidence, "confident": confidence >= CONFIDENCE_THRESHOLD}
@@ -0,0 +1,309 @@
+"""
+Answers aggregate chatbot questions from the monthly rollups, without the LLM.
+
+    answer = answer_aggregate_question(user_id, "How much did I spend on groceries this month?")
+    if answer is None:
+        ...  # not an aggregate question; ask the LLM
+
+Questions like "what's my total income?", "total spent on groceries last
+month", "how much did I save in March", "how many expenses this year" or
+"top categories" are parsed into
+
+    subject   expense, income, both (a summary) or net (savings)
+    measure   total, count or a ranking of categories / income sources
+    window    this / last month, a named month, this / last year, a year,
+              the last N months, or all time
+    group     one expense category or income source the user has used
+
+and answered exactly from ``get_monthly_rollups`` (one document per month).
+A question is only answered when every word in it is understood; anything
+else (advice, merchants, single days or weeks) returns None and falls
+through to the LLM.
+"""
+import calendar
+import logging
+import re
+from datetime import datetime
+from apps.common_utils.rollup_service import UNKNOWN_MONTH, get_monthly_rollups
+
+logger = logging.getLogger(__name__)
+
+MONTHS = {name.lower(): number for number, name in enumerate(calendar.month_name) if name}
+MONTHS.update({name.lower(): number for number, name in enumerate(calendar.month_abbr) if name})
+NUMBER_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+                "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12}
+
+INCOME_WORDS = {"income", "incomes", "earn", "earned", "earning", "earnings", "receive", "received"}
+EXPENSE_WORDS = {"spend", "spent", "spending", "spendings", "expense", "expenses", "expenditure", "paid", "pay"}
+NET_WORDS = {"save", "saved", "saving", "savings", "net"}
+TOTAL_WORDS = {"much", "total", "sum", "overall", "amount"}
+COUNT_WORDS = {"many", "number", "count"}
+TOP_WORDS = {"top", "most", "biggest", "largest", "highest", "main"}
+GROUP_WORDS = {"categories", "category", "sources", "source", "breakdown", "where"}
+FILLER_WORDS = {
+    "how", "what", "whats", "s", "is", "was", "are", "were", "my", "me", "i", "do", "does", "did", "have", "has",
+    "had", "show", "tell", "give", "list", "the", "a", "an", "of", "on", "from", "to", "by", "at", "so", "far",
+    "till", "until", "now", "please", "money", "transactions", "transaction", "and", "vs", "versus", "all",
+    "time", "ever", "which", "with", "up", "it", "get", "got", "made", "make", "in", "during", "for",
+}
+# Words of the window ("last 3 months", "March 2025") and of "top 5" are only
+# understood as part of those phrases, so "my last expense" is not a window
+KNOWN_WORDS = (INCOME_WORDS | EXPENSE_WORDS | NET_WORDS | TOTAL_WORDS | COUNT_WORDS | TOP_WORDS
+               | GROUP_WORDS | FILLER_WORDS)
+# Words a question may contain that rollups cannot answer
+UNSUPPORTED_WORDS = {"today", "yesterday", "week", "weeks", "day", "days", "weekend"}
+
+LAST_N_MONTHS = re.compile(r"\b(?:last|past)\s+(\d+|" + "|".join(NUMBER_WORDS) + r")\s+months\b")
+# "may" is only a month in "in May" or "May 2025"
+MONTH_NAME = re.compile(r"\b(?:(" + "|".join(sorted(set(MONTHS) - {"may"}, key=len, reverse=True))
+                        + r")|(?<=in )(may)|(may)(?=\s+\d{4}))\b(?:\s+(\d{4}))?")
+YEAR = re.compile(r"\b(20\d{2})\b")
+TOP_N = re.compile(r"\btop\s+(\d+|" + "|".join(NUMBER_WORDS) + r")\b")
+STEM_LENGTH = 5
+
+
+def _month_index(year, month):
+    return year * 12 + month - 1
+
+
+def _month_key(index):
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def _number(token):
+    return int(token) if token.isdigit() else NUMBER_WORDS[token]
+
+
+def parse_window(text, today):
+    """
+    ``(since, until, phrase, words)``: the ``YYYY-MM`` bounds (``until``
+    exclusive, both None for all time), how to say it in the answer, and the
+    words of the window phrase. Returns None if the question names more
+    than one period.
+    """
+    current = _month_index(today.year, today.month)
+    match = LAST_N_MONTHS.search(text)
+    if match:
+        count = _number(match.group(1))
+        if not 1 <= count <= 120:
+            return None
+        return (_month_key(current - count + 1), _month_key(current + 1), f"in the last {count} months",
+                set(match.group(0).split()))
+    relative = (
+        (r"\b(?:this|current) month\b", _month_key(current), _month_key(current + 1), "this month"),
+        (r"\b(?:last|previous) month\b", _month_key(current - 1), _month_key(current), "last month"),
+        (r"\b(?:this|current) year\b", f"{today.year:04d}-01", f"{today.year + 1:04d}-01", "this year"),
+        (r"\b(?:last|previous) year\b", f"{today.year - 1:04d}-01", f"{today.year:04d}-01", "last year"),
+    )
+    for pattern, since, until, phrase in relative:
+        match = re.search(pattern, text)
+        if match:
+            return since, until, phrase, set(match.group(0).split())
+
+    matches = MONTH_NAME.findall(text)
+    if len(matches) > 1:
+        return None
+    if matches:
+        name = next(group for group in matches[0][:3] if group)
+        year = matches[0][3]
+        month = MONTHS[name]
+        if year:
+            index = _month_index(int(year), month)
+        else:
+            # A month without a year is the latest one that has started
+            index = _month_index(today.year if month <= today.month else today.year - 1, month)
+        label = f"{calendar.month_name[month]} {index // 12}"
+        return _month_key(index), _month_key(index + 1), f"in {label}", {name, year} - {""}
+
+    years = YEAR.findall(text)
+    if len(years) > 1:
+        return None
+    if years:
+        return f"{years[0]}-01", f"{int(years[0]) + 1:04d}-01", f"in {years[0]}", {years[0]}
+    return None, None, "", set()
+
+
+def _refers_to(word, name_word):
+    """True if ``word`` is a form of ``name_word``: "grocery" of "Groceries", "rent" of "Rent"."""
+    length = min(STEM_LENGTH, len(name_word))
+    return (len(word) >= 4 and word[:length] == name_word[:length]
+            and (length == STEM_LENGTH or len(word) <= len(name_word) + 2))
+
+
+def _match_groups(words, names):
+    """The names (categories or sources) that ``words`` refer to, and the words that matched."""
+    matched, used = set(), set()
+    for name in names:
+        name_words = [word for word in re.findall(r"[a-z]+", name.lower()) if word not in KNOWN_WORDS]
+        hits = {word for word in words if word not in KNOWN_WORDS
+                and any(_refers_to(word, name_word) for name_word in name_words)}
+        if hits:
+            matched.add(name)
+            used |= hits
+    return matched, used
+
+
+def _rupees(amount):
+    return f"₹{amount:,.0f}" if float(amount).is_integer() else f"₹{amount:,.2f}"
+
+
+def _in_window(month, since, until):
+    if since is None:
+        return True
+    return month != UNKNOWN_MONTH and since <= month < until
+
+
+def _totals(rollups, prefix, group_map, group):
+    total = count = 0
+    for rollup in rollups:
+        if group is None:
+            total += rollup.get(f"{prefix}_total", 0) or 0
+            count += rollup.get(f"{prefix}_count", 0) or 0
+        else:
+            entry = (rollup.get(group_map) or {}).get(group) or {}
+            total += entry.get("total", 0) or 0
+            count += entry.get("count", 0) or 0
+    return round(total, 2), count
+
+
+def _ranking(rollups, group_map):
+    totals = {}
+    for rollup in rollups:
+        for name, group in (rollup.get(group_map) or {}).items():
+            if group.get("count", 0) > 0:
+                totals[name] = totals.get(name, 0) + group.get("total", 0)
+    return sorted(((name, round(total, 2)) for name, total in totals.items()), key=lambda item: -item[1])
+
+
+def _with_window(sentence, phrase):
+    return f"{sentence} {phrase}".rstrip() + "."
+
+
+def answer_from_rollups(message, rollups, today=None):
+    """The answer to ``message`` from ``rollups`` (as get_monthly_rollups returns them), or None."""
+    today = today or datetime.now()
+    text = message.lower().replace("'", "")
+    words = re.findall(r"[a-z0-9]+", text)
+    if not words or UNSUPPORTED_WORDS & set(words):
+        return None
+
+    window = parse_window(text, today)
+    if window is None:
+        return None
+    since, until, phrase, window_words = window
+
+    top_match = TOP_N.search(text)
+    phrase_words = window_words | ({top_match.group(1)} if top_match else set())
+
+    categories = {name for rollup in rollups.values() for name in (rollup.get("categories") or {})}
+    sources = {name for rollup in rollups.values() for name in (rollup.get("sources") or {})}
+    matched_categories, category_words = _match_groups(words, categories)
+    matched_sources, source_words = _match_groups(words, sources)
+    leftover = [word for word in words
+                if word not in KNOWN_WORDS and word not in category_words | source_words | phrase_words]
+    if leftover or len(matched_categories) + len(matched_sources) > 1:
+        return None
+
+    present = set(words)
+    income, expense, net = present & INCOME_WORDS, present & EXPENSE_WORDS, present & NET_WORDS
+    if matched_categories:
+        if income or net:
+            return None
+        subject, group = "expense", matched_categories.pop()
+    elif matched_sources:
+        if expense or net:
+            return None
+        subject, group = "income", matched_sources.pop()
+    else:
+        group = None
+        if net:
+            subject = "net"
+        elif income and expense:
+            subject = "both"
+        elif income:
+            subject = "income"
+        elif expense:
+            subject = "expense"
+        elif present & {"categories", "category"}:
+            subject = "expense"
+        elif present & {"sources", "source"}:
+            subject = "income"
+        elif present & {"transactions", "transaction"}:
+            subject = "both"
+        else:
+            return None
+
+    if present & GROUP_WORDS and group is None:
+        measure = "ranking"
+    elif present & TOP_WORDS:
+        # "my biggest expense" asks about one transaction, which rollups do not know
+        return None
+    elif present & COUNT_WORDS:
+        measure = "count"
+    elif (present & TOTAL_WORDS or present & {"what", "whats", "show", "tell", "give"}
+          or subject in ("both", "net")):
+        measure = "total"
+    else:
+        return None
+
+    months = [rollup for month, rollup in rollups.items() if _in_window(month, since, until)]
+    spent, spent_count = _totals(months, "expense", "categories", group if subject == "expense" else None)
+    earned, earned_count = _totals(months, "income", "sources", group if subject == "income" else None)
+
+    if measure == "ranking":
+        if subject not in ("expense", "income") or group is not None:
+            return None
+        ranked = _ranking(months, "categories" if subject == "expense" else "sources")
+        noun = "spending categories" if subject == "expense" else "income sources"
+        if not ranked:
+            return _with_window(f"You have no {'expenses' if subject == 'expense' else 'income'} recorded", phrase)
+        if top_match:
+            ranked = ranked[:_number(top_match.group(1))]
+        elif present & TOP_WORDS:
+            ranked = ranked[:3]
+        listing = ", ".join(f"{name} {_rupees(total)}" for name, total in ranked)
+        heading = f"Your top {noun}" if present & TOP_WORDS else f"Your {noun}"
+        return f"{heading}{' ' + phrase if phrase else ''}: {listing}."
+
+    if measure == "count":
+        if subject == "expense":
+            what = f"{group} expense" if group else "expense"
+            return _with_window(f"You have {spent_count} {what}{'' if spent_count == 1 else 's'}", phrase)
+        if subject == "income":
+            what = f"income from {group}" if group else "income"
+            return _with_window(f"You have {earned_count} {what} record{'' if earned_count == 1 else 's'}", phrase)
+        return _with_window(f"You have {spent_count} expense{'' if spent_count == 1 else 's'} and "
+                            f"{earned_count} income record{'' if earned_count == 1 else 's'}", phrase)
+
+    if subject == "expense":
+        if not spent_count:
+            return _with_window(f"You have no {group + ' ' if group else ''}expenses recorded", phrase)
+        return _with_window(f"You spent {_rupees(spent)}{' on ' + group if group else ''}", phrase)
+    if subject == "income":
+        if not earned_count:
+            return _with_window(f"You have no income{' from ' + group if group else ''} recorded", phrase)
+        return _with_window(f"You have {_rupees(earned)} income{' from ' + group if group else ''}", phrase)
+    balance = round(earned - spent, 2)
+    if subject == "both":
+        return _with_window(f"Your income is {_rupees(earned)} and your expenses are {_rupees(spent)}, "
+                            f"a net of {'-' if balance < 0 else ''}{_rupees(abs(balance))}", phrase)
+    if balance >= 0:
+        return _with_window(f"You saved {_rupees(balance)} (income {_rupees(earned)}, expenses {_rupees(spent)})", phrase)
+    return _with_window(f"You spent {_rupees(-balance)} more than you earned "
+                        f"(income {_rupees(earned)}, expenses {_rupees(spent)})", phrase)
+
+
+def answer_aggregate_question(user_id, message, today=None):
+    """
+    Answer ``message`` from the user's rollups if it is an aggregate
+    question, else return None. Errors also return None, so the caller
+    falls back to the LLM.
+    """
+    try:
+        answer = answer_from_rollups(message, get_monthly_rollups(user_id), today)
+    except Exception as e:
+        logger.warning(f"Aggregate answer failed for user {user_id}, using the LLM: {e}")
+        return None
+    if answer is not None:
+        logger.info(f"Answered from rollups for user {user_id}: '{message[:50]}'")
+    return answer
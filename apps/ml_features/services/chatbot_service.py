@@ -1,17 +1,20 @@
 import os
 import sys
+import json
+import time
+import hashlib
 import warnings
 import logging
+import shutil
 from datetime import datetime
+from functools import partial
 from dotenv import load_dotenv
-from requests.exceptions import ReadTimeout
-from google.api_core.exceptions import GoogleAPIError
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 from langchain_community.vectorstores.utils import filter_complex_metadata
-from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
 from langchain_community.vectorstores import FAISS
 
 # Suppress FutureWarning for cleaner output
@@ -22,6 +25,13 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"
 
 # --- Firebase Service ---
 from apps.common_utils.firebase_service import get_transactions
+from apps.common_utils.rollup_service import get_monthly_rollups
+from apps.common_utils.concurrency import run_concurrently
+from AI.llm_gateway import LLMTimeout, api_key, generate_text
+from AI.embedding_cache import cached_embed_texts
+from AI.local_embeddings import HashingEmbedder
+from apps.ml_features.services.vector_shards import INDEX_DIR, ShardCache, shard_path
+from apps.ml_features.services.chatbot_router import answer_aggregate_question
 
 # --- CONFIGURATION ---
 load_dotenv()
@@ -38,14 +48,69 @@ logger = logging.getLogger(__name__)
 
 # Use Gemini models
 EMBEDDING_MODEL_NAME = "models/embedding-001"
+# "gemini" embeds through the Gemini API; "local" hashes text with NumPy, so
+# indexing and retrieval run on CPU without network access
+EMBEDDING_BACKEND = os.getenv("CHATBOT_EMBEDDING_BACKEND", "gemini").lower()
 LLM_MODEL_NAME = "gemini-1.5-flash"
 VECTOR_COLLECTION_NAME = "user_transaction_vectors"
-FAISS_INDEX_PATH = "faiss_index_service"
+# Retrieved documents per question, capped by what the user has indexed
+RETRIEVAL_K = 20
+# Seconds after which a user's transactions are compared with the index even
+# if the ledger fingerprint is unchanged (a delete plus an identical add)
+FULL_SYNC_INTERVAL = int(os.getenv("CHATBOT_FULL_SYNC_SECONDS", "600"))
+
+
+class GatewayEmbeddings(Embeddings):
+    """LangChain embeddings backed by the shared Gemini gateway, through the embedding cache."""
+
+    def __init__(self, model):
+        self.model = model
+        self.name = model
+
+    def embed_documents(self, texts):
+        return cached_embed_texts(list(texts), model=self.model, call_site="chatbot.index", task_type="RETRIEVAL_DOCUMENT")
+
+    def embed_query(self, text):
+        return cached_embed_texts([text], model=self.model, call_site="chatbot.query", task_type="RETRIEVAL_QUERY")[0]
+
+
+class LocalEmbeddings(Embeddings):
+    """LangChain embeddings from AI.local_embeddings; no API calls."""
+
+    def __init__(self):
+        self.embedder = HashingEmbedder()
+        self.name = self.embedder.name
+
+    def embed_documents(self, texts):
+        return self.embedder.embed(list(texts)).tolist()
+
+    def embed_query(self, text):
+        return self.embedder.embed([text])[0].tolist()
+
+
+EMBEDDING_BACKENDS = {
+    "gemini": lambda: GatewayEmbeddings(model=EMBEDDING_MODEL_NAME),
+    "local": LocalEmbeddings,
+}
+
+
+def _gateway_llm(prompt_value):
+    return generate_text(
+        prompt_value.to_string(),
+        model=LLM_MODEL_NAME,
+        call_site="chatbot.rag",
+        timeout=60,
+        temperature=0.1,
+        max_output_tokens=512,
+    )
+
+# user_id -> time.monotonic() of the user's last full comparison with Firestore
+_last_full_sync = {}
 
 _initialized_services = {
     "embedding_service": None,
     "llm": None,
-    "vector_store": None
+    "shards": None
 }
 
 def _initialize_ai_services():
@@ -54,224 +119,231 @@ def _initialize_ai_services():
 
     if all(_initialized_services.values()):
         print("AI services already initialized. Reusing existing instances.")
-        return _initialized_services["embedding_service"], _initialized_services["llm"], _initialized_services["vector_store"]
+        return _initialized_services["embedding_service"], _initialized_services["llm"], _initialized_services["shards"]
 
     print("Initializing AI services...")
     start_time = datetime.now()
 
     # Initialize Embedding Service
     try:
-        if not os.getenv("GEMINI_API_KEY"):
+        if EMBEDDING_BACKEND not in EMBEDDING_BACKENDS:
+            raise ValueError(f"Unknown CHATBOT_EMBEDDING_BACKEND '{EMBEDDING_BACKEND}'")
+        if EMBEDDING_BACKEND == "gemini" and not api_key():
             raise ValueError("GEMINI_API_KEY not found")
-            
-        embedding_service = GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL_NAME)
+
+        embedding_service = EMBEDDING_BACKENDS[EMBEDDING_BACKEND]()
         _initialized_services["embedding_service"] = embedding_service
-        print(f"✅ Embedding service initialized: {EMBEDDING_MODEL_NAME}")
+        print(f"✅ Embedding service initialized: {embedding_service.name}")
     except Exception as e:
         logger.error(f"❌ Failed to initialize embedding service: {e}")
         raise RuntimeError(f"Embedding service initialization failed: {e}")
 
     # Initialize LLM
     try:
-        llm = ChatGoogleGenerativeAI(
-            model=LLM_MODEL_NAME,
-            temperature=0.1,
-            max_output_tokens=512,
-            timeout=60
-        )
+        llm = RunnableLambda(_gateway_llm)
         _initialized_services["llm"] = llm
         print(f"✅ LLM initialized: {LLM_MODEL_NAME}")
     except Exception as e:
         logger.error(f"❌ LLM initialization failed: {e}")
         raise RuntimeError(f"LLM initialization failed: {e}")
 
-    # Initialize Vector Store (FAISS)
-    try:
-        vector_store = None
-        if os.path.exists(FAISS_INDEX_PATH):
-            try:
-                vector_store = FAISS.load_local(FAISS_INDEX_PATH, embedding_service, allow_dangerous_deserialization=True)
-                print(f"✅ Loaded existing FAISS index from {FAISS_INDEX_PATH}")
-            except Exception as e:
-                logger.warning(f"Could not load existing index: {e}")
-        
-        if vector_store is None:
-            # Initialize with dummy text
-            vector_store = FAISS.from_texts(["initialization"], embedding_service)
-            print(f"✅ Created new FAISS vector store")
-
-        _initialized_services["vector_store"] = vector_store
-    except Exception as e:
-        logger.error(f"❌ Vector store initialization failed: {e}")
-        raise RuntimeError(f"Vector store initialization failed: {e}")
+    # Per-user FAISS shards, loaded on first use (see vector_shards)
+    shards = ShardCache(embedding_service)
+    _initialized_services["shards"] = shards
+    if os.path.exists(os.path.join(INDEX_DIR, "index.faiss")):
+        # The single shared index used before shards; users are re-indexed into their own shard
+        logger.warning(f"{INDEX_DIR}/index.faiss is no longer used and can be deleted")
+    print(f"✅ FAISS shard cache ready in {INDEX_DIR} (max {shards.max_bytes // (1024 * 1024)} MB)")
 
     init_time = (datetime.now() - start_time).total_seconds()
     print(f"✅ All AI services initialized successfully in {init_time:.2f}s")
 
-    return embedding_service, llm, vector_store
+    return embedding_service, llm, shards
+
+
+# --- Index manifest ---
+# Each shard's manifest.json records what is indexed for its user:
+# {"docs": {vector_id: content_hash}, "ledger": fingerprint}. Vector IDs are
+# "<user>:<collection>:<doc id>", so a changed or deleted transaction can be
+# found and replaced in the index.
 
-def clear_user_data_from_vector_store(user_id: str, vector_store):
+def _ledger_fingerprint(user_id):
     """
-    Clear existing user data.
-    NOTE: FAISS does not support metadata-based deletion easily. 
-    Skipping this step for now to avoid complexity in free-tier optimization.
+    Hash of the user's monthly rollups. Every added or deleted transaction
+    changes them, so an unchanged fingerprint means nothing needs indexing;
+    reading them costs one document per month, not one per transaction.
     """
-    # FAISS implementation would require iterating docstore or rebuilding index.
-    # For now, we will just log.
-    logger.info(f"Skipping clear_user_data for user {user_id} (FAISS limitation)")
-    pass
-
-def index_user_transactions(user_id: str, embedding_service, vector_store, force_reindex=False):
-    """Index user transactions and income data with comprehensive logging"""
-    print(f"Starting indexing for user: {user_id} (force_reindex={force_reindex})")
-    start_time = datetime.now()
+    rollups = get_monthly_rollups(user_id)
+    return hashlib.sha256(json.dumps(rollups, sort_keys=True, default=str).encode("utf-8")).hexdigest()
 
-    try:
-        # Clear existing user data (Skipped for FAISS)
-        # clear_user_data_from_vector_store(user_id, vector_store)
-
-        # Fetch transactions (expenses) and incomes for this user
-        transactions_data = get_transactions(user_id, "expenses")
-        income_data = get_transactions(user_id, "incomes")
-        print(f"Retrieved {len(transactions_data)} expense(s) and {len(income_data)} income(s)")
-
-        all_docs = []
-
-        # Process expenses
-        for tx in transactions_data:
-            tx_id = tx.get('id') or tx.get('source_transaction_id') or f'tx_{datetime.now().timestamp()}'
-            all_docs.append({'data': tx, 'collection': 'expenses', 'doc_id': tx_id})
-
-        # Process incomes  
-        for inc in income_data:
-            inc_id = inc.get('id') or inc.get('source_transaction_id') or f'inc_{datetime.now().timestamp()}'
-            all_docs.append({'data': inc, 'collection': 'incomes', 'doc_id': inc_id})
-
-        if not all_docs:
-            print(f"No documents found for user: {user_id}")
-            return False
-
-        documents_to_index = []
-        processed_count = 0
-        skipped_count = 0
-
-        print(f"Processing {len(all_docs)} document(s)...")
-
-        for item in all_docs:
-            raw = item['data']
-            doc_id = item['doc_id']
-            collection_type = item['collection']
-            
-            try:
-                if collection_type == 'expenses':
-                    required_fields = ["name", "category", "amount", "date", "status"]
-                    missing = []
-                    for field in required_fields:
-                        if field not in raw or raw[field] in [None, "", 0]:
-                            missing.append(field)
-                    
-                    if missing:
-                        logger.warning(f"Expense document {doc_id} missing fields: {missing}, skipping")
-                        skipped_count += 1
-                        continue
 
-                    compact_content = (
-                        f"Expense: {raw['name']} "
-                        f"Amount: ₹{raw['amount']} "
-                        f"Category: {raw['category']} "
-                        f"Date: {raw['date']} "
-                        f"Status: {raw['status']} "
-                        f"Type: expense"
-                    )
-                    
-                    metadata = {
-                        "user_id": user_id,
-                        "source_document_id": doc_id,
-                        "type": "expense",
-                        "amount": float(raw['amount']),
-                        "date": str(raw['date']),
-                        "category": raw['category'],
-                        "name": raw['name'],
-                        "status": raw['status']
-                    }
-
-                else:  # incomes
-                    required_fields = ["source", "amount", "date", "status"]
-                    missing = []
-                    for field in required_fields:
-                        if field not in raw or raw[field] in [None, "", 0]:
-                            missing.append(field)
-                    
-                    if missing:
-                        logger.warning(f"Income document {doc_id} missing fields: {missing}, skipping")
-                        skipped_count += 1
-                        continue
+def _content_hash(document):
+    payload = json.dumps([document.page_content, document.metadata], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
-                    compact_content = (
-                        f"Income Source: {raw['source']} "
-                        f"Amount: ₹{raw['amount']} "
-                        f"Date: {raw['date']} "
-                        f"Status: {raw['status']} "
-                        f"Type: income"
-                    )
-                    
-                    metadata = {
-                        "user_id": user_id,
-                        "source_document_id": doc_id,
-                        "type": "income",
-                        "amount": float(raw['amount']),
-                        "date": str(raw['date']),
-                        "source": raw['source'],
-                        "status": raw['status']
-                    }
-
-                doc_to_add = Document(
-                    page_content=compact_content,
-                    metadata=metadata
-                )
-                documents_to_index.append(doc_to_add)
-                processed_count += 1
-
-            except Exception as e:
-                logger.error(f"Error processing document {doc_id} from {collection_type}: {e}")
-                skipped_count += 1
-                continue
-
-        if not documents_to_index:
-            logger.warning(f"No valid documents to index for user: {user_id}")
-            return False
-
-        # Filter complex metadata and add to vector store
-        filtered_documents = filter_complex_metadata(documents_to_index)
-        print(f"Adding {len(filtered_documents)} documents to vector store")
-        
-        vector_store.add_documents(documents=filtered_documents)
-        
-        # Persist FAISS index
-        try:
-            vector_store.save_local(FAISS_INDEX_PATH)
-            print(f"✅ FAISS index saved to {FAISS_INDEX_PATH}")
-        except Exception as persist_e:
-            logger.warning(f"Vector store persist failed: {persist_e}")
-
-        index_time = (datetime.now() - start_time).total_seconds()
-        print(f"✅ Indexing complete for user: {user_id} "
-                    f"(Processed: {processed_count}, Skipped: {skipped_count}, Time: {index_time:.2f}s)")
-        
-        return True
 
+def _build_document(user_id, collection_type, raw, doc_id):
+    """The Document indexed for one expense or income, or None if required fields are missing."""
+    if collection_type == 'expenses':
+        required_fields = ["name", "category", "amount", "date", "status"]
+    else:
+        required_fields = ["source", "amount", "date", "status"]
+    missing = [field for field in required_fields if field not in raw or raw[field] in [None, "", 0]]
+    if missing:
+        logger.warning(f"{collection_type} document {doc_id} missing fields: {missing}, skipping")
+        return None
+
+    if collection_type == 'expenses':
+        compact_content = (
+            f"Expense: {raw['name']} "
+            f"Amount: ₹{raw['amount']} "
+            f"Category: {raw['category']} "
+            f"Date: {raw['date']} "
+            f"Status: {raw['status']} "
+            f"Type: expense"
+        )
+        metadata = {
+            "user_id": user_id,
+            "source_document_id": doc_id,
+            "type": "expense",
+            "amount": float(raw['amount']),
+            "date": str(raw['date']),
+            "category": raw['category'],
+            "name": raw['name'],
+            "status": raw['status']
+        }
+    else:
+        compact_content = (
+            f"Income Source: {raw['source']} "
+            f"Amount: ₹{raw['amount']} "
+            f"Date: {raw['date']} "
+            f"Status: {raw['status']} "
+            f"Type: income"
+        )
+        metadata = {
+            "user_id": user_id,
+            "source_document_id": doc_id,
+            "type": "income",
+            "amount": float(raw['amount']),
+            "date": str(raw['date']),
+            "source": raw['source'],
+            "status": raw['status']
+        }
+    return Document(page_content=compact_content, metadata=metadata)
+
+
+def _delete_vectors(vector_store, ids):
+    """Delete the given vector IDs, skipping any the index does not hold."""
+    present = [vector_id for vector_id in ids if isinstance(vector_store.docstore.search(vector_id), Document)]
+    if present:
+        vector_store.delete(ids=present)
+    return len(present)
+
+
+def clear_user_data_from_vector_store(user_id: str, shards):
+    """Remove the user's index shard, from disk and from the cache."""
+    shard = shards.get(user_id)
+    with shard.lock:
+        shutil.rmtree(shard_path(user_id), ignore_errors=True)
+        shards.forget(user_id)
+        _last_full_sync.pop(user_id, None)
+    logger.info(f"Removed the index shard for user {user_id}")
+
+
+def index_user_transactions(user_id: str, embedding_service, shards, force_reindex=False):
+    """
+    Bring the user's shard in line with their transactions, and return it
+    (None if the sync failed).
+
+    Only new or changed documents are embedded, deleted ones are removed,
+    and the shard is saved only when something changed. When the ledger
+    fingerprint has not moved since the last sync (and the last full
+    comparison is under FULL_SYNC_INTERVAL old) the transactions are not
+    even fetched. ``force_reindex`` re-embeds everything.
+    """
+    start_time = datetime.now()
+    try:
+        shard = shards.get(user_id)
     except Exception as e:
-        logger.error(f"❌ Indexing failed for user {user_id}: {e}")
-        return False
+        logger.error(f"❌ Could not load the index shard for user {user_id}: {e}")
+        return None
+    with shard.lock:
+        try:
+            fingerprint = _ledger_fingerprint(user_id)
+            last_sync = _last_full_sync.get(user_id, 0)
+            if (not force_reindex and shard.manifest.get("ledger") == fingerprint
+                    and time.monotonic() - last_sync < FULL_SYNC_INTERVAL):
+                return shard
+
+            # Fetch transactions (expenses) and incomes for this user
+            transactions_data, income_data = run_concurrently(
+                partial(get_transactions, user_id, "expenses"),
+                partial(get_transactions, user_id, "incomes"),
+            )
+
+            current = {}
+            skipped_count = 0
+            for collection_type, records in (("expenses", transactions_data), ("incomes", income_data)):
+                for raw in records:
+                    try:
+                        document = _build_document(user_id, collection_type, raw, raw.get('id'))
+                    except Exception as e:
+                        logger.error(f"Error processing document {raw.get('id')} from {collection_type}: {e}")
+                        document = None
+                    if document is None:
+                        skipped_count += 1
+                        continue
+                    content_hash = _content_hash(document)
+                    doc_id = raw.get('id') or raw.get('source_transaction_id') or content_hash[:16]
+                    document.metadata["source_document_id"] = doc_id
+                    current[f"{user_id}:{collection_type}:{doc_id}"] = (document, content_hash)
+
+            indexed = shard.manifest["docs"]
+            to_embed = [vector_id for vector_id, (_, content_hash) in current.items()
+                        if force_reindex or indexed.get(vector_id) != content_hash]
+            to_remove = [vector_id for vector_id in indexed if vector_id not in current]
+            changed = bool(to_embed or to_remove)
+
+            if changed:
+                documents = filter_complex_metadata([current[vector_id][0] for vector_id in to_embed])
+                if not current:
+                    shard.store = None
+                elif shard.store is None:
+                    shard.store = FAISS.from_documents(documents, embedding_service, ids=to_embed)
+                else:
+                    # Changed documents are replaced: delete the old vector, add the new one
+                    shard.writable()
+                    _delete_vectors(shard.store, to_remove + to_embed)
+                    if to_embed:
+                        shard.store.add_documents(documents=documents, ids=to_embed)
+
+            shard.manifest["docs"] = {vector_id: content_hash for vector_id, (_, content_hash) in current.items()}
+            shard.manifest["ledger"] = fingerprint
+            _last_full_sync[user_id] = time.monotonic()
+            if changed:
+                try:
+                    shard.save()
+                except Exception as persist_e:
+                    logger.warning(f"Index shard persist failed for user {user_id}: {persist_e}")
+                shards.resized(shard)
+
+            index_time = (datetime.now() - start_time).total_seconds()
+            print(f"✅ Index synced for user: {user_id} (Embedded: {len(to_embed)}, Removed: {len(to_remove)}, "
+                  f"Unchanged: {len(current) - len(to_embed)}, Skipped: {skipped_count}, Time: {index_time:.2f}s)")
+            return shard
+
+        except Exception as e:
+            logger.error(f"❌ Indexing failed for user {user_id}: {e}")
+            return None
 
 def create_rag_chain_for_user(user_id: str, vector_store, llm):
-    """Create RAG chain with very strict prompting to prevent hallucination."""
+    """
+    Create RAG chain with very strict prompting to prevent hallucination.
+    ``vector_store`` is the user's own shard, so no filtering by user is needed.
+    """
     try:
         retriever = vector_store.as_retriever(
-            search_kwargs={
-                "k": 20,  # Get more documents
-                "filter": {"user_id": user_id}
-            }
+            search_kwargs={"k": min(RETRIEVAL_K, vector_store.index.ntotal)}
         )
 
         # Ultra-strict prompt template to prevent hallucination
@@ -320,20 +392,26 @@ def get_chatbot_response(user_id: str, message: str) -> str:
     start_time = datetime.now()
 
     try:
+        # Totals, counts and top categories are answered exactly from the rollups
+        answer = answer_aggregate_question(user_id, message)
+        if answer is not None:
+            print(f"✅ Answered from rollups for user {user_id} in {(datetime.now() - start_time).total_seconds():.3f}s")
+            return answer
+
         # Initialize AI services
-        embedding_service, llm, vector_store = _initialize_ai_services()
-        
-        # Note: FAISS doesn't support similarity_search with filter in the same way as Chroma for all kwargs
-        # But as_retriever handles it.
-        
-        # Index user transactions (force fresh data)
-        indexing_success = index_user_transactions(user_id, embedding_service, vector_store, force_reindex=True)
-        if not indexing_success:
+        embedding_service, llm, shards = _initialize_ai_services()
+
+        # Embed only what changed since the last message
+        shard = index_user_transactions(user_id, embedding_service, shards)
+        if shard is None:
             logger.warning(f"Indexing failed for user {user_id}")
             # Continue anyway, maybe data is already there
-            
+            shard = shards.get(user_id)
+        if shard.store is None:
+            return "I couldn't find any transactions to answer from yet. Add some expenses or income and ask me again."
+
         # Create RAG chain
-        user_rag_chain = create_rag_chain_for_user(user_id=user_id, vector_store=vector_store, llm=llm)
+        user_rag_chain = create_rag_chain_for_user(user_id=user_id, vector_store=shard.store, llm=llm)
         if not user_rag_chain:
             return "Failed to initialize the financial assistant. Please try again later."
 
@@ -348,9 +426,9 @@ def get_chatbot_response(user_id: str, message: str) -> str:
 
         return response
 
-    except ReadTimeout as e:
+    except LLMTimeout as e:
         error_msg = "I'm experiencing a timeout. Please try again in a moment."
-        logger.error(f"ReadTimeout for user {user_id}: {e}")
+        logger.error(f"Gemini timeout for user {user_id}: {e}")
         return error_msg
 
     except Exception as e:
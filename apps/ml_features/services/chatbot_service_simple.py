@@ -1,12 +1,11 @@
 """
-Ultra-minimal chatbot using Gemini REST API (no SDK dependencies)
+Ultra-minimal chatbot using the Gemini REST API (no SDK dependencies)
 Optimized for free hosting with absolute minimal dependencies.
 """
-import os
 import logging
-import json
+from functools import partial
 from dotenv import load_dotenv
-import requests
+from AI.llm_gateway import LLMBusy, LLMRateLimited, LLMUnavailable, generate_text
 
 # Load environment
 load_dotenv()
@@ -14,35 +13,20 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent"
+LLM_MODEL_NAME = "gemini-1.5-flash"
 
-def call_gemini_api(prompt: str) -> str:
-    """Call Gemini API directly using REST"""
+def call_gemini_api(prompt: str, user_id: str = None) -> str:
+    """Call Gemini through the shared gateway (pooled connection, per-call metrics)"""
     try:
-        headers = {
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "contents": [{
-                "parts": [{
-                    "text": prompt
-                }]
-            }],
-            "generationConfig": {
-                "temperature": 0.7,
-                "maxOutputTokens": 512
-            }
-        }
-        
-        url = f"{GEMINI_API_URL}?key={GEMINI_API_KEY}"
-        response = requests.post(url, headers=headers, json=payload, timeout=30)
-        response.raise_for_status()
-        
-        result = response.json()
-        return result['candidates'][0]['content']['parts'][0]['text']
-        
+        return generate_text(
+            prompt,
+            model=LLM_MODEL_NAME,
+            call_site="chatbot.simple",
+            timeout=30,
+            temperature=0.7,
+            max_output_tokens=512,
+            user_id=user_id,
+        )
     except Exception as e:
         logger.error(f"Gemini API error: {e}")
         raise
@@ -55,10 +39,19 @@ def get_chatbot_response(user_id: str, message: str) -> str:
     try:
         # Import here to avoid circular imports
         from apps.common_utils.firebase_service import get_transactions
-        
+        from apps.common_utils.concurrency import run_concurrently
+        from apps.ml_features.services.chatbot_router import answer_aggregate_question
+
+        # Totals, counts and top categories are answered exactly from the rollups
+        answer = answer_aggregate_question(user_id, message)
+        if answer is not None:
+            return answer
+
         # Get user's recent transactions
-        expenses = get_transactions(user_id, "expenses")
-        incomes = get_transactions(user_id, "incomes")
+        expenses, incomes = run_concurrently(
+            partial(get_transactions, user_id, "expenses"),
+            partial(get_transactions, user_id, "incomes"),
+        )
         
         # Build context from transactions
         context_parts = ["Here is the user's financial data:\n"]
@@ -98,9 +91,12 @@ Instructions:
 Answer:"""
         
         # Call Gemini REST API
-        response_text = call_gemini_api(prompt)
+        response_text = call_gemini_api(prompt, user_id)
         return response_text.strip()
         
+    except (LLMBusy, LLMRateLimited, LLMUnavailable) as e:
+        # Refused without calling Gemini; the message says when to retry
+        return str(e)
     except Exception as e:
         logger.error(f"Error in chatbot: {e}")
         return "Sorry, I encountered an error. Please try again later."
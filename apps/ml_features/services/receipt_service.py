@@ -0,0 +1,119 @@
+"""
+Receipt uploads, end to end and in memory.
+
+The uploaded bytes are decoded, downscaled and recompressed without
+touching disk (AI.categorization.image_preprocessing), and only that
+smaller JPEG is sent to Gemini. Each user's last MAX_CACHED_RECEIPTS
+results are kept in the ``llm`` cache with the image fingerprint, so
+uploading the same screenshot again (re-saved, resized, or with a
+different status bar) returns the earlier result without calling the model.
+
+process_receipt_batch runs the same pipeline over many uploads at once, on a
+small shared thread pool.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from django.conf import settings
+from django.core.cache import caches
+from AI.categorization.image_preprocessing import InvalidImage, is_near_duplicate, prepare_receipt_image
+from AI.categorization.receipt_pipeline import extract_transaction, record_timings
+from AI.categorization.structured_output import finalize_transaction
+from apps.common_utils.llm_cache import CACHE_ALIAS
+from apps.ml_features.services.category_learning import get_category_corrections
+
+logger = logging.getLogger(__name__)
+
+RECEIPT_CACHE_KEY = "receipt-images:{user_id}"
+MAX_CACHED_RECEIPTS = 50
+
+_batch_executor = None
+_batch_executor_lock = threading.Lock()
+
+
+def _elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+def process_receipt(user_id, data):
+    """
+    Turn uploaded image bytes into a transaction dict.
+
+    Returns ``(transaction, info)``; ``transaction`` is None when the image
+    is not a readable transaction, and ``info`` reports the mode used
+    ("cache" for a near-duplicate), per-stage ``timings_ms`` and the
+    original/uploaded byte counts. Raises InvalidImage for bytes that are
+    not an image.
+    """
+    start = time.perf_counter()
+    image = prepare_receipt_image(data)
+    preprocess_ms = _elapsed_ms(start)
+    corrections = get_category_corrections(user_id)
+    sizes = {"original_bytes": image["original_bytes"], "upload_bytes": image["upload_bytes"]}
+
+    cache = caches[CACHE_ALIAS]
+    cache_key = RECEIPT_CACHE_KEY.format(user_id=user_id)
+    entries = cache.get(cache_key) or []
+    for entry in entries:
+        if is_near_duplicate(image, entry):
+            # Corrections made since the first upload still apply
+            transaction = finalize_transaction(dict(entry["transaction"]), entry["transaction"].get("name", ""), corrections)
+            timings = {"preprocess": preprocess_ms, "total": _elapsed_ms(start)}
+            record_timings("cache", timings)
+            logger.info(f"Receipt for {user_id} served from the image cache")
+            return transaction, {"mode": "cache", "timings_ms": timings, "upload_bytes": 0,
+                                 "original_bytes": image["original_bytes"]}
+
+    transaction, info = extract_transaction(image["blob"], user_id, corrections)
+    if transaction is not None and transaction.get("status") != "Failed":
+        entry = {"hash": image["hash"], "grid": image["grid"], "transaction": transaction}
+        cache.set(cache_key, [entry] + entries[:MAX_CACHED_RECEIPTS - 1])
+
+    info["timings_ms"] = {"preprocess": preprocess_ms, **info["timings_ms"], "total": _elapsed_ms(start)}
+    info.update(sizes)
+    return transaction, info
+
+
+def _get_batch_executor():
+    global _batch_executor
+    if _batch_executor is None:
+        with _batch_executor_lock:
+            if _batch_executor is None:
+                _batch_executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, "RECEIPT_BATCH_WORKERS", 4),
+                    thread_name_prefix="receipts",
+                )
+    return _batch_executor
+
+
+def _process_one(user_id, data):
+    try:
+        transaction, info = process_receipt(user_id, data)
+        return transaction, info, None
+    except InvalidImage:
+        return None, None, "The uploaded file is not a supported image."
+    except Exception as e:
+        logger.error(f"Batch receipt processing failed for {user_id}: {e}")
+        return None, None, str(e)
+
+
+def process_receipt_batch(user_id, images):
+    """
+    Process several uploaded images, yielding ``(index, transaction, info,
+    error)`` for each one as soon as it finishes (so not in upload order).
+
+    The images share one bounded pool (``RECEIPT_BATCH_WORKERS`` threads per
+    process), so a large batch, or several at once, never has more than that
+    many Gemini calls in flight. Closing the generator early cancels the
+    images that have not started yet.
+    """
+    executor = _get_batch_executor()
+    futures = {executor.submit(_process_one, user_id, data): index for index, data in enumerate(images)}
+    try:
+        for future in as_completed(futures):
+            transaction, info, error = future.result()
+            yield futures[future], transaction, info, error
+    finally:
+        for future in futures:
+            future.cancel()
@@ -0,0 +1,208 @@
+"""
+One FAISS index per user for the RAG chatbot.
+
+Each user's vectors live in ``CHATBOT_INDEX_DIR/<shard>/`` (``index.faiss``,
+``index.pkl`` and ``manifest.json``), where ``<shard>`` is a hash of the user
+ID. A search therefore only touches the requesting user's vectors, and no
+other user's documents have to be filtered out afterwards.
+
+Shards are loaded on first use and kept in an LRU cache that evicts the
+least recently used shards once their combined size passes
+CHATBOT_INDEX_CACHE_MB. Worker memory then depends on the cache size rather
+than on the number of users. Where the FAISS build can memory-map flat
+indexes (IO_FLAG_MMAP_IFC), index files are mapped rather than read, so
+workers share their pages through the OS page cache. Files are only ever
+replaced, never rewritten in place, so a mapped file stays valid while
+another worker saves the shard.
+"""
+import hashlib
+import json
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+import faiss
+from langchain_community.vectorstores import FAISS
+
+logger = logging.getLogger(__name__)
+
+INDEX_DIR = os.getenv("CHATBOT_INDEX_DIR", "faiss_index_service")
+CACHE_BYTES = int(float(os.getenv("CHATBOT_INDEX_CACHE_MB", "256")) * 1024 * 1024)
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 2
+# Rough per-document overhead of the docstore entry (Document object, metadata dict)
+DOCUMENT_OVERHEAD_BYTES = 600
+
+
+def empty_manifest(embedding=None):
+    """``embedding`` names the model the vectors come from; another model's vectors are not comparable."""
+    return {"version": MANIFEST_VERSION, "embedding": embedding, "docs": {}, "ledger": None}
+
+
+def shard_path(user_id):
+    return os.path.join(INDEX_DIR, hashlib.sha256(user_id.encode("utf-8")).hexdigest()[:32])
+
+
+class Shard:
+    """A user's FAISS store (None until they have documents) and the manifest describing it."""
+
+    def __init__(self, user_id, store, manifest, mmapped=False):
+        self.user_id = user_id
+        self.store = store
+        self.manifest = manifest
+        self.mmapped = mmapped
+        # Held while the shard is synced, so concurrent messages from one user do not interleave
+        self.lock = threading.Lock()
+        self.measure()
+
+    def measure(self):
+        """Estimate the shard's resident size: vectors, document text and per-document overhead."""
+        if self.store is None:
+            self.size_bytes = 0
+            return
+        index = self.store.index
+        contents = sum(len(doc.page_content) for doc in self.store.docstore._dict.values())
+        self.size_bytes = index.ntotal * index.d * 4 + contents + index.ntotal * DOCUMENT_OVERHEAD_BYTES
+
+    def writable(self):
+        """
+        Swap a memory-mapped index for an in-memory copy before it is
+        modified. The copy is cloned from the mapped index, not re-read from
+        disk, where another worker may already have saved a newer version.
+        """
+        if self.mmapped:
+            self.store.index = faiss.clone_index(self.store.index)
+            self.mmapped = False
+
+    def save(self):
+        """
+        Persist the index (if any), then the manifest that describes it. The
+        index is written to a temporary directory and moved into place, since
+        other workers may have the current files mapped.
+        """
+        path = shard_path(self.user_id)
+        os.makedirs(path, exist_ok=True)
+        if self.store is not None:
+            staging = tempfile.mkdtemp(prefix=".save-", dir=path)
+            try:
+                self.store.save_local(staging)
+                for name in ("index.faiss", "index.pkl"):
+                    os.replace(os.path.join(staging, name), os.path.join(path, name))
+            finally:
+                shutil.rmtree(staging, ignore_errors=True)
+        manifest_path = os.path.join(path, MANIFEST_FILE)
+        with open(f"{manifest_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f)
+        os.replace(f"{manifest_path}.tmp", manifest_path)
+
+
+def _read_index(path):
+    """
+    Memory-map the index file when this FAISS build can map flat index codes
+    (IO_FLAG_MMAP_IFC). IO_FLAG_MMAP alone only maps IVF inverted lists, not
+    the IndexFlatL2 that LangChain builds, so it is not used.
+    """
+    flag = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+    if flag is not None:
+        try:
+            return faiss.read_index(path, flag), True
+        except RuntimeError:
+            pass
+    return faiss.read_index(path), False
+
+
+def load_shard(user_id, embeddings):
+    """
+    Read a user's shard from disk. A missing or outdated one, or one built
+    with a different embedding model (``embeddings.name``), comes back empty.
+    """
+    path = shard_path(user_id)
+    try:
+        with open(os.path.join(path, MANIFEST_FILE), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = None
+    if (not manifest or manifest.get("version") != MANIFEST_VERSION
+            or manifest.get("embedding") != embeddings.name):
+        return Shard(user_id, None, empty_manifest(embeddings.name))
+    if not manifest["docs"]:
+        return Shard(user_id, None, manifest)
+
+    try:
+        index, mmapped = _read_index(os.path.join(path, "index.faiss"))
+        with open(os.path.join(path, "index.pkl"), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+    except Exception as e:
+        logger.warning(f"Could not load the index shard for {user_id}; it will be rebuilt: {e}")
+        return Shard(user_id, None, empty_manifest(embeddings.name))
+    store = FAISS(embeddings, index, docstore, index_to_docstore_id)
+    return Shard(user_id, store, manifest, mmapped=mmapped)
+
+
+class ShardCache:
+    """LRU of loaded shards, bounded by their estimated total size in bytes."""
+
+    def __init__(self, embeddings, max_bytes=CACHE_BYTES):
+        self.embeddings = embeddings
+        self.max_bytes = max_bytes
+        self._shards = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = {}
+
+    def get(self, user_id):
+        with self._lock:
+            shard = self._shards.get(user_id)
+            if shard is not None:
+                self._shards.move_to_end(user_id)
+                return shard
+            load_lock = self._loading.setdefault(user_id, threading.Lock())
+
+        # Load outside the cache lock so other users are not held up by disk reads
+        with load_lock:
+            with self._lock:
+                shard = self._shards.get(user_id)
+            if shard is None:
+                shard = load_shard(user_id, self.embeddings)
+                with self._lock:
+                    self._shards[user_id] = shard
+                    self._loading.pop(user_id, None)
+                    self.evict()
+        return shard
+
+    def evict(self):
+        """
+        Drop least recently used shards until the cache fits. Call with the
+        cache lock held. The most recently used shard, and shards being
+        synced, always stay.
+        """
+        total = sum(shard.size_bytes for shard in self._shards.values())
+        for user_id in list(self._shards)[:-1]:
+            if total <= self.max_bytes:
+                break
+            shard = self._shards[user_id]
+            if shard.lock.locked():
+                continue
+            del self._shards[user_id]
+            total -= shard.size_bytes
+            logger.info(f"Evicted the index shard for {user_id} ({shard.size_bytes} bytes)")
+
+    def resized(self, shard):
+        """Re-measure a shard after it changed, evicting others if the cache outgrew its cap."""
+        shard.measure()
+        with self._lock:
+            self.evict()
+
+    def forget(self, user_id):
+        with self._lock:
+            self._shards.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "shards": len(self._shards),
+                "bytes": sum(shard.size_bytes for shard in self._shards.values()),
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1,244 @@
+import io
+import json
+import tempfile
+import threading
+from datetime import datetime
+from pathlib import Path
+from unittest import mock
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from PIL import Image, ImageDraw
+from AI.categorization.benchmark_upi_parser import check_corpus, load_corpus
+from AI.categorization.image_preprocessing import MAX_SIDE, is_near_duplicate, prepare_receipt_image
+from AI.categorization.structured_output import process_transaction_text
+from AI import embedding_cache, llm_gateway
+from AI.local_embeddings import HashingEmbedder
+from apps.ml_features.services.chatbot_router import answer_from_rollups
+from apps.ml_features import views
+from AI.llm_limits import CircuitBreaker, LLMBusy, LLMRateLimited, LLMUnavailable, UserRateLimiter
+
+
+class UpiParserTests(SimpleTestCase):
+    def test_sample_corpus_parses_as_expected(self):
+        self.assertEqual(check_corpus(load_corpus()), [])
+
+    def test_complete_upi_receipt_skips_the_llm(self):
+        sample = load_corpus()[0]
+        with mock.patch("AI.categorization.structured_output.generate_text") as generate:
+            transaction = process_transaction_text(sample["text"], "user-1")
+        generate.assert_not_called()
+        self.assertEqual(transaction["amount"], sample["expected"]["amount"])
+        self.assertEqual(transaction["date"], sample["expected"]["date"])
+        self.assertEqual(transaction["name"], "Swiggy")
+        self.assertEqual(transaction["category"], "Dining Out & Entertainment")
+
+
+class ReceiptImageTests(SimpleTestCase):
+    SCREENSHOT = Path(settings.BASE_DIR) / "AI" / "Screenshot_2025-07-20-22-37-04-756_net.one97.paytm.jpg"
+
+    def _bytes(self, image, fmt="JPEG"):
+        out = io.BytesIO()
+        image.save(out, fmt, quality=90)
+        return out.getvalue()
+
+    def test_upload_is_downscaled_and_recompressed(self):
+        screenshot = Image.open(self.SCREENSHOT).convert("RGB")
+        prepared = prepare_receipt_image(self._bytes(screenshot, "PNG"))
+        self.assertLessEqual(max(prepared["size"]), MAX_SIDE)
+        self.assertLess(prepared["upload_bytes"], prepared["original_bytes"] / 2)
+
+    def test_resized_copy_is_a_duplicate_but_a_changed_amount_is_not(self):
+        screenshot = Image.open(self.SCREENSHOT).convert("RGB")
+        original = prepare_receipt_image(self._bytes(screenshot))
+        resized = prepare_receipt_image(self._bytes(screenshot.resize((900, 2000)), "PNG"))
+        edited = screenshot.copy()
+        # Paint over part of the amount, as a different payment from the same app would look
+        ImageDraw.Draw(edited).rectangle([150, 440, 310, 540], fill="white")
+        self.assertTrue(is_near_duplicate(resized, original))
+        self.assertFalse(is_near_duplicate(prepare_receipt_image(self._bytes(edited)), original))
+
+
+class LlmGatewayTests(SimpleTestCase):
+    def _response(self, status, body):
+        response = mock.Mock(status_code=status, text=str(body))
+        response.json.return_value = body
+        return response
+
+    def test_text_and_usage_are_read_from_the_response(self):
+        body = {"candidates": [{"content": {"parts": [{"text": "Hello"}, {"text": " there"}]}}],
+                "usageMetadata": {"promptTokenCount": 12, "candidatesTokenCount": 3}}
+        with mock.patch.dict("os.environ", {"GEMINI_API_KEY": "key"}), \
+                mock.patch.object(llm_gateway.get_session(), "post", return_value=self._response(200, body)) as post:
+            text = llm_gateway.generate_text("Hi", model="gemini-test", call_site="tests.ok", timeout=5)
+        self.assertEqual(text, "Hello there")
+        self.assertTrue(post.call_args.args[0].endswith("/models/gemini-test:generateContent"))
+        self.assertEqual(post.call_args.kwargs["timeout"], 5)
+        stats = llm_gateway.get_llm_stats()["tests.ok"]
+        self.assertEqual((stats["calls"], stats["errors"], stats["tokens_in"], stats["tokens_out"]), (1, 0, 12, 3))
+
+    def test_http_errors_raise_and_are_counted(self):
+        body = {"error": {"message": "Resource exhausted"}}
+        with mock.patch.dict("os.environ", {"GEMINI_API_KEY": "key"}), \
+                mock.patch.object(llm_gateway.get_session(), "post", return_value=self._response(429, body)):
+            with self.assertRaises(llm_gateway.LLMError) as raised:
+                llm_gateway.generate_text("Hi", model="gemini-test", call_site="tests.error")
+        self.assertEqual(raised.exception.status, 429)
+        self.assertEqual(llm_gateway.get_llm_stats()["tests.error"]["errors"], 1)
+
+    def test_breaker_opens_after_outages_and_fails_fast(self):
+        body = {"error": {"message": "Backend error"}}
+        breaker = CircuitBreaker(failure_threshold=2, cooldown=60)
+        with mock.patch.dict("os.environ", {"GEMINI_API_KEY": "key"}), \
+                mock.patch.object(llm_gateway, "breaker", breaker), \
+                mock.patch.object(llm_gateway.get_session(), "post", return_value=self._response(503, body)) as post:
+            for _ in range(2):
+                with self.assertRaises(llm_gateway.LLMError):
+                    llm_gateway.generate_text("Hi", model="gemini-test", call_site="tests.outage")
+            with self.assertRaises(LLMUnavailable):
+                llm_gateway.generate_text("Hi", model="gemini-test", call_site="tests.outage")
+        self.assertEqual(post.call_count, 2)
+        self.assertEqual(llm_gateway.get_llm_stats()["tests.outage"]["refused"]["breaker_open"], 1)
+
+    def test_breaker_ignores_client_errors(self):
+        breaker = CircuitBreaker(failure_threshold=1, cooldown=60)
+        breaker.record_failure(llm_gateway.LLMError("Bad request", status=400))
+        breaker.before_call()
+        breaker.record_failure(llm_gateway.LLMTimeout("slow"))
+        with self.assertRaises(LLMUnavailable):
+            breaker.before_call()
+
+    def test_user_token_bucket(self):
+        limiter = UserRateLimiter(rate_per_minute=1, burst=2)
+        limiter.take("user-1")
+        limiter.take("user-1")
+        with self.assertRaises(LLMRateLimited) as raised:
+            limiter.take("user-1")
+        self.assertGreater(raised.exception.retry_after, 0)
+        limiter.take("user-2")
+
+    def test_calls_refused_for_lack_of_a_slot_keep_the_users_token(self):
+        rate_limiter = UserRateLimiter(rate_per_minute=1, burst=1)
+        busy = mock.Mock(slot=mock.Mock(side_effect=LLMBusy("All slots are busy")))
+        with mock.patch.dict("os.environ", {"GEMINI_API_KEY": "key"}), \
+                mock.patch.object(llm_gateway, "rate_limiter", rate_limiter), \
+                mock.patch.object(llm_gateway, "limiter", busy):
+            for _ in range(2):
+                with self.assertRaises(LLMBusy):
+                    llm_gateway.generate_text("Hi", model="gemini-test", call_site="tests.busy", user_id="user-1")
+        rate_limiter.take("user-1")
+
+
+class EmbeddingCacheTests(SimpleTestCase):
+    def test_only_new_texts_are_embedded(self):
+        fake_embed = mock.Mock(side_effect=lambda texts, **kwargs: [[float(len(text)), 0.5] for text in texts])
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.object(embedding_cache, "CACHE_PATH", f"{directory}/embeddings.sqlite3"), \
+                mock.patch.object(embedding_cache, "_local", threading.local()), \
+                mock.patch.object(embedding_cache, "embed_texts", fake_embed):
+            first = embedding_cache.cached_embed_texts(["Coffee", "Rent", "Coffee"], model="m", call_site="tests.embed")
+            second = embedding_cache.cached_embed_texts(["Rent", "Groceries"], model="m", call_site="tests.embed")
+            other_model = embedding_cache.cached_embed_texts(["Rent"], model="m2", call_site="tests.embed")
+            embedding_cache._local.conn.close()
+        self.assertEqual(first, [[6.0, 0.5], [4.0, 0.5], [6.0, 0.5]])
+        self.assertEqual(second, [[4.0, 0.5], [9.0, 0.5]])
+        self.assertEqual(other_model, [[4.0, 0.5]])
+        self.assertEqual([call.args[0] for call in fake_embed.call_args_list], [["Coffee", "Rent"], ["Groceries"], ["Rent"]])
+
+    def test_unusable_cache_path_falls_back_to_the_api(self):
+        fake_embed = mock.Mock(side_effect=lambda texts, **kwargs: [[1.0] for _ in texts])
+        with tempfile.NamedTemporaryFile() as not_a_directory, \
+                mock.patch.object(embedding_cache, "CACHE_PATH", f"{not_a_directory.name}/embeddings.sqlite3"), \
+                mock.patch.object(embedding_cache, "_local", threading.local()), \
+                mock.patch.object(embedding_cache, "embed_texts", fake_embed):
+            self.assertEqual(embedding_cache.cached_embed_texts(["Rent"], model="m", call_site="tests.embed"), [[1.0]])
+            self.assertIsNone(embedding_cache.get_embedding_cache_stats()["entries"])
+
+
+class LocalEmbeddingTests(SimpleTestCase):
+    def test_questions_land_nearest_their_transactions(self):
+        embedder = HashingEmbedder()
+        documents = embedder.embed([
+            "Expense: BigBasket Amount: ₹820.0 Category: Groceries Date: 2025-03-14 Status: Completed Type: expense",
+            "Expense: Uber Amount: ₹240.0 Category: Transportation Date: 2025-07-02 Status: Completed Type: expense",
+            "Income Source: Salary Amount: ₹50000.0 Date: 2025-07-01 Status: Received Type: income",
+        ])
+        self.assertEqual(documents.shape, (3, embedder.dim))
+        self.assertTrue(all(abs(norm - 1) < 1e-5 for norm in (documents ** 2).sum(axis=1)))
+        for question, expected in (("How much did I spend on grocery?", 0), ("my uber rides", 1),
+                                   ("What salary income did I get?", 2), ("What did I spend in March?", 0)):
+            scores = documents @ embedder.embed([question])[0]
+            self.assertEqual(int(scores.argmax()), expected, question)
+        self.assertEqual(embedder.embed(["Uber"]).tolist(), HashingEmbedder().embed(["Uber"]).tolist())
+
+
+class ChatbotRouterTests(SimpleTestCase):
+    ROLLUPS = {
+        "2025-07": {"expense_total": 2000.5, "expense_count": 3, "income_total": 50000.0, "income_count": 1,
+                    "categories": {"Groceries": {"total": 1200.5, "count": 2}, "Transportation": {"total": 800.0, "count": 1}},
+                    "sources": {"Salary": {"total": 50000.0, "count": 1}}},
+        "2025-08": {"expense_total": 500.0, "expense_count": 1, "income_total": 1000.0, "income_count": 1,
+                    "categories": {"Groceries": {"total": 500.0, "count": 1}},
+                    "sources": {"Pocket Money": {"total": 1000.0, "count": 1}}},
+    }
+    TODAY = datetime(2025, 8, 20)
+
+    def ask(self, question):
+        return answer_from_rollups(question, self.ROLLUPS, self.TODAY)
+
+    def test_aggregate_questions_are_answered_exactly(self):
+        self.assertEqual(self.ask("How much income do I have this month?"), "You have ₹1,000 income this month.")
+        self.assertEqual(self.ask("How much pocket money did I receive?"), "You have ₹1,000 income from Pocket Money.")
+        self.assertEqual(self.ask("total spent on groceries"), "You spent ₹1,700.50 on Groceries.")
+        self.assertEqual(self.ask("How much did I spend on grocery last month?"), "You spent ₹1,200.50 on Groceries last month.")
+        self.assertEqual(self.ask("How many transactions in the last 2 months?"), "You have 4 expenses and 2 income records in the last 2 months.")
+        self.assertEqual(self.ask("top categories"), "Your top spending categories: Groceries ₹1,700.50, Transportation ₹800.")
+        self.assertTrue(self.ask("How much did I save in July?").startswith("You saved ₹47,999.50"))
+
+    def test_other_questions_fall_through(self):
+        for question in ("What was my last expense?", "What's my biggest expense?", "How can I save more?",
+                         "How much did I spend at Swiggy?", "How much did I spend today?", "How much may I spend?"):
+            self.assertIsNone(self.ask(question), question)
+
+
+class BatchReceiptUploadTests(SimpleTestCase):
+    def post(self, count):
+        files = [SimpleUploadedFile(f"receipt{i}.jpg", b"image", content_type="image/jpeg") for i in range(count)]
+        request = RequestFactory().post("/ml_features/categorize_expenses_batch/", {"images": files})
+        request.session = {"user_id": "user-1"}
+        return views.categorize_expenses_batch_view(request)
+
+    @staticmethod
+    def transaction(name, category):
+        return {"name": name, "category": category, "amount": 120.0, "date": "2025-08-01", "status": "Completed"}
+
+    def test_results_stream_then_one_bulk_write_and_summary(self):
+        completed = [
+            (2, self.transaction("Uber", "Transportation"), {"mode": "single"}, None),
+            (1, None, None, "Not a transaction."),
+            (0, self.transaction("DMart", "Groceries"), {"mode": "single"}, None),
+        ]
+        bulk = mock.Mock(return_value={"added": 1, "failures": [{"index": 1, "error": "write failed"}]})
+        with mock.patch.object(views, "process_receipt_batch", return_value=iter(completed)), \
+                mock.patch.object(views, "bulk_add_transactions", bulk), \
+                mock.patch.object(views, "record_category_choices") as record:
+            response = self.post(3)
+            lines = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertEqual([(line["type"], line.get("index"), line.get("status")) for line in lines], [
+            ("result", 2, "ok"), ("result", 1, "error"), ("result", 0, "ok"), ("summary", None, None),
+        ])
+        bulk.assert_called_once()
+        self.assertEqual([expense["name"] for expense in bulk.call_args.args[1]], ["DMart", "Uber"])
+        # The second saved expense (upload index 2) failed to write
+        self.assertEqual(lines[-1], {"type": "summary", "total": 3, "saved": 1, "failed": 1,
+                                     "save_failures": [{"index": 2, "error": "write failed"}]})
+        record.assert_called_once_with("user-1", [("DMart", "Groceries")])
+
+    @override_settings(RECEIPT_BATCH_MAX_IMAGES=2)
+    def test_uploads_over_the_cap_are_rejected(self):
+        with mock.patch.object(views, "process_receipt_batch") as process:
+            response = self.post(3)
+        self.assertEqual(response.status_code, 400)
+        process.assert_not_called()
@@ -5,5 +5,6 @@ app_name = 'ml_features'
 
 urlpatterns = [
     path('categorize_expense/', views.categorize_expense_view, name='categorize_expense'),
+    path('categorize_expenses_batch/', views.categorize_expenses_batch_view, name='categorize_expenses_batch'),
     path('chatbot_response/', views.chatbot_response_view, name='chatbot_response'),
 ]
\ No newline at end of file
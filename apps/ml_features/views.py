@@ -1,15 +1,19 @@
 from django.shortcuts import render
-from django.http import JsonResponse
-from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
-import os
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from dateutil import parser
 import json
 from apps.ml_features.services.chatbot_service_simple import get_chatbot_response
 
 # Import AI functions
-from AI.categorization.run_ocr import get_ocr_text
-from AI.categorization.structured_output import process_transaction_text
-from apps.common_utils.firebase_service import add_transaction
+from AI.categorization.image_preprocessing import InvalidImage
+from apps.common_utils.firebase_service import add_transaction, bulk_add_transactions
+from apps.ml_features.services.category_learning import record_category_choices
+from apps.ml_features.services.receipt_service import process_receipt, process_receipt_batch
+from apps.transactions.schemas import ExpenseSchema
+
+EXPENSE_COLLECTION = 'expenses'
 
 @csrf_exempt
 def categorize_expense_view(request):
@@ -26,36 +30,111 @@ def categorize_expense_view(request):
 
         user_id = request.session.get('user_id') # Get user ID from session
 
-        # Create a temporary directory if it doesn't exist
-        temp_dir = os.path.join(settings.MEDIA_ROOT, 'temp')
-        os.makedirs(temp_dir, exist_ok=True)
-
-        temp_image_path = os.path.join(temp_dir, uploaded_image.name)
-        with open(temp_image_path, 'wb+') as destination:
-            for chunk in uploaded_image.chunks():
-                destination.write(chunk)
-
         try:
-            ocr_text = get_ocr_text(temp_image_path)
-            
-            # If OCR text is empty, return a standard error
-            if not ocr_text.strip():
-                return JsonResponse({'error': 'Could not extract text from the image. Please upload a clear image of a transaction.'}, status=400)
+            # The image is processed in memory; nothing is written to disk
+            transaction_data, extraction = process_receipt(user_id, uploaded_image.read())
 
-            transaction_data = process_transaction_text(ocr_text, user_id)
+            # If nothing could be read, return a standard error
+            if transaction_data is None:
+                return JsonResponse({'error': 'Could not extract text from the image. Please upload a clear image of a transaction.'}, status=400)
 
             # The transaction is added by the frontend after this view returns.
             # add_transaction(user_id, transaction_data, 'transactions')
 
-            return JsonResponse({'message': 'Image processed successfully', 'transaction': transaction_data})
+            return JsonResponse({'message': 'Image processed successfully', 'transaction': transaction_data, 'extraction': extraction})
+        except InvalidImage:
+            return JsonResponse({'error': 'The uploaded file is not a supported image.'}, status=400)
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
-        finally:
-            # Clean up the temporary image
-            if os.path.exists(temp_image_path):
-                os.remove(temp_image_path)
     return JsonResponse({'error': 'Invalid request'}, status=400)
 
+def _accepted_expense(transaction):
+    """The expense document to save for an extracted transaction, or None if it should not be saved."""
+    if not transaction or transaction.get('status') == 'Failed':
+        return None
+    try:
+        amount = float(transaction.get('amount', 0))
+        date = parser.parse(transaction['date'])
+    except (KeyError, ValueError, TypeError, OverflowError):
+        return None
+    if amount <= 0:
+        return None
+    return ExpenseSchema(
+        name=transaction.get('name') or 'Receipt',
+        category=transaction.get('category') or 'Other',
+        amount=amount,
+        date=date,
+        status=transaction.get('status') or 'Pending',
+    ).to_dict()
+
+
+def _ndjson(event):
+    return json.dumps(event, default=str) + "\n"
+
+
+@csrf_exempt
+def categorize_expenses_batch_view(request):
+    """
+    Extract and save a batch of receipt images (the ``images`` field, up to
+    RECEIPT_BATCH_MAX_IMAGES files).
+
+    The response is streamed as NDJSON: one ``{"type": "result", ...}`` line
+    per image as soon as it is processed, in completion order and tagged with
+    its upload ``index``, then one ``{"type": "summary", ...}`` line once
+    every accepted transaction has been saved in a single batched write.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request method'}, status=405)
+
+    user_id = request.session.get('user_id')
+    if not user_id:
+        return JsonResponse({'error': 'User not authenticated'}, status=401)
+
+    uploads = request.FILES.getlist('images')
+    if not uploads:
+        return JsonResponse({'error': 'No images uploaded.'}, status=400)
+    max_images = getattr(settings, 'RECEIPT_BATCH_MAX_IMAGES', 30)
+    if len(uploads) > max_images:
+        return JsonResponse({'error': f'Please upload at most {max_images} images at a time.'}, status=400)
+
+    names = [upload.name for upload in uploads]
+    images = [upload.read() for upload in uploads]
+
+    def stream():
+        accepted = []
+        failed = 0
+        for index, transaction, extraction, error in process_receipt_batch(user_id, images):
+            event = {'type': 'result', 'index': index, 'filename': names[index]}
+            expense = None if error else _accepted_expense(transaction)
+            if expense is not None:
+                accepted.append((index, expense))
+                event.update(status='ok', transaction=transaction, extraction=extraction)
+            else:
+                failed += 1
+                event.update(status='error', error=error or 'Could not extract a transaction from this image.')
+            yield _ndjson(event)
+
+        # One batched write for the whole upload, in upload order
+        accepted.sort(key=lambda item: item[0])
+        result = bulk_add_transactions(user_id, [expense for _, expense in accepted], EXPENSE_COLLECTION)
+        # Teach the local categorizer from every expense that was saved, as single uploads do
+        unsaved = {f['index'] for f in result['failures']}
+        record_category_choices(user_id, [(expense['name'], expense['category'])
+                                          for position, (_, expense) in enumerate(accepted) if position not in unsaved])
+        yield _ndjson({
+            'type': 'summary',
+            'total': len(images),
+            'saved': result['added'],
+            'failed': failed,
+            'save_failures': [{'index': accepted[f['index']][0], 'error': f['error']} for f in result['failures']],
+        })
+
+    response = StreamingHttpResponse(stream(), content_type='application/x-ndjson')
+    # Let each line reach the browser as soon as it is written
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @csrf_exempt
 def chatbot_response_view(request):
     if request.method == 'POST':
@@ -1,36 +1,17 @@
 from django.http import JsonResponse
 from apps.common_utils.firebase_service import get_transactions
+from apps.common_utils.rollup_service import get_monthly_rollups, sum_groups
+from apps.common_utils.concurrency import run_concurrently
 from apps.common_utils.auth_utils import get_user_id
 from apps.budgets.services import get_budgets
 from datetime import datetime
-from dateutil import parser
+from functools import partial
 
 # Define collection names
 EXPENSE_COLLECTION = 'expenses'
 INCOME_COLLECTION = 'incomes'
 BUDGET_COLLECTION = 'budgets'
 
-def _parse_date(date_input):
-    """Safely parse a date which can be a datetime object or a string, and make it naive."""
-    if isinstance(date_input, datetime):
-        # If the datetime object is timezone-aware, convert it to naive
-        if date_input.tzinfo is not None:
-            return date_input.replace(tzinfo=None)
-        return date_input
-    if isinstance(date_input, str):
-        try:
-            # dateutil.parser.parse might return an aware datetime
-            dt = parser.parse(date_input)
-            # If it's aware, make it naive
-            if dt.tzinfo is not None:
-                return dt.replace(tzinfo=None)
-            return dt
-        except (ValueError, TypeError):
-            # Return a default old date if parsing fails
-            return datetime.min
-    # Return a default old date for other types or None
-    return datetime.min
-
 def get_dashboard_data(request):
     user_id = get_user_id(request)
     try:
@@ -40,36 +21,26 @@ def get_dashboard_data(request):
         print("[DEBUG] Current Month:", current_month)  # Debugging line
         current_year = now.year
 
-        # Fetch all expenses, incomes, and budgets for the user
-        all_expenses = get_transactions(user_id, EXPENSE_COLLECTION)
-        all_incomes = get_transactions(user_id, INCOME_COLLECTION)
-        # print("[DEBUG] Fetched Expenses:", all_expenses)  # Debugging line
-
-
-        expenses = [t for t in all_expenses if _parse_date(t.get('date')).month >= current_month-7 and _parse_date(t.get('date')).year == current_year]
-        incomes = [t for t in all_incomes if _parse_date(t.get('date')).year == current_year]
-
-
-        total_expenses = sum(float(transaction.get('amount', 0)) for transaction in expenses)
-        total_income = sum(float(transaction.get('amount', 0)) for transaction in incomes)
-
-        
-        # Process expenses for category chart (only for current month expenses)
-        expense_categories = {}
-        for transaction in expenses:
-            amount = float(transaction.get('amount', 0))
-            category = transaction.get('category', 'Uncategorized')
-            expense_categories[category] = expense_categories.get(category, 0) + amount
-
-        # Combine transactions for 'Recent Transactions' list (only for current month transactions)
-        all_transactions = []
-        for t in expenses:
+        # Dashboard window: expenses from the last 7 months of this year and
+        # incomes from this year.
+        year_start = datetime(current_year, 1, 1)
+        next_year_start = datetime(current_year + 1, 1, 1)
+        expenses_start = datetime(current_year, max(1, current_month - 7), 1)
+
+        # Totals come from the monthly rollups (one document per month); the
+        # 'Recent Transactions' list is the 5 latest expenses in the window.
+        rollups, recent_transactions = run_concurrently(
+            partial(get_monthly_rollups, user_id, since=year_start, until=next_year_start),
+            partial(get_transactions, user_id, EXPENSE_COLLECTION, since=expenses_start, until=next_year_start,
+                    order_by='date', descending=True, limit=5),
+        )
+        expense_months = {month: r for month, r in rollups.items() if month >= expenses_start.strftime("%Y-%m")}
+
+        total_expenses = sum(r.get('expense_total', 0) for r in expense_months.values())
+        total_income = sum(r.get('income_total', 0) for r in rollups.values())
+
+        for t in recent_transactions:
             t['type'] = 'expense'
-            all_transactions.append(t)
-            
-        # Sort all transactions by parsed date
-        all_transactions.sort(key=lambda x: _parse_date(x.get('date')), reverse=True)
-        recent_transactions = all_transactions[:5]
 
 
         
@@ -95,8 +66,8 @@ def get_dashboard_data(request):
 
 def generate_visualizations_data(user_id):
     # Corrected collection name and fetching both incomes and expenses for a complete picture
-    expenses = get_transactions(user_id, EXPENSE_COLLECTION, 100)
-    incomes = get_transactions(user_id, INCOME_COLLECTION, 100)
+    expenses = get_transactions(user_id, EXPENSE_COLLECTION, limit=100, order_by='date', descending=True)
+    incomes = get_transactions(user_id, INCOME_COLLECTION, limit=100, order_by='date', descending=True)
     
     # Note: preprocess_data and subsequent ML functions might need adjustments
     # to handle the combined or separate datasets. This is a starting point.
@@ -117,15 +88,8 @@ def get_income_data(request):
         return JsonResponse({"error": "User not authenticated"}, status=401)
 
     try:
-        # Fetch all income transactions for the user
-        incomes = get_transactions(user_id, INCOME_COLLECTION)
-        
-        # Process data for chart
-        income_sources = {}
-        for income in incomes:
-            source = income.get('source', 'Uncategorized')
-            amount = float(income.get('amount', 0))
-            income_sources[source] = income_sources.get(source, 0) + amount
+        # Income per source across all months, from the monthly rollups
+        income_sources = sum_groups(get_monthly_rollups(user_id), 'sources')
 
         chart_data = {
             'labels': list(income_sources.keys()),
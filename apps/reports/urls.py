@@ -6,4 +6,5 @@ app_name = 'reports'
 urlpatterns =[
     path('dashboard/', views.dashboard_view, name='dashboard'),
     path('visualize/', views.visualize, name='visualize'),
+    path('income-data/', views.income_data, name='income_data'),
 ]
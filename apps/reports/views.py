@@ -4,7 +4,7 @@ from django.http import JsonResponse
 from apps.common_utils.firebase_config import FIREBASE_API_KEY
 from apps.common_utils.auth_utils import get_user_id, get_email, get_user_full_name
 from apps.common_utils.firebase_service import get_user_profile
-from apps.reports.services import get_dashboard_data, generate_visualizations_data
+from apps.reports.services import get_dashboard_data, generate_visualizations_data, get_income_data
 
 def dashboard_view(request):
     dashboard_data = get_dashboard_data(request)
@@ -27,4 +27,7 @@ def visualize(request):
     data = {'email':email,'visualizations':visualizations}
 
     # Render the visualize.html template with visualizations
-    return render(request, "reports/visualize.html",data)
\ No newline at end of file
+    return render(request, "reports/visualize.html",data)
+
+def income_data(request):
+    return get_income_data(request)
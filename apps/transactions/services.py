@@ -1,11 +1,15 @@
 from django.http import JsonResponse
 from apps.common_utils.firebase_service import (
     add_transaction,
-    get_transactions,
+    get_transactions_page,
     delete_transaction,
     add_category as add_category_to_firebase
 )
+from apps.common_utils.concurrency import run_concurrently
 from apps.transactions.schemas import IncomeSchema, ExpenseSchema
+from apps.ml_features.services.category_learning import record_category_choice
+import base64
+from functools import partial
 import json
 from datetime import datetime
 from dateutil import parser
@@ -18,6 +22,8 @@ INCOME_COLLECTION = 'incomes'
 EXPENSE_COLLECTION = 'expenses'
 MAX_ITEMS_PER_REQUEST = 100
 DEFAULT_ITEMS_PER_REQUEST = 10
+SORT_FIELDS = ('date', 'amount')
+CURSOR_EXHAUSTED = 'done'
 
 logger = logging.getLogger(__name__)
 
@@ -67,6 +73,8 @@ def submit_transaction_util(request):
                     status=transaction_data.get('status', 'pending')
                 )
                 add_transaction(user_id, expense.to_dict(), EXPENSE_COLLECTION)
+                # Teach the local categorizer which category this merchant belongs to
+                record_category_choice(user_id, expense.name, expense.category)
             else:
                 return JsonResponse({"error": "Invalid transaction type"}, status=400)
 
@@ -107,8 +115,65 @@ def delete_transaction_util(request):
         logger.error(f"Transaction deletion failed: {str(e)}")
         return JsonResponse({"error": str(e)}, status=500)
 
+def _cursor_value(value):
+    """Make a Firestore order value JSON-safe for the cursor."""
+    if isinstance(value, datetime):
+        return {"ts": value.isoformat()}
+    return value
+
+def _restore_cursor_value(value):
+    if isinstance(value, dict) and "ts" in value:
+        return parser.isoparse(value["ts"])
+    return value
+
+def _encode_cursor(state):
+    return base64.urlsafe_b64encode(json.dumps(state).encode()).decode()
+
+def _decode_cursor(cursor):
+    return json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+
+def _valid_cursor_position(position):
+    """``[value, id]``: a string id and a scalar value or an encoded ``{"ts": ...}`` timestamp."""
+    if not isinstance(position, list) or len(position) != 2 or not isinstance(position[1], str):
+        return False
+    value = position[0]
+    if isinstance(value, dict):
+        if set(value) != {"ts"} or not isinstance(value["ts"], str):
+            return False
+        try:
+            parser.isoparse(value["ts"])
+        except (ValueError, OverflowError):
+            return False
+        return True
+    return value is None or isinstance(value, (str, int, float, bool))
+
+def _valid_cursor_state(state):
+    """A decoded cursor is an object whose positions are None, exhausted or a valid ``[value, id]``."""
+    if not isinstance(state, dict) or not isinstance(state.get("positions"), dict):
+        return False
+    return all(position is None or position == CURSOR_EXHAUSTED or _valid_cursor_position(position)
+               for position in state["positions"].values())
+
+def _order_key(value):
+    """Mirror Firestore's cross-type ordering (numbers < timestamps < strings)."""
+    if isinstance(value, bool) or value is None:
+        return (0, 0)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = make_naive(value, pytz.UTC)
+        return (2, value)
+    return (3, str(value))
+
 def get_transactions_history_util(request):
-    """Retrieve, filter, and sort transactions with pagination."""
+    """
+    Return one page of the user's incomes and expenses, merged and sorted.
+
+    Each collection is read with keyset pagination, so a page costs at most
+    ``itemCount`` reads per collection. The opaque ``next_cursor`` records
+    where each collection stopped; it is ``None`` once both are exhausted.
+    """
     try:
         user_id = request.session.get("user_id")
         if not user_id:
@@ -118,44 +183,72 @@ def get_transactions_history_util(request):
             int(request.GET.get("itemCount", DEFAULT_ITEMS_PER_REQUEST)),
             MAX_ITEMS_PER_REQUEST
         )
-        page = int(request.GET.get("page", 1))
         sort_by = request.GET.get("sortBy", "date")
         sort_order = request.GET.get("sortOrder", "desc")
         category_filter = request.GET.get("category")
+        cursor = request.GET.get("cursor")
 
-        incomes = get_transactions(user_id, INCOME_COLLECTION) or []
-        expenses = get_transactions(user_id, EXPENSE_COLLECTION) or []
-
-        if category_filter and category_filter != "all":
-            expenses = [t for t in expenses if t.get("category") == category_filter]
-            incomes = [] # Do not show income when filtering by expense category
-
-        for transaction in incomes + expenses:
-            transaction['type'] = 'Income' if 'source' in transaction else 'Expense'
-            date_value = transaction.get('date')
-            
-            if isinstance(date_value, datetime):
-                if date_value.tzinfo is not None:
-                    transaction['date_for_sort'] = make_naive(date_value, pytz.UTC)
-                else:
-                    transaction['date_for_sort'] = date_value
-            else:
-                transaction['date_for_sort'] = datetime.min
+        if sort_by not in SORT_FIELDS:
+            return JsonResponse({"error": "Invalid sort field"}, status=400)
+        if category_filter == "all":
+            category_filter = None
+        descending = sort_order == "desc"
 
-        reverse_order = sort_order == "desc"
-        
-        def sort_key(x):
-            if sort_by == 'amount':
-                return x.get('amount', 0)
-            return x.get('date_for_sort', datetime.min)
+        # Do not show income when filtering by expense category
+        collections = [EXPENSE_COLLECTION] if category_filter else [INCOME_COLLECTION, EXPENSE_COLLECTION]
+        positions = {collection: None for collection in collections}
+        if cursor:
+            try:
+                state = _decode_cursor(cursor)
+            except (ValueError, TypeError):
+                return JsonResponse({"error": "Invalid cursor"}, status=400)
+            if not _valid_cursor_state(state):
+                return JsonResponse({"error": "Invalid cursor"}, status=400)
+            if state.get("query") != [sort_by, sort_order, category_filter]:
+                return JsonResponse({"error": "Cursor does not match the requested sort or filter"}, status=400)
+            positions = state["positions"]
+
+        filters = [("category", "==", category_filter)] if category_filter else None
+        queries = {}
+        for collection in collections:
+            position = positions.get(collection)
+            if position == CURSOR_EXHAUSTED:
+                continue
+            start_after = None
+            if position is not None:
+                start_after = (_restore_cursor_value(position[0]), position[1])
+            queries[collection] = partial(
+                get_transactions_page, user_id, collection, order_field=sort_by, descending=descending,
+                limit=item_count, start_after=start_after, filters=filters,
+            )
+
+        candidates = []
+        fetched = {}
+        for collection, rows in zip(queries, run_concurrently(*queries.values())):
+            fetched[collection] = len(rows)
+            candidates.extend((collection, row) for row in rows)
+
+        candidates.sort(key=lambda item: (_order_key(item[1].get(sort_by)), item[1]["id"]), reverse=descending)
+        page = candidates[:item_count]
+
+        consumed = {collection: 0 for collection in fetched}
+        for collection, transaction in page:
+            consumed[collection] += 1
+            positions[collection] = [_cursor_value(transaction.get(sort_by)), transaction["id"]]
+        for collection, count in fetched.items():
+            if count < item_count and consumed[collection] == count:
+                positions[collection] = CURSOR_EXHAUSTED
 
-        all_transactions = sorted(incomes + expenses, key=sort_key, reverse=reverse_order)
+        next_cursor = None
+        if any(position != CURSOR_EXHAUSTED for position in positions.values()):
+            next_cursor = _encode_cursor({"query": [sort_by, sort_order, category_filter], "positions": positions})
 
-        start_index = (page - 1) * item_count
-        end_index = start_index + item_count
-        paginated_transactions = all_transactions[start_index:end_index]
+        transactions = []
+        for collection, transaction in page:
+            transaction['type'] = 'Income' if collection == INCOME_COLLECTION else 'Expense'
+            transactions.append(transaction)
 
-        return JsonResponse({"transactions": paginated_transactions}, safe=False)
+        return JsonResponse({"transactions": transactions, "next_cursor": next_cursor}, safe=False)
 
     except Exception as e:
         logger.error(f"Failed to get transactions: {str(e)}")
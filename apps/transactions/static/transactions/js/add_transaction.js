@@ -7,6 +7,32 @@ document.addEventListener("DOMContentLoaded", function () {
         dateInput.valueAsDate = new Date();
     }
 
+    // Suggest a category from the transaction name (matched locally on the server, no AI call)
+    const nameInput = document.getElementById("name");
+    const categorySelect = document.getElementById("category");
+    let categoryChosenByUser = false;
+    let suggestTimer = null;
+    if (nameInput && categorySelect) {
+        categorySelect.addEventListener("change", () => { categoryChosenByUser = true; });
+        nameInput.addEventListener("input", () => {
+            clearTimeout(suggestTimer);
+            suggestTimer = setTimeout(async () => {
+                const name = nameInput.value.trim();
+                if (!name || categoryChosenByUser || document.getElementById("transaction_type").value === 'income') return;
+                try {
+                    const response = await fetch(`/transactions/suggest_category/?name=${encodeURIComponent(name)}`);
+                    const suggestion = await response.json();
+                    const known = Array.from(categorySelect.options).some(option => option.value === suggestion.category);
+                    if (response.ok && suggestion.confident && known) {
+                        categorySelect.value = suggestion.category;
+                    }
+                } catch (error) {
+                    console.error("Category suggestion failed:", error);
+                }
+            }, 300);
+        });
+    }
+
     // Form submission
     const manualForm = document.getElementById("manualForm");
     if (manualForm) {
@@ -62,6 +88,7 @@ document.addEventListener("DOMContentLoaded", function () {
                 if (response.ok) {
                     alert("Transaction added successfully!");
                     manualForm.reset();
+                    categoryChosenByUser = false;
                     // Reset the form to the default state (expense)
                     setTransactionType('expense');
                 } else {
@@ -88,12 +115,17 @@ document.addEventListener("DOMContentLoaded", function () {
         ocrForm.addEventListener('submit', async (e) => {
             e.preventDefault();
             const formData = new FormData(ocrForm);
-            const receiptFile = formData.get('image');
+            const receiptFiles = formData.getAll('image').filter(file => file.size > 0);
+            const receiptFile = receiptFiles[0];
 
-            if (!receiptFile || receiptFile.size === 0) {
+            if (!receiptFile) {
                 alert('Please select an image to upload.');
                 return;
             }
+            if (receiptFiles.length > 1) {
+                await uploadBatch(receiptFiles);
+                return;
+            }
 
             // Show loading state (optional but good)
             const submitBtn = ocrForm.querySelector('button[type="submit"]');
@@ -137,6 +169,76 @@ document.addEventListener("DOMContentLoaded", function () {
         });
     }
 
+    // Batch upload: every readable receipt is saved directly, and each
+    // image's result is listed as soon as the server streams it back
+    async function uploadBatch(files) {
+        const submitBtn = ocrForm.querySelector('button[type="submit"]');
+        const originalBtnText = submitBtn.textContent;
+        const resultsList = document.getElementById('batchResults');
+        const formData = new FormData();
+        files.forEach(file => formData.append('images', file));
+        resultsList.innerHTML = '';
+        submitBtn.textContent = `Processing 0/${files.length}...`;
+        submitBtn.disabled = true;
+
+        const showLine = (text, className) => {
+            const item = document.createElement('li');
+            item.className = className;
+            item.textContent = text;
+            resultsList.appendChild(item);
+        };
+
+        try {
+            const response = await fetch('/ml_features/categorize_expenses_batch/', {
+                method: 'POST',
+                headers: { 'X-CSRFToken': getCookie('csrftoken') },
+                body: formData,
+            });
+            if (!response.ok) {
+                const data = await response.json();
+                throw new Error(data.error || 'Failed to process images.');
+            }
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffered = '';
+            let done = 0;
+            let summary = null;
+            while (true) {
+                const { value, done: finished } = await reader.read();
+                if (finished) break;
+                buffered += decoder.decode(value, { stream: true });
+                const lines = buffered.split('\n');
+                buffered = lines.pop();
+                for (const line of lines.filter(Boolean)) {
+                    const event = JSON.parse(line);
+                    if (event.type === 'summary') {
+                        summary = event;
+                        continue;
+                    }
+                    done += 1;
+                    submitBtn.textContent = `Processing ${done}/${files.length}...`;
+                    if (event.status === 'ok') {
+                        const t = event.transaction;
+                        showLine(`${event.filename}: ${t.name} - ₹${t.amount} (${t.category}, ${t.date})`, 'batch-ok');
+                    } else {
+                        showLine(`${event.filename}: ${event.error}`, 'batch-error');
+                    }
+                }
+            }
+            if (!summary) {
+                throw new Error('The upload was interrupted before the transactions were saved.');
+            }
+            alert(`${summary.saved} of ${summary.total} transactions added.`);
+        } catch (error) {
+            console.error('Error processing images:', error);
+            alert(error.message);
+        } finally {
+            submitBtn.textContent = originalBtnText;
+            submitBtn.disabled = false;
+        }
+    }
+
     // Handle Preview Confirmation
     if (previewForm) {
         previewForm.addEventListener('submit', async (e) => {
@@ -1,7 +1,7 @@
 import { getCookie } from '/static/core/js/help.js';
 const csrftoken = getCookie('csrftoken');
 let itemCount = 5;
-let currentPage = 1;
+let nextCursor = null;
 
 const sortByEl = document.getElementById("sort-by");
 const sortOrderEl = document.getElementById("sort-order");
@@ -13,7 +13,10 @@ async function fetchAndDisplayTransactions(append = false) {
         const sortOrder = sortOrderEl.value;
         const category = categoryFilterEl.value;
 
-        let url = `/transactions/get_transactions/?itemCount=${itemCount}&sortBy=${sortBy}&sortOrder=${sortOrder}&category=${category}&page=${currentPage}`;
+        let url = `/transactions/get_transactions/?itemCount=${itemCount}&sortBy=${sortBy}&sortOrder=${sortOrder}&category=${category}`;
+        if (append && nextCursor) {
+            url += `&cursor=${encodeURIComponent(nextCursor)}`;
+        }
 
         const response = await fetch(url, {
             headers: { "X-Requested-With": "XMLHttpRequest" }
@@ -25,6 +28,7 @@ async function fetchAndDisplayTransactions(append = false) {
 
         const data = await response.json();
         const transactions = data.transactions || [];
+        nextCursor = data.next_cursor || null;
         const tbody = document.querySelector(".incomeTable tbody");
         const loadMoreButton = document.getElementById("LoadMore");
 
@@ -69,7 +73,7 @@ async function fetchAndDisplayTransactions(append = false) {
         });
 
         if (loadMoreButton) {
-            loadMoreButton.style.display = transactions.length < itemCount ? "none" : "block";
+            loadMoreButton.style.display = nextCursor ? "block" : "none";
         }
     } catch (error) {
         alert(error.message);
@@ -77,7 +81,7 @@ async function fetchAndDisplayTransactions(append = false) {
 }
 
 function reloadTransactions() {
-    currentPage = 1;
+    nextCursor = null;
     fetchAndDisplayTransactions(false);
 }
 
@@ -90,7 +94,6 @@ document.addEventListener("DOMContentLoaded", function () {
 
     document.addEventListener("click", async (e) => {
         if (e.target.id === "LoadMore") {
-            currentPage++;
             await fetchAndDisplayTransactions(true);
         }
 
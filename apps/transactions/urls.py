@@ -9,4 +9,5 @@ urlpatterns = [
     path('transaction_history/', views.transaction_history, name="transaction_history"),
     path('get_transactions/', views.get_transactions_history, name="get_transactions"),
     path('add_category/', views.add_category, name="add_category"),
+    path('suggest_category/', views.suggest_category, name="suggest_category"),
 ]
@@ -4,13 +4,15 @@ from django.http import JsonResponse
 import json
 from apps.common_utils.auth_utils import get_user_id, get_email
 from apps.transactions.services import submit_transaction_util, delete_transaction_util, get_transactions_history_util, add_category_util
-from apps.common_utils.firebase_service import get_user_categories
+from apps.common_utils.firebase_service import get_user_categories, prefetch_user_documents
+from apps.ml_features.services.category_learning import suggest_category as suggest_category_service
 
 # @csrf_exempt
 def submit_transaction(request):
     if request.method == "GET":
         email = get_email(request)
         user_id = get_user_id(request)
+        prefetch_user_documents(user_id)
         categories = get_user_categories(user_id)
 
         return render(request, 'transactions/add_transaction.html', {"email": email, "categories": categories})
@@ -29,6 +31,7 @@ def delete_transaction(request):
 def transaction_history(request):
     email = get_email(request)
     user_id = get_user_id(request)
+    prefetch_user_documents(user_id)
     categories = get_user_categories(user_id)
     return render(request, 'transactions/transaction_history.html', {"email": email, "categories": categories})
 
@@ -45,3 +48,13 @@ def add_category(request):
             return JsonResponse({"error": "Category name is required"}, status=400)
         return add_category_util(user_id, category_name)
     return JsonResponse({"error": "Method not allowed"}, status=405)
+
+
+def suggest_category(request):
+    """Local (no LLM) category suggestion for the transaction name in ?name=."""
+    if request.method == "GET":
+        name = request.GET.get("name", "").strip()
+        if not name:
+            return JsonResponse({"error": "Name is required"}, status=400)
+        return JsonResponse(suggest_category_service(get_user_id(request), name))
+    return JsonResponse({"error": "Method not allowed"}, status=405)
@@ -1,12 +1,15 @@
 from pathlib import Path
 from firebase_admin import credentials
 import firebase_admin
-import dotenv,os
+import dotenv,os,sys
 dotenv.load_dotenv()
 from decouple import config
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = os.getenv("SECRET_KEY")
+# The test suite and the endpoint benchmarks sign their own session cookies
+if not SECRET_KEY and len(sys.argv) > 1 and sys.argv[1] in ("test", "benchmark"):
+    SECRET_KEY = "insecure-test-only-secret-key"
 
 # Email Configuration
 EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
@@ -55,6 +58,7 @@ MIDDLEWARE = [
     "whitenoise.middleware.WhiteNoiseMiddleware",  # Add WhiteNoise for static files
     "django.contrib.sessions.middleware.SessionMiddleware",
     'apps.core.auth_middleware.AuthMiddleware',
+    'apps.core.loader_middleware.RequestLoaderMiddleware',
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
@@ -149,3 +153,42 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 GOOGLE_APPLICATION_CREDENTIALS="/firebase_auth_key.json"
 
 GEMINI_API_KEY = config('GEMINI_API_KEY', default='')
+
+# Threads shared by apps.common_utils.concurrency.run_concurrently for
+# running independent Firestore queries in parallel
+FANOUT_MAX_WORKERS = int(os.getenv('FANOUT_MAX_WORKERS', 8))
+
+# Background jobs for the Gemini-backed endpoints (apps.common_utils.jobs):
+# threads per process, and how many jobs may wait or run before new ones get a 503
+JOB_MAX_WORKERS = int(os.getenv('JOB_MAX_WORKERS', 4))
+JOB_MAX_PENDING = int(os.getenv('JOB_MAX_PENDING', 100))
+
+# Batch receipt uploads (apps.ml_features.services.receipt_service): threads
+# shared by all batches in a process, and the most images accepted per request
+RECEIPT_BATCH_WORKERS = int(os.getenv('RECEIPT_BATCH_WORKERS', 4))
+RECEIPT_BATCH_MAX_IMAGES = int(os.getenv('RECEIPT_BATCH_MAX_IMAGES', 30))
+
+# Seconds before the cached admin analytics snapshot is rebuilt in the background
+ADMIN_ANALYTICS_TTL = int(os.getenv('ADMIN_ANALYTICS_TTL', 900))
+
+# Upper bound on the estimated tokens in an analysis prompt
+# (apps.common_utils.prompt_builder); the least important rows are dropped beyond it
+LLM_PROMPT_TOKEN_BUDGET = int(os.getenv('LLM_PROMPT_TOKEN_BUDGET', 6000))
+
+# The "llm" cache holds Gemini results (apps.common_utils.llm_cache) on disk so
+# they survive restarts; entries expire after LLM_CACHE_TTL seconds and the
+# oldest are culled once LLM_CACHE_MAX_ENTRIES is reached.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "llm": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.getenv('LLM_CACHE_DIR', str(BASE_DIR / '.cache' / 'llm')),
+        "TIMEOUT": int(os.getenv('LLM_CACHE_TTL', 24 * 60 * 60)),
+        "OPTIONS": {
+            "MAX_ENTRIES": int(os.getenv('LLM_CACHE_MAX_ENTRIES', 2000)),
+            "CULL_FREQUENCY": 4,
+        },
+    },
+}
@@ -7,18 +7,15 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'neural_budget.settings')
 django.setup()
 
-from firebase_admin import credentials, initialize_app, auth, firestore
+from firebase_admin import auth
 
-# Import the correctly defined delete_transaction function and the db instance
-from apps.common_utils.firebase_service import delete_transaction
-from apps.common_utils.firebase_config import db
+from apps.common_utils.firebase_service import bulk_delete_user_data, USER_DATA_COLLECTIONS
 
-collection = 'expenses'
-
-def delete_all_user_transactions(email: str):
+def delete_all_user_data(email: str):
     """
-    Fetches a user by email, finds all their transactions in the 'transactions'
-    collection, and deletes them one by one.
+    Fetches a user by email and deletes all of their documents in the
+    user-keyed collections (expenses, incomes, budgets, user_categories and
+    categories). Re-running after a failure resumes where it stopped.
     """
     try:
         # Get user by email using the Firebase Admin SDK
@@ -26,24 +23,15 @@ def delete_all_user_transactions(email: str):
         user_id = user.uid
         print(f"Found user: {user_id} for email: {email}")
 
-        # Fetch all transactions for the user
-        transactions_ref = db.collection(collection).where('userId', '==', user_id)
-        docs = list(transactions_ref.stream()) # Use list to get all docs at once
-
-        if not docs:
-            print(f"No transactions found for user: {email}")
-            return
-
-        print(f"Found {len(docs)} transactions. Proceeding with deletion...")
+        def report(progress):
+            print(f"  {progress['current_collection']}: {progress['deleted']} deleted, {progress['failed']} failed")
 
-        # Iterate over the documents and delete them
-        for doc in docs:
-            transaction_id = doc.id
-            print(f"Deleting transaction: {transaction_id}")
-            # The correct function call is delete_transaction(transaction_id, collection_name)
-            delete_transaction(transaction_id, collection)
+        state = bulk_delete_user_data(user_id, USER_DATA_COLLECTIONS, on_progress=report)
 
-        print(f"Successfully deleted all {len(docs)} transactions for user: {email}")
+        if state["status"] == "done":
+            print(f"Successfully deleted {state['deleted']} documents for user: {email}")
+        else:
+            print(f"Deletion incomplete ({state['failed']} failed). Run the script again to resume.")
 
     except auth.UserNotFoundError:
         print(f"Error: No user found with the email: {email}")
@@ -52,23 +40,8 @@ def delete_all_user_transactions(email: str):
 
 
 if __name__ == "__main__":
-    # --- IMPORTANT ---
-    # Set the email of the user whose transactions you want to delete.
-    user_email_to_delete = "thuraheinsyh@gmail.com"  # <--- CHANGE THIS EMAIL
-
-    print("Initializing Firebase...")
-    # Ensure you have the firebase_key.json in the root of the project
-    if not os.path.exists('firebase_key.json'):
-        print("Error: firebase_key.json not found in the project root.")
+    if len(sys.argv) < 2:
+        print("Usage: python scripts/delete_user_transactions.py <email>")
         sys.exit(1)
 
-    # Initialize Firebase Admin SDK
-    # Check if the app is already initialized to prevent errors
-    if not hasattr(django, 'firebase_app'):
-        cred = credentials.Certificate('firebase_key.json')
-        # django.firebase_app = initialize_app(cred)
-
-    if not user_email_to_delete or user_email_to_delete == "user@example.com":
-        print("Please edit the script and set the `user_email_to_delete` variable.")
-    else:
-        delete_all_user_transactions(user_email_to_delete)
\ No newline at end of file
+    delete_all_user_data(sys.argv[1])
@@ -1,14 +1,15 @@
-import firebase_admin
-from firebase_admin import credentials, firestore
+import os
+import sys
+import django
 import random
 from datetime import datetime, timedelta
 
-# Initialize Firebase
-cred = credentials.Certificate("firebase_key.json")  # Replace with your service account key
-firebase_admin.initialize_app(cred)
+# Add project root to path and setup Django
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'neural_budget.settings')
+django.setup()
 
-# Get Firestore client
-db = firestore.client()
+from apps.common_utils.firebase_service import bulk_add_transactions
 
 # List of possible income sources
 INCOME_SOURCES = ["Salary", "Freelancing", "Business", "Investments", "Other"]
@@ -20,54 +21,34 @@ def generate_random_date():
     """Generate a random date within the last year."""
     end_date = datetime.now()
     start_date = end_date - timedelta(days=365)
-    random_date = start_date + (end_date - start_date) * random.random()
-    return random_date.strftime("%Y-%m-%d")
+    return start_date + (end_date - start_date) * random.random()
 
 def generate_random_amount():
     """Generate a random amount between 100 and 10000."""
     return round(random.uniform(100, 10000), 2)
 
 def generate_random_transaction():
-    """Generate a random transaction."""    
+    """Generate a random income record."""
     return {
-        "name": 'Stuff',
-        "category": random.choice(INCOME_SOURCES),
+        "source": random.choice(INCOME_SOURCES),
         "amount": generate_random_amount(),
         "date": generate_random_date(),
-        "status": random.choice(STATUSES),   
+        "status": random.choice(STATUSES),
     }
 
-USER_ID = "PZWaO69zDjfivyIwPX4wi1KK6Pp2"  # User ID for deletion
+USER_ID = "PZWaO69zDjfivyIwPX4wi1KK6Pp2"  # User ID to seed
 collection = 'incomes'
 def insert_random_data(user_id, num_records=20):
-    """Insert random transactions into Firestore."""
-    incomes_ref = db.collection(collection)
+    """Insert random transactions into Firestore using batched writes."""
+    transactions = [generate_random_transaction() for _ in range(num_records)]
+    result = bulk_add_transactions(user_id, transactions, collection)
 
-    for i in range(num_records):
-        transaction = generate_random_transaction()
-        incomes_ref.add({
-            "userId" : user_id,
-            "transaction" : {
-                **transaction
-            },
-            "id":user_id
-        })
-        print(f"Inserted transaction {i + 1}: {transaction}")
-
-    print(f"Successfully inserted {num_records} random transactions for user {user_id}.")
-
-def delete_user_transactions(user_id):
-    """Delete all transactions for a given user ID."""
-    transactions_ref = db.collection(collection)
-    query = transactions_ref.where("userId", "==", user_id).stream()
-
-    deleted_count = 0
-    for doc in query:
-        doc.reference.delete()
-        deleted_count += 1
-    print(f"Successfully deleted {deleted_count} transactions for user {user_id}.")
+    for failure in result["failures"]:
+        print(f"Failed to insert transaction {failure['index'] + 1}: {failure['error']}")
+    print(f"Successfully inserted {result['added']} random transactions for user {user_id}.")
 
 if __name__ == "__main__":
-    # Use the predefined USER_ID for deletion
-    # delete_user_transactions(USER_ID)
-    insert_random_data(USER_ID, 20)
\ No newline at end of file
+    # Usage: python scripts/insert_random.py [num_records] [user_id]
+    num_records = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    user_id = sys.argv[2] if len(sys.argv) > 2 else USER_ID
+    insert_random_data(user_id, num_records)